@@ -0,0 +1,248 @@
+import os
+import json
+import time
+import shutil
+import sqlite3
+import hashlib
+import threading
+from PIL import Image
+from agents.topic_index import normalize_topic
+from agents.cover_processing import file_hash
+
+# --------------------------------------------------
+# ⚙️ Settings
+# --------------------------------------------------
+COVER_CACHE_PATH = os.getenv("BOOKFORGE_COVER_CACHE_PATH", os.path.join("data", "cache", "cover_cache.sqlite3"))
+COVER_BLOB_DIR = os.getenv("BOOKFORGE_COVER_BLOB_DIR", os.path.join("data", "cache", "cover_blobs"))
+COVER_CACHE_TTL = float(os.getenv("BOOKFORGE_COVER_CACHE_TTL_DAYS", "30")) * 24 * 60 * 60
+COVER_CACHE_MAX_BYTES = int(float(os.getenv("BOOKFORGE_COVER_CACHE_MAX_MB", "512")) * 1024 * 1024)
+# Provider search responses (the list of hits for a query). Pixabay asks API
+# clients to cache requests for 24 hours.
+COVER_SEARCH_TTL = float(os.getenv("BOOKFORGE_COVER_SEARCH_TTL_HOURS", "24")) * 60 * 60
+
+
+def query_key(query):
+    return hashlib.sha256(normalize_topic(query).encode("utf-8")).hexdigest()
+
+
+# --------------------------------------------------
+# 🗃️ Cover Cache
+# --------------------------------------------------
+class CoverCache:
+    """
+    Downloaded cover images keyed by normalized search query, so a topic
+    seen again is served from disk without touching Pixabay or Unsplash.
+
+    - Images are stored once per content hash in `blob_dir`; queries that
+      ended up with the same picture share one file.
+    - Entries expire after `ttl` seconds.
+    - When the stored images exceed `max_bytes`, the least recently used
+      queries are dropped and images no query refers to are deleted.
+    - Provider search responses are kept per normalized query for
+      `search_ttl` seconds (get_search/put_search), so a query that comes
+      back (the broad backup query above all) skips the search request.
+    """
+
+    def __init__(self, path=COVER_CACHE_PATH, blob_dir=COVER_BLOB_DIR, ttl=COVER_CACHE_TTL,
+                 max_bytes=COVER_CACHE_MAX_BYTES, search_ttl=COVER_SEARCH_TTL):
+        self.path = path
+        self.blob_dir = blob_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.search_ttl = search_ttl
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "expired": 0, "stored": 0, "deduplicated": 0,
+                          "search_hits": 0, "search_misses": 0}
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS queries (
+                key TEXT PRIMARY KEY,
+                query TEXT NOT NULL,
+                provider TEXT NOT NULL,
+                blob TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )"""
+        )
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS blobs (
+                hash TEXT PRIMARY KEY,
+                filename TEXT NOT NULL,
+                size INTEGER NOT NULL
+            )"""
+        )
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS searches (
+                provider TEXT NOT NULL,
+                key TEXT NOT NULL,
+                query TEXT NOT NULL,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (provider, key)
+            )"""
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS queries_lru ON queries (last_access)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS queries_blob ON queries (blob)")
+        self._db.commit()
+        self._total_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+
+    def _blob_path(self, filename):
+        return os.path.join(self.blob_dir, filename[:2], filename)
+
+    def get(self, query):
+        """Returns (provider, image path) for a fresh entry, else None. Never uses the network."""
+        key = query_key(query)
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT q.provider, q.created_at, b.filename FROM queries q "
+                "JOIN blobs b ON b.hash = q.blob WHERE q.key = ?", (key,)
+            ).fetchone()
+            if row and now - row[1] > self.ttl:
+                self._drop_query(key)
+                self._db.commit()
+                self._counters["expired"] += 1
+                row = None
+            if row and not os.path.exists(self._blob_path(row[2])):
+                self._drop_query(key)  # image deleted behind our back
+                self._db.commit()
+                row = None
+            if row is None:
+                self._counters["misses"] += 1
+                return None
+            self._db.execute("UPDATE queries SET last_access = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            self._counters["hits"] += 1
+            return row[0], self._blob_path(row[2])
+
+    def put(self, query, provider, image_path, move=False):
+        """
+        Stores the image for `query` and returns its path in the cache. With
+        `move` the file is moved in (or deleted if the image is already stored).
+        """
+        digest = file_hash(image_path)
+        with Image.open(image_path) as img:
+            extension = (img.format or "jpeg").lower().replace("jpeg", "jpg")
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT filename FROM blobs WHERE hash = ?", (digest,)).fetchone()
+            if row and os.path.exists(self._blob_path(row[0])):
+                filename = row[0]
+                if move:
+                    os.remove(image_path)
+                self._counters["deduplicated"] += 1
+            else:
+                filename = f"{digest}.{extension}"
+                blob_path = self._blob_path(filename)
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                if move:
+                    os.replace(image_path, blob_path)
+                else:
+                    tmp_path = f"{blob_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                    shutil.copyfile(image_path, tmp_path)
+                    os.replace(tmp_path, blob_path)
+                size = os.path.getsize(blob_path)
+                old = self._db.execute("SELECT size FROM blobs WHERE hash = ?", (digest,)).fetchone()
+                self._db.execute(
+                    "INSERT OR REPLACE INTO blobs (hash, filename, size) VALUES (?, ?, ?)",
+                    (digest, filename, size),
+                )
+                self._total_bytes += size - (old[0] if old else 0)
+            key = query_key(query)
+            previous = self._db.execute("SELECT blob FROM queries WHERE key = ?", (key,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO queries (key, query, provider, blob, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, query, provider, digest, now, now),
+            )
+            if previous and previous[0] != digest:
+                self._drop_blob_if_unused(previous[0])
+            self._counters["stored"] += 1
+            if self._total_bytes > self.max_bytes:
+                self._evict(keep=key)
+            self._db.commit()
+            return self._blob_path(filename)
+
+    def get_search(self, provider, query):
+        """Returns the cached search response of `provider` for `query`, or None."""
+        key = query_key(query)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT response, created_at FROM searches WHERE provider = ? AND key = ?", (provider, key)
+            ).fetchone()
+            if row and time.time() - row[1] > self.search_ttl:
+                self._db.execute("DELETE FROM searches WHERE provider = ? AND key = ?", (provider, key))
+                self._db.commit()
+                row = None
+            self._counters["search_hits" if row else "search_misses"] += 1
+        return json.loads(row[0]) if row else None
+
+    def put_search(self, provider, query, response):
+        """Stores a (JSON-serializable) search response of `provider` for `query`."""
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO searches (provider, key, query, response, created_at) VALUES (?, ?, ?, ?, ?)",
+                (provider, query_key(query), query, json.dumps(response), time.time()),
+            )
+            self._db.commit()
+
+    def _drop_query(self, key):
+        row = self._db.execute("SELECT blob FROM queries WHERE key = ?", (key,)).fetchone()
+        self._db.execute("DELETE FROM queries WHERE key = ?", (key,))
+        if row:
+            self._drop_blob_if_unused(row[0])
+
+    def _drop_blob_if_unused(self, digest):
+        if self._db.execute("SELECT 1 FROM queries WHERE blob = ? LIMIT 1", (digest,)).fetchone():
+            return
+        row = self._db.execute("SELECT filename, size FROM blobs WHERE hash = ?", (digest,)).fetchone()
+        if row is None:
+            return
+        self._db.execute("DELETE FROM blobs WHERE hash = ?", (digest,))
+        self._total_bytes -= row[1]
+        try:
+            os.remove(self._blob_path(row[0]))
+        except OSError:
+            pass
+
+    def _evict(self, keep=None):
+        """Drops least recently used queries (except `keep`) until the images fit in 90% of the budget."""
+        target = self.max_bytes * 0.9
+        keys = self._db.execute("SELECT key FROM queries ORDER BY last_access").fetchall()
+        for (key,) in keys:
+            if self._total_bytes <= target:
+                break
+            if key != keep:
+                self._drop_query(key)
+
+    def stats(self):
+        """Hit/miss counters for this process plus entries and bytes on disk."""
+        with self._lock:
+            c = dict(self._counters)
+            c["entries"] = self._db.execute("SELECT COUNT(*) FROM queries").fetchone()[0]
+            c["images"] = self._db.execute("SELECT COUNT(*) FROM blobs").fetchone()[0]
+            c["bytes"] = self._total_bytes
+        c["hit_rate"] = round(c["hits"] / max(1, c["hits"] + c["misses"]), 3)
+        c["search_hit_rate"] = round(c["search_hits"] / max(1, c["search_hits"] + c["search_misses"]), 3)
+        return c
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cover_cache():
+    """The process-wide CoverCache."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = CoverCache()
+        return _cache
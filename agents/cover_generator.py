@@ -1,106 +1,351 @@
 import os
-import requests
 import time
-from dotenv import load_dotenv
-from datetime import datetime
+import random
 import shutil
+import tempfile
+import threading
+import contextvars
+import requests
+import requests.adapters
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dotenv import load_dotenv
+from PIL import Image
+from agents.cover_cache import get_cover_cache
+from agents.cover_processing import file_hash
+from agents.cover_renderer import render_cover
 
 # --------------------------------------------------
 # Load environment variables
 # --------------------------------------------------
 load_dotenv()
 
+# --------------------------------------------------
+# ⚙️ Settings
+# --------------------------------------------------
+# Base URLs are configurable so the providers can be replaced by local
+# stand-ins (e.g. http://127.0.0.1:8000) in tests.
+PIXABAY_API_URL = os.getenv("BOOKFORGE_PIXABAY_URL", "https://pixabay.com/api/")
+UNSPLASH_URL = os.getenv("BOOKFORGE_UNSPLASH_URL", "https://source.unsplash.com")
+# "sequential": Pixabay → Unsplash → broad Pixabay query, one after another.
+# "race": all providers at once, first good image wins, the rest are cancelled.
+# "procedural": no network, draw the cover locally (agents/cover_renderer.py);
+# takes tens of milliseconds, so it is the choice for throughput runs.
+COVER_MODE = os.getenv("BOOKFORGE_COVER_MODE", "sequential").strip().lower()
+COVER_MAX_BYTES = int(float(os.getenv("BOOKFORGE_COVER_MAX_MB", "15")) * 1024 * 1024)
+COVER_TIMEOUT = float(os.getenv("BOOKFORGE_COVER_TIMEOUT", "15"))
+COVER_RETRIES = int(os.getenv("BOOKFORGE_COVER_RETRIES", "3"))
+# Reuse downloaded covers across cycles (see agents/cover_cache.py).
+COVER_CACHE = os.getenv("BOOKFORGE_COVER_CACHE", "1").strip().lower() in ("1", "true", "yes", "on")
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 4.0
+CHUNK_SIZE = 16 * 1024  # small chunks so a cancelled download stops quickly
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+BROAD_QUERY = "horoscope astrology zodiac stars"
+DEFAULT_COVER = os.path.join("assets", "default_cover.jpg")
+
+
+class CoverDownloadError(Exception):
+    """A provider could not deliver a usable image."""
+
+
+class _Retryable(Exception):
+    pass
+
+
+# The CoverCache generate_cover() is using, for providers to cache their
+# search responses in. A context variable, so it reaches race_providers'
+# threads through copy_context() like the log prefix does.
+_search_cache = contextvars.ContextVar("cover_search_cache", default=None)
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_http_session():
+    """Shared pooled session so cover requests reuse TLS connections."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=8, pool_maxsize=16)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+
+def _backoff(attempt):
+    # Full jitter: concurrent topics retrying the same provider spread out.
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+
+def _with_retries(label, func, cancel=None, retries=None):
+    retries = max(1, retries or COVER_RETRIES)
+    for attempt in range(retries):
+        if cancel is not None and cancel.is_set():
+            raise CoverDownloadError(f"{label}: cancelled")
+        try:
+            return func()
+        except (requests.ConnectionError, requests.Timeout, _Retryable) as e:
+            if attempt == retries - 1:
+                raise CoverDownloadError(f"{label}: {e or type(e).__name__}") from e
+            delay = _backoff(attempt)
+            print(f"⏳ {label} failed ({e or type(e).__name__}), retrying in {delay:.1f}s...")
+            if cancel is not None:
+                if cancel.wait(delay):
+                    raise CoverDownloadError(f"{label}: cancelled")
+            else:
+                time.sleep(delay)
+
+
+# --------------------------------------------------
+# ⬇️ Streamed image download
+# --------------------------------------------------
+def download_image(url, directory, session=None, params=None, max_bytes=None, cancel=None, label="download"):
+    """
+    Streams an image into a temp file in `directory` and returns its path
+    (the caller moves it into place or deletes it). Gives up beyond
+    `max_bytes`, on non-image responses or when `cancel` is set.
+    """
+    session = session or get_http_session()
+    max_bytes = max_bytes or COVER_MAX_BYTES
+    os.makedirs(directory, exist_ok=True)
+
+    def attempt():
+        with session.get(url, params=params, stream=True, timeout=(5, COVER_TIMEOUT)) as response:
+            if response.status_code in RETRYABLE_STATUS:
+                raise _Retryable(f"HTTP {response.status_code}")
+            if response.status_code != 200:
+                raise CoverDownloadError(f"{label}: HTTP {response.status_code}")
+            content_type = response.headers.get("Content-Type", "")
+            if content_type and not content_type.startswith("image/"):
+                raise CoverDownloadError(f"{label}: not an image ({content_type})")
+            if int(response.headers.get("Content-Length") or 0) > max_bytes:
+                raise CoverDownloadError(f"{label}: image larger than {max_bytes // 1024} KB")
+
+            fd, tmp_path = tempfile.mkstemp(suffix=".part", dir=directory)
+            try:
+                size = 0
+                with os.fdopen(fd, "wb") as f:
+                    for chunk in response.iter_content(CHUNK_SIZE):
+                        if cancel is not None and cancel.is_set():
+                            raise CoverDownloadError(f"{label}: cancelled")
+                        size += len(chunk)
+                        if size > max_bytes:
+                            raise CoverDownloadError(f"{label}: image larger than {max_bytes // 1024} KB")
+                        f.write(chunk)
+                with Image.open(tmp_path) as img:
+                    img.verify()
+                return tmp_path
+            except BaseException as e:
+                os.remove(tmp_path)
+                if isinstance(e, (OSError, SyntaxError)) and not isinstance(e, requests.RequestException):
+                    raise CoverDownloadError(f"{label}: unreadable image ({e})") from e
+                raise
+
+    return _with_retries(label, attempt, cancel)
+
+
+# --------------------------------------------------
+# 🔌 Providers
+# --------------------------------------------------
+# Each provider downloads one image for the topic into `directory` and
+# returns the temp file path, or raises CoverDownloadError.
+def _pixabay(query, directory, session, cancel, label):
+    api_key = os.getenv("PIXABAY_API_KEY", "")
+    if not api_key:
+        raise CoverDownloadError(f"{label}: no PIXABAY_API_KEY in .env")
+    params = {"key": api_key, "q": query, "image_type": "photo", "orientation": "square"}
+
+    def search():
+        response = session.get(PIXABAY_API_URL, params=params, timeout=(5, COVER_TIMEOUT))
+        if response.status_code in RETRYABLE_STATUS:
+            raise _Retryable(f"HTTP {response.status_code}")
+        response.raise_for_status()
+        return response.json()
+
+    cache = _search_cache.get()
+    hits = cache.get_search("pixabay", query) if cache is not None else None
+    if hits is None:
+        print(f"🔍 Searching Pixabay for: {query}")
+        hits = _with_retries(label, search, cancel).get("hits")
+        if hits and cache is not None:
+            try:
+                cache.put_search("pixabay", query, hits)
+            except Exception as e:
+                print(f"⚠️ Could not cache Pixabay results: {e}")
+    else:
+        print(f"♻️ Cached Pixabay results for: {query}")
+    if not hits:
+        raise CoverDownloadError(f"{label}: no matching results")
+    return download_image(hits[0]["largeImageURL"], directory, session, cancel=cancel, label=label)
+
+
+def pixabay_provider(topic, directory, session, cancel=None):
+    return _pixabay(topic, directory, session, cancel, "Pixabay")
+
+
+def pixabay_broad_provider(topic, directory, session, cancel=None):
+    return _pixabay(BROAD_QUERY, directory, session, cancel, "Pixabay (broad)")
+
+
+def unsplash_provider(topic, directory, session, cancel=None):
+    url = f"{UNSPLASH_URL.rstrip('/')}/1024x1024/?{topic},book,art,illustration"
+    print(f"🔍 Pulling from Unsplash: {url}")
+    return download_image(url, directory, session, cancel=cancel, label="Unsplash")
+
+
+# (name, provider, backup). A backup image is only used when every
+# topic-specific provider failed, and isn't cached under the topic (it
+# comes from a broad query, not the topic's own one).
+PROVIDERS = [
+    ("Pixabay", pixabay_provider, False),
+    ("Unsplash", unsplash_provider, False),
+    ("Pixabay (broad)", pixabay_broad_provider, True),
+]
+
+
+def _discard(future):
+    try:
+        path = future.result()
+    except Exception:
+        return
+    if path and os.path.exists(path):
+        os.remove(path)
+
+
+def race_providers(topic, directory, session=None, providers=None):
+    """
+    Runs all providers at once and returns (name, temp path) of the first
+    good image, or (None, None). Losing downloads are cancelled and their
+    temp files removed.
+    """
+    session = session or get_http_session()
+    providers = providers or PROVIDERS
+    cancel = threading.Event()
+    pool = ThreadPoolExecutor(max_workers=len(providers), thread_name_prefix="cover")
+    # copy_context keeps the caller's log prefix in the provider threads
+    futures = {pool.submit(contextvars.copy_context().run, func, topic, directory, session, cancel): (name, backup)
+               for name, func, backup in providers}
+    primaries = {f for f, (_, backup) in futures.items() if not backup}
+    winner = held = None
+    try:
+        for future in as_completed(futures):
+            primaries.discard(future)
+            try:
+                future.result()
+                if futures[future][1] and primaries:
+                    held = future  # backup image: keep it until the primaries are done
+                else:
+                    winner = future
+            except Exception as e:
+                print(f"⚠️ {e}")
+            if winner is None and held is not None and not primaries:
+                winner = held
+            if winner is not None:
+                break
+    finally:
+        # Losers stop at their next chunk or backoff wait; whatever they
+        # still produce is deleted when they finish.
+        cancel.set()
+        for future in futures:
+            if future is not winner:
+                future.add_done_callback(_discard)
+        pool.shutdown(wait=False, cancel_futures=True)
+    if winner is None:
+        return None, None
+    return futures[winner][0], winner.result()
+
+
+def sequential_providers(topic, directory, session=None, providers=None):
+    """Tries the providers one after another; returns (name, temp path) or (None, None)."""
+    session = session or get_http_session()
+    for name, func, _ in providers or PROVIDERS:
+        try:
+            return name, func(topic, directory, session)
+        except Exception as e:
+            print(f"⚠️ {e}")
+    return None, None
+
+
+def _procedural_cover(title, subtitle, output_path):
+    started = time.perf_counter()
+    try:
+        render_cover(title, subtitle, output_path)
+    except Exception as e:
+        print(f"❌ Procedural cover failed: {e}")
+        return None
+    print(f"✅ Procedural cover drawn in {(time.perf_counter() - started) * 1000:.0f} ms → {output_path}")
+    return output_path
+
+
 # --------------------------------------------------
 # 🎨 Generate Cover Function
 # --------------------------------------------------
-def generate_cover(topic):
+def generate_cover(topic, mode=None, session=None, cache=None, title="", subtitle=""):
     """
     Generates a book cover image for the given topic.
     Priority:
+    0️⃣ Cover cache (no network; BOOKFORGE_COVER_CACHE=0 disables it)
     1️⃣ Pixabay API (if available)
     2️⃣ Unsplash fallback
-    3️⃣ Local default cover (assets/default_cover.jpg)
+    3️⃣ Pixabay with a broad query
+    4️⃣ Procedural cover drawn locally
+    5️⃣ Local default cover (assets/default_cover.jpg)
+
+    With `mode` (or BOOKFORGE_COVER_MODE) "race" the providers are queried
+    concurrently and the first good image is used; "procedural" skips
+    straight to 4️⃣. A procedural cover shows `title` (the topic if empty)
+    and `subtitle`; image searches always use the topic.
     """
     print(f"🎨 Generating cover image for: {topic}")
+    mode = (mode or COVER_MODE).strip().lower()
+    if cache is None and COVER_CACHE:
+        cache = get_cover_cache()
 
     # Prepare directories
     os.makedirs("data/covers", exist_ok=True)
     output_path = f"data/covers/{topic.replace(' ', '_').lower()}_cover.jpg"
 
-    # --------------------------------------------------
-    # 1️⃣ Attempt Pixabay (most reliable)
-    # --------------------------------------------------
-    try:
-        PIXABAY_API_KEY = os.getenv("PIXABAY_API_KEY", "")
-        if PIXABAY_API_KEY:
-            search_query = topic.replace(" ", "+")
-            pixabay_url = (
-                f"https://pixabay.com/api/?key={PIXABAY_API_KEY}"
-                f"&q={search_query}&image_type=photo&orientation=square"
-            )
-            print(f"🔍 Searching Pixabay: {pixabay_url}")
-            response = requests.get(pixabay_url, timeout=10).json()
-
-            if response.get("hits"):
-                img_url = response["hits"][0]["largeImageURL"]
-                img_data = requests.get(img_url, timeout=15)
-                if img_data.status_code == 200:
-                    with open(output_path, "wb") as f:
-                        f.write(img_data.content)
-                    print(f"✅ Pixabay cover saved → {output_path}")
-                    return output_path
-            else:
-                print("⚠️ Pixabay returned no matching results. Retrying with a broader query...")
-
-                # 🔄 Broader fallback: search with generic keywords
-                fallback_url = (
-                    f"https://pixabay.com/api/?key={PIXABAY_API_KEY}"
-                    f"&q=horoscope+astrology+zodiac+stars&image_type=photo&orientation=square"
-                )
-
-                fallback_response = requests.get(fallback_url, timeout=10).json()
-                if fallback_response.get("hits"):
-                    img_url = fallback_response["hits"][0]["largeImageURL"]
-                    img_data = requests.get(img_url, timeout=15)
-                    if img_data.status_code == 200:
-                        with open(output_path, "wb") as f:
-                            f.write(img_data.content)
-                        print(f"✅ Fallback Pixabay cover saved → {output_path}")
-                        return output_path
-                else:
-                    print("⚠️ Fallback Pixabay also returned no results.")
-        else:
-            print("⚠️ No Pixabay API key found in .env (skipping to Unsplash).")
-    except Exception as e:
-        print(f"❌ Pixabay failed: {e}")
+    if mode == "procedural":
+        return _procedural_cover(title or topic, subtitle, output_path)
 
-    # --------------------------------------------------
-    # 2️⃣ Fallback: Unsplash
-    # --------------------------------------------------
+    cached = cache.get(topic) if cache is not None else None
+    if cached:
+        name, image_path = cached
+        # Leave an identical cover alone so its mtime (and derived files) stay valid.
+        if not (os.path.exists(output_path) and file_hash(output_path) == file_hash(image_path)):
+            shutil.copyfile(image_path, output_path)
+        print(f"♻️ Cached {name} cover reused → {output_path}")
+        return output_path
+
+    pick = race_providers if mode == "race" else sequential_providers
+    started = time.perf_counter()
+    token = _search_cache.set(cache)
     try:
-        unsplash_url = f"https://source.unsplash.com/1024x1024/?{topic},book,art,illustration"
-        print(f"🔍 Pulling from Unsplash: {unsplash_url}")
-
-        for attempt in range(3):
-            img_response = requests.get(unsplash_url, timeout=15)
-            if img_response.status_code == 200:
-                with open(output_path, "wb") as f:
-                    f.write(img_response.content)
-                print(f"✅ Unsplash cover saved on attempt {attempt+1} → {output_path}")
-                return output_path
-            else:
-                print(f"⚠️ Attempt {attempt+1} failed ({img_response.status_code}), retrying...")
-                time.sleep(5)
-    except Exception as e:
-        print(f"❌ Unsplash fallback failed: {e}")
+        name, tmp_path = pick(topic, "data/covers", session)
+    finally:
+        _search_cache.reset(token)
+    if tmp_path:
+        backups = {provider for provider, _, backup in PROVIDERS if backup}
+        if cache is not None and name not in backups:
+            try:
+                cache.put(topic, name, tmp_path)
+            except Exception as e:
+                print(f"⚠️ Could not cache cover: {e}")
+        os.replace(tmp_path, output_path)
+        print(f"✅ {name} cover saved in {time.perf_counter() - started:.1f}s → {output_path}")
+        return output_path
+
+    if _procedural_cover(title or topic, subtitle, output_path):
+        return output_path
 
     # --------------------------------------------------
-    # 3️⃣ Final fallback: Local placeholder
+    # Final fallback: Local placeholder
     # --------------------------------------------------
     try:
-        local_fallback = "assets/default_cover.jpg"
-        if os.path.exists(local_fallback):
-            shutil.copy(local_fallback, output_path)
+        if os.path.exists(DEFAULT_COVER):
+            shutil.copy(DEFAULT_COVER, output_path)
             print(f"✅ Default local cover used → {output_path}")
             return output_path
         else:
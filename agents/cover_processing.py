@@ -0,0 +1,119 @@
+import os
+import hashlib
+import threading
+from PIL import Image, ImageOps
+
+# --------------------------------------------------
+# ⚙️ Settings
+# --------------------------------------------------
+DERIVED_DIR = os.path.join("data", "covers", "derived")
+
+# Target pixel sizes for an A4 (1 : 1.414) cover page, and JPEG quality.
+# "print" is ~200 dpi on A4; "screen" is plenty for PDFs read on a device
+# and is what goes into the PDFs we upload.
+COVER_VARIANTS = {
+    "print": {"width": int(os.getenv("BOOKFORGE_COVER_PRINT_WIDTH", "1654")), "quality": 88},
+    "screen": {"width": int(os.getenv("BOOKFORGE_COVER_SCREEN_WIDTH", "800")), "quality": 78},
+}
+DEFAULT_VARIANT = os.getenv("BOOKFORGE_COVER_VARIANT", "screen")
+PAGE_RATIO = 297 / 210
+
+# How a source that isn't page-shaped fills the page: "auto" crops it if
+# that cuts off at most COVER_MAX_CROP of the image (a 2:3 portrait loses
+# ~6%) and otherwise letterboxes it on a white page (a square one would
+# lose 29%); "crop" always crops, "pad" always letterboxes.
+COVER_FIT = os.getenv("BOOKFORGE_COVER_FIT", "auto").strip().lower()
+COVER_MAX_CROP = float(os.getenv("BOOKFORGE_COVER_MAX_CROP", "0.15"))
+PAGE_COLOR = (255, 255, 255)
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def file_hash(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _lock_for(key):
+    with _locks_guard:
+        return _locks.setdefault(key, threading.Lock())
+
+
+def variant_path(source_hash, variant, directory=DERIVED_DIR, fit=None):
+    return os.path.join(directory, f"{source_hash[:24]}_{variant}_{fit or COVER_FIT}.jpg")
+
+
+# --------------------------------------------------
+# 🖼️ Cover variants
+# --------------------------------------------------
+def _to_rgb(img):
+    """RGB on a white page; convert("RGB") alone turns transparent areas black."""
+    if img.mode in ("RGBA", "LA", "PA") or (img.mode == "P" and "transparency" in img.info):
+        img = img.convert("RGBA")
+        page = Image.new("RGBA", img.size, PAGE_COLOR + (255,))
+        return Image.alpha_composite(page, img).convert("RGB")
+    return img.convert("RGB")
+
+
+def _crop_loss(img):
+    ratio = img.height / img.width
+    return 1 - min(ratio, PAGE_RATIO) / max(ratio, PAGE_RATIO)
+
+
+def make_variant(source_path, output_path, width, quality, fit=None):
+    """
+    Fits the image to the page ratio (cropped or letterboxed, see
+    COVER_FIT), downsamples it (never up) and saves a compact JPEG.
+    """
+    fit = fit or COVER_FIT
+    if fit not in ("auto", "crop", "pad"):
+        raise ValueError(f"❌ Unknown cover fit '{fit}' (expected auto, crop or pad)")
+    height = round(width * PAGE_RATIO)
+    with Image.open(source_path) as img:
+        # Lets the JPEG decoder scale by 1/2, 1/4 or 1/8 while decoding,
+        # which is much cheaper than decoding a huge image and resizing it.
+        img.draft("RGB", (width, height))
+        img = _to_rgb(ImageOps.exif_transpose(img))
+
+        if fit == "crop" or (fit == "auto" and _crop_loss(img) <= COVER_MAX_CROP):
+            # Crop first, then only shrink: a small source stays small.
+            page_width = min(img.width, round(img.height / PAGE_RATIO))
+            img = ImageOps.fit(img, (page_width, round(page_width * PAGE_RATIO)), method=Image.LANCZOS)
+        else:
+            # The whole image, centred on a page just big enough to hold it.
+            page_width = max(img.width, round(img.height / PAGE_RATIO))
+            img = ImageOps.pad(img, (page_width, round(page_width * PAGE_RATIO)), method=Image.LANCZOS,
+                               color=PAGE_COLOR)
+        if page_width > width:
+            img = img.resize((width, height), Image.LANCZOS)
+
+        tmp_path = f"{output_path}.{os.getpid()}.tmp"
+        img.save(tmp_path, "JPEG", quality=quality, optimize=True, progressive=True)
+    os.replace(tmp_path, output_path)
+    return output_path
+
+
+def prepare_cover(source_path, variant=None, directory=DERIVED_DIR):
+    """
+    Returns the path of the `variant` ("print" or "screen") of a cover
+    image, creating it on first use. Variants are cached by a hash of the
+    source bytes, so re-runs and identical images are never reprocessed.
+    """
+    variant = variant or DEFAULT_VARIANT
+    if variant not in COVER_VARIANTS:
+        raise ValueError(f"❌ Unknown cover variant '{variant}' (expected one of {', '.join(COVER_VARIANTS)})")
+
+    source_hash = file_hash(source_path)
+    output_path = variant_path(source_hash, variant, directory)
+    with _lock_for(output_path):
+        if not os.path.exists(output_path):
+            os.makedirs(directory, exist_ok=True)
+            settings = COVER_VARIANTS[variant]
+            make_variant(source_path, output_path, settings["width"], settings["quality"])
+            print(f"🖼️ Cover {variant} variant: {os.path.getsize(source_path) // 1024} KB → "
+                  f"{os.path.getsize(output_path) // 1024} KB")
+    return output_path
@@ -0,0 +1,177 @@
+import os
+import math
+import random
+import colorsys
+import hashlib
+import functools
+from PIL import Image, ImageDraw, ImageFont
+from agents.topic_index import normalize_topic
+from agents.cover_processing import PAGE_RATIO
+
+# --------------------------------------------------
+# ⚙️ Settings
+# --------------------------------------------------
+FONT_REG = os.path.join("assets", "DejaVuSans.ttf")
+FONT_BOLD = os.path.join("assets", "DejaVuSans-Bold.ttf")
+
+# Rendered straight at the "screen" cover size (A4 ratio), so the PDF step
+# has nothing to downsample.
+COVER_WIDTH = int(os.getenv("BOOKFORGE_PROCEDURAL_COVER_WIDTH", "800"))
+COVER_QUALITY = 88
+PATTERNS = ("circles", "stripes", "grid", "waves")
+
+
+# --------------------------------------------------
+# 🔤 Cached typography
+# --------------------------------------------------
+# Loading a TrueType font and measuring words are the expensive parts of
+# laying out a cover; both are memoized for the life of the process.
+@functools.lru_cache(maxsize=64)
+def get_font(path, size):
+    return ImageFont.truetype(path, size)
+
+
+@functools.lru_cache(maxsize=8192)
+def text_width(path, size, text):
+    return get_font(path, size).getlength(text)
+
+
+def wrap_text(text, path, size, max_width):
+    """Greedy word wrap using cached word widths. Returns the list of lines."""
+    space = text_width(path, size, " ")
+    lines, line, width = [], [], 0.0
+    for word in text.split():
+        word_width = text_width(path, size, word)
+        extra = word_width if not line else space + word_width
+        if line and width + extra > max_width:
+            lines.append(" ".join(line))
+            line, width = [word], word_width
+        else:
+            line.append(word)
+            width += extra
+    if line:
+        lines.append(" ".join(line))
+    return lines
+
+
+def fit_text(text, path, max_width, max_lines, sizes):
+    """Largest size in `sizes` at which `text` wraps into `max_lines` lines that all fit."""
+    for size in sizes:
+        lines = wrap_text(text, path, size, max_width)
+        if len(lines) <= max_lines and all(text_width(path, size, line) <= max_width for line in lines):
+            return size, lines
+    size = sizes[-1]
+    lines = wrap_text(text, path, size, max_width)
+    if len(lines) > max_lines:
+        lines = lines[:max_lines]
+        lines[-1] = lines[-1].rstrip(" .,;:") + "…"
+    for n, line in enumerate(lines):
+        # A single word wider than the page: cut it.
+        while len(line) > 1 and text_width(path, size, line) > max_width:
+            line = line[:-2].rstrip() + "…"
+        lines[n] = line
+    return size, lines
+
+
+# --------------------------------------------------
+# 🎨 Background
+# --------------------------------------------------
+def palette_for(topic):
+    """Two deterministic, readable (dark-ish) colours and a pattern name for a topic."""
+    digest = hashlib.sha256(normalize_topic(topic).encode("utf-8")).digest()
+    hue = digest[0] / 255
+    shift = 0.08 + digest[1] / 255 * 0.25
+    top = colorsys.hls_to_rgb(hue, 0.32, 0.55)
+    bottom = colorsys.hls_to_rgb((hue + shift) % 1.0, 0.16, 0.6)
+    to_rgb = lambda c: tuple(round(v * 255) for v in c)
+    return to_rgb(top), to_rgb(bottom), PATTERNS[digest[2] % len(PATTERNS)], digest
+
+
+def gradient(size, top, bottom):
+    # A 1-pixel-wide column scaled up by the C resampler is far cheaper than
+    # drawing the gradient line by line in Python.
+    column = Image.new("RGB", (1, 256))
+    column.putdata([tuple(round(t + (b - t) * y / 255) for t, b in zip(top, bottom)) for y in range(256)])
+    return column.resize(size, Image.BILINEAR)
+
+
+def draw_pattern(image, pattern, digest):
+    width, height = image.size
+    rng = random.Random(digest)
+    overlay = Image.new("RGBA", image.size, (0, 0, 0, 0))
+    draw = ImageDraw.Draw(overlay)
+    ink = (255, 255, 255, 28)
+    if pattern == "circles":
+        for _ in range(14):
+            r = rng.randint(width // 12, width // 3)
+            x, y = rng.randint(-r, width), rng.randint(-r, height)
+            draw.ellipse((x - r, y - r, x + r, y + r), outline=ink, width=max(2, width // 200))
+    elif pattern == "stripes":
+        step = width // rng.randint(8, 14)
+        for x in range(-height, width, step):
+            draw.line((x, height, x + height, 0), fill=ink, width=max(3, step // 4))
+    elif pattern == "grid":
+        step = width // rng.randint(10, 16)
+        for x in range(0, width, step):
+            draw.line((x, 0, x, height), fill=ink, width=1)
+        for y in range(0, height, step):
+            draw.line((0, y, width, y), fill=ink, width=1)
+    else:
+        amplitude, period = height / 40, width / rng.uniform(1.5, 3)
+        for base in range(0, height, height // 18):
+            points = [(x, base + amplitude * math.sin(2 * math.pi * x / period + base)) for x in range(0, width + 20, 20)]
+            draw.line(points, fill=ink, width=max(2, width // 250))
+    image.paste(overlay, (0, 0), overlay)
+
+
+# --------------------------------------------------
+# 🖌️ Render
+# --------------------------------------------------
+def render_cover(title, subtitle="", output_path=None, width=None):
+    """
+    Draws a cover for `title` without any network access: a per-topic
+    gradient and pattern with the wrapped title and subtitle. Returns the
+    JPEG path, or the PIL image when `output_path` is None.
+    """
+    width = width or COVER_WIDTH
+    height = round(width * PAGE_RATIO)
+    top, bottom, pattern, digest = palette_for(title)
+
+    image = gradient((width, height), top, bottom)
+    draw_pattern(image, pattern, digest)
+    draw = ImageDraw.Draw(image)
+
+    margin = width // 10
+    text_width_max = width - 2 * margin
+    title_size, title_lines = fit_text(title, FONT_BOLD, text_width_max, 5,
+                                       [round(width * f) for f in (0.095, 0.085, 0.075, 0.065, 0.055, 0.048)])
+    blocks = [(FONT_BOLD, title_size, title_lines, (255, 255, 255))]
+    if subtitle:
+        sub_size, sub_lines = fit_text(subtitle, FONT_REG, text_width_max, 3,
+                                       [round(width * f) for f in (0.042, 0.036, 0.031)])
+        blocks.append((FONT_REG, sub_size, sub_lines, (230, 230, 230)))
+
+    # Title block sits a little above centre; the subtitle follows a rule.
+    line_gap = 1.2
+    gap = round(width * 0.05)
+    total = sum(round(size * line_gap) * len(lines) for _, size, lines, _ in blocks) + gap * (len(blocks) - 1)
+    y = round(height * 0.42 - total / 2)
+    for n, (path, size, lines, colour) in enumerate(blocks):
+        if n:
+            rule = round(width * 0.12)
+            draw.line((width / 2 - rule, y + gap / 2 - 1, width / 2 + rule, y + gap / 2 - 1),
+                      fill=(255, 255, 255), width=max(2, width // 300))
+            y += gap
+        font = get_font(path, size)
+        for line in lines:
+            x = (width - text_width(path, size, line)) / 2
+            draw.text((x + 2, y + 2), line, font=font, fill=(0, 0, 0))  # soft shadow
+            draw.text((x, y), line, font=font, fill=colour)
+            y += round(size * line_gap)
+
+    if output_path is None:
+        return image
+    if os.path.dirname(output_path):
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    image.save(output_path, "JPEG", quality=COVER_QUALITY)
+    return output_path
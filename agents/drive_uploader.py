@@ -1,6 +1,10 @@
 import os
-import json
+import time
+import uuid
 import mimetypes
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 from googleapiclient.discovery import build
 from googleapiclient.http import MediaFileUpload
 from google.oauth2 import service_account
@@ -13,11 +17,29 @@ from dotenv import load_dotenv
 # --------------------------------------------------
 load_dotenv()
 SCOPES = ["https://www.googleapis.com/auth/drive.file"]
+TOKEN_PATH = "credentials/token.json"
+
+# --------------------------------------------------
+# ⚙️ Settings
+# --------------------------------------------------
+# "google" (default) or "fake" (FakeDriveService, files copied to a local folder).
+DRIVE_BACKEND = os.getenv("BOOKFORGE_DRIVE_BACKEND", "google").strip().lower()
+UPLOAD_WORKERS = int(os.getenv("BOOKFORGE_UPLOAD_WORKERS", "3"))
+# Files up to this size go up in one multipart request; resumable uploads
+# cost an extra round trip to open the session.
+RESUMABLE_THRESHOLD = int(float(os.getenv("BOOKFORGE_RESUMABLE_THRESHOLD_MB", "5")) * 1024 * 1024)
+FAKE_DRIVE_DIR = os.getenv("BOOKFORGE_FAKE_DRIVE_DIR", os.path.join("data", "drive_fake"))
+
 
 # --------------------------------------------------
 # 🧩 Load credentials (OAuth > Service Account)
 # --------------------------------------------------
-def get_drive_service():
+def _save_token(creds):
+    with open(TOKEN_PATH, "w") as token:
+        token.write(creds.to_json())
+
+
+def load_credentials():
     creds = None
     credentials_path = os.getenv("GOOGLE_CREDENTIALS_PATH", "").strip()
 
@@ -29,12 +51,11 @@ def get_drive_service():
     # -------------------------------
     if "client_secret" in credentials_path:
         print("🔐 Using OAuth (user login)...")
-        token_path = "credentials/token.json"
 
         # Try loading existing OAuth token
-        if os.path.exists(token_path):
+        if os.path.exists(TOKEN_PATH):
             from google.oauth2.credentials import Credentials
-            creds = Credentials.from_authorized_user_file(token_path, SCOPES)
+            creds = Credentials.from_authorized_user_file(TOKEN_PATH, SCOPES)
 
         # If no token or expired, trigger new login flow
         if not creds or not creds.valid:
@@ -43,51 +64,228 @@ def get_drive_service():
             else:
                 flow = InstalledAppFlow.from_client_secrets_file(credentials_path, SCOPES)
                 creds = flow.run_local_server(port=0)
-            with open(token_path, "w") as token:
-                token.write(creds.to_json())
-                print("✅ Saved OAuth token for future uploads.")
-
-        return build("drive", "v3", credentials=creds)
+            _save_token(creds)
+            print("✅ Saved OAuth token for future uploads.")
+        return creds
 
     # -------------------------------
     # 2️⃣ Fallback: Service Account
     # -------------------------------
-    else:
-        print("🧠 Using Service Account credentials...")
-        creds = service_account.Credentials.from_service_account_file(credentials_path, scopes=SCOPES)
-        return build("drive", "v3", credentials=creds)
+    print("🧠 Using Service Account credentials...")
+    return service_account.Credentials.from_service_account_file(credentials_path, scopes=SCOPES)
+
+
+def get_drive_service(creds=None):
+    # Static discovery document: no network round trip to build the client.
+    return build("drive", "v3", credentials=creds or load_credentials(), cache_discovery=False)
 
 
 # --------------------------------------------------
-# ☁️ Upload File Function
+# 🧪 Fake Drive
 # --------------------------------------------------
-def upload_to_drive(file_path, folder_id=None):
-    """Uploads a file to Google Drive (inside specified folder if provided)."""
-    if not os.path.exists(file_path):
-        raise FileNotFoundError(f"⚠️ File not found: {file_path}")
+class FakeDriveService:
+    """
+    Local stand-in for the part of the Drive v3 API we use
+    (files().create(...).execute()). Uploaded files are copied into
+    `directory`, so the upload stage can run (and be load-tested) without
+    credentials or network.
+
+    - latency: seconds to sleep per upload (simulates round trips).
+    """
+
+    def __init__(self, directory=FAKE_DRIVE_DIR, latency=0.0):
+        self.directory = directory
+        self.latency = latency
+        self.uploads = []
+        self._lock = threading.Lock()
+
+    def files(self):
+        return self
+
+    def create(self, body, media_body, fields=None):
+        service = self
+
+        class _Request:
+            def execute(self, num_retries=0):
+                return service._store(body, media_body)
+
+        return _Request()
+
+    def _store(self, body, media_body):
+        time.sleep(self.latency)
+        data = media_body.getbytes(0, media_body.size())
+        file_id = uuid.uuid4().hex
+        folder = os.path.join(self.directory, *(body.get("parents") or []))
+        os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, body["name"]), "wb") as f:
+            f.write(data)
+        with self._lock:
+            self.uploads.append({"id": file_id, "name": body["name"], "size": len(data)})
+        return {"id": file_id, "webViewLink": f"file://{os.path.abspath(os.path.join(folder, body['name']))}"}
+
+
+# --------------------------------------------------
+# ☁️ Long-lived uploader
+# --------------------------------------------------
+class DriveUploader:
+    """
+    Keeps credentials and Drive clients alive across uploads.
+
+    - Credentials are loaded once and refreshed only when they have expired
+      (under a lock, so concurrent uploads don't all refresh at once).
+    - The Drive client's httplib2 transport is not thread-safe, so each
+      worker thread builds its own client once and reuses it.
+    - upload_batch() sends several files at once with a bounded pool.
 
-    service = get_drive_service()
-    file_name = os.path.basename(file_path)
-    mime_type, _ = mimetypes.guess_type(file_path)
+    `service_factory(creds)` builds a client; pass one returning a
+    FakeDriveService (and `credentials=False`) to test without Google.
+    """
 
-    file_metadata = {"name": file_name}
-    if folder_id:
-        file_metadata["parents"] = [folder_id]
+    def __init__(self, service_factory=None, credentials=None, workers=UPLOAD_WORKERS):
+        self.service_factory = service_factory or get_drive_service
+        self.workers = max(1, workers)
+        self._creds = credentials
+        self._creds_lock = threading.Lock()
+        self._local = threading.local()
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._counters = {"uploads": 0, "bytes": 0, "failures": 0, "refreshes": 0, "clients": 0}
 
-    media = MediaFileUpload(file_path, mimetype=mime_type, resumable=True)
-    print(f"☁️ Uploading {file_name} to Google Drive...")
+    def _count(self, **increments):
+        with self._stats_lock:
+            for name, value in increments.items():
+                self._counters[name] += value
 
-    uploaded = service.files().create(
-        body=file_metadata,
-        media_body=media,
-        fields="id, webViewLink"
-    ).execute()
+    def stats(self):
+        """{"uploads", "bytes", "failures", "refreshes", "clients"} for this process."""
+        with self._stats_lock:
+            return dict(self._counters)
+
+    def credentials(self):
+        """Cached credentials, refreshed only once they are expired or missing a token."""
+        if self._creds is False:  # fake service, no credentials needed
+            return None
+        with self._creds_lock:
+            if self._creds is None:
+                self._creds = load_credentials()
+            creds = self._creds
+            # Service accounts start without a token and are refreshed on
+            # first use; OAuth tokens need a refresh token to renew.
+            if not creds.valid and (getattr(creds, "refresh_token", None) or isinstance(creds, service_account.Credentials)):
+                print("🔄 Refreshing Google Drive credentials...")
+                creds.refresh(Request())
+                self._count(refreshes=1)
+                if not isinstance(creds, service_account.Credentials):
+                    _save_token(creds)
+            return creds
+
+    def service(self):
+        """This thread's Drive client, built on first use."""
+        creds = self.credentials()
+        service = getattr(self._local, "service", None)
+        if service is None:
+            service = self._local.service = self.service_factory(creds)
+            self._count(clients=1)
+        return service
+
+    def upload(self, file_path, folder_id=None, name=None):
+        """Uploads one file, as `name` (default: its file name); returns {"id", "webViewLink"}."""
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f"⚠️ File not found: {file_path}")
+
+        file_name = name or os.path.basename(file_path)
+        mime_type, _ = mimetypes.guess_type(file_path)
+        size = os.path.getsize(file_path)
+
+        file_metadata = {"name": file_name}
+        if folder_id:
+            file_metadata["parents"] = [folder_id]
+
+        media = MediaFileUpload(file_path, mimetype=mime_type or "application/octet-stream",
+                                resumable=size > RESUMABLE_THRESHOLD)
+        print(f"☁️ Uploading {file_name} to Google Drive...")
+        uploaded = self.service().files().create(
+            body=file_metadata,
+            media_body=media,
+            fields="id, webViewLink"
+        ).execute()
+        self._count(uploads=1, bytes=size)
+        print(f"✅ Uploaded successfully → {uploaded.get('webViewLink')}")
+        return uploaded
+
+    def _executor(self):
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="drive")
+            return self._pool
+
+    def upload_batch(self, file_paths, folder_id=None, names=None):
+        """
+        Uploads the files concurrently (at most `workers` at a time across
+        all batches), named as in `names` ({path: name}) or after the file.
+        Returns {path: file id, or None if that upload failed}; one failure
+        doesn't stop the others.
+        """
+        names = names or {}
+        paths = [p for p in dict.fromkeys(file_paths) if p]
+        futures = {
+            # copy_context keeps the caller's log prefix in the upload threads
+            path: self._executor().submit(contextvars.copy_context().run, self.upload, path, folder_id, names.get(path))
+            for path in paths
+        }
+        results = {}
+        for path, future in futures.items():
+            try:
+                results[path] = future.result().get("id")
+            except Exception as e:
+                print(f"❌ Upload failed for {os.path.basename(path)}: {e}")
+                self._count(failures=1)
+                results[path] = None
+        return results
+
+    def close(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True)
+                self._pool = None
+
+
+def build_uploader(backend=None):
+    """Uploader from BOOKFORGE_DRIVE_BACKEND: "google" (default) or "fake"."""
+    backend = (backend or DRIVE_BACKEND).strip().lower()
+    if backend == "fake":
+        fake = FakeDriveService(latency=float(os.getenv("BOOKFORGE_FAKE_DRIVE_LATENCY", "0")))
+        return DriveUploader(service_factory=lambda creds: fake, credentials=False)
+    if backend == "google":
+        return DriveUploader()
+    raise ValueError(f"❌ Unknown Drive backend: {backend}")
+
+
+_uploader = None
+_uploader_lock = threading.Lock()
+
+
+def get_uploader():
+    """The process-wide DriveUploader."""
+    global _uploader
+    with _uploader_lock:
+        if _uploader is None:
+            _uploader = build_uploader()
+        return _uploader
+
+
+# --------------------------------------------------
+# ☁️ Upload File Function
+# --------------------------------------------------
+def upload_to_drive(file_path, folder_id=None):
+    """Uploads a file to Google Drive (inside specified folder if provided)."""
+    return get_uploader().upload(file_path, folder_id).get("id")
 
-    file_id = uploaded.get("id")
-    web_link = uploaded.get("webViewLink")
 
-    print(f"✅ Uploaded successfully → {web_link}")
-    return file_id
+def upload_batch_to_drive(file_paths, folder_id=None, names=None):
+    """Uploads several files concurrently (named as in `names`); returns {path: file id or None}."""
+    return get_uploader().upload_batch(file_paths, folder_id, names)
 
 
 # --------------------------------------------------
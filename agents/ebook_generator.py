@@ -1,28 +1,363 @@
 import os
+import re
 import json
+import hashlib
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from dotenv import load_dotenv
-from google import genai
+from agents.llm_gateway import get_gateway
+from agents.structured_output import OUTLINE_SCHEMA, MIN_CHAPTER_CHARS, ValidationError, validate_chapter, validate_outline
+from agents.ebook_stream import EbookStreamWriter, is_stream_path, iter_stream_chapters
 
 # --------------------------------------------------
 # Load environment variables
 # --------------------------------------------------
 load_dotenv()
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
-if not GEMINI_API_KEY:
-    raise ValueError("❌ GEMINI_API_KEY missing in .env")
+# Max chapter requests in flight at once, and how many extra rounds the
+# chapters that failed get before we give up on the book.
+CHAPTER_CONCURRENCY = int(os.getenv("BOOKFORGE_CHAPTER_CONCURRENCY", "4"))
+CHAPTER_RETRIES = int(os.getenv("BOOKFORGE_CHAPTER_RETRIES", "2"))
+# Chapters requested per Gemini call; 1 = one request per chapter.
+CHAPTER_BATCH_SIZE = int(os.getenv("BOOKFORGE_CHAPTER_BATCH_SIZE", "1"))
+# Reuse unchanged chapters from the previous eBook of the same topic.
+INCREMENTAL = os.getenv("BOOKFORGE_INCREMENTAL", "0").strip().lower() in ("1", "true", "yes", "on")
+# Stream chapters to a JSONL file as they are written instead of one JSON at the end.
+STREAM_CHAPTERS = os.getenv("BOOKFORGE_STREAM_CHAPTERS", "0").strip().lower() in ("1", "true", "yes", "on")
+CHECKPOINT_DIR = os.path.join("data", "ebooks", ".partial")
 
-client = genai.Client(api_key=GEMINI_API_KEY)
+
+# --------------------------------------------------
+# 💾 Chapter Checkpoints
+# --------------------------------------------------
+class ChapterCheckpoint:
+    """
+    Append-only JSONL file of finished chapters for one outline, so a
+    crashed run can resume and only write the chapters that are missing.
+    The file name carries a hash of the outline: editing the outline
+    starts a fresh checkpoint instead of mixing in stale chapters.
+    """
+
+    def __init__(self, topic, title, chapters):
+        outline_key = json.dumps({"title": title, "chapters": chapters}, sort_keys=True, ensure_ascii=False)
+        digest = hashlib.sha256(outline_key.encode("utf-8")).hexdigest()[:16]
+        safe_topic = topic.replace(" ", "_").replace("/", "_").lower()[:40]
+        self.path = os.path.join(CHECKPOINT_DIR, f"{safe_topic}_{digest}.jsonl")
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Returns {chapter_index: chapter} for every chapter already written."""
+        done = {}
+        if not os.path.exists(self.path):
+            return done
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # torn last line from a crash mid-write
+                done[record["index"]] = record["chapter"]
+        return done
+
+    def save(self, index, chapter):
+        with self._lock:
+            os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+            line = json.dumps({"index": index, "chapter": chapter}, ensure_ascii=False) + "\n"
+            with open(self.path, "ab+") as f:
+                # After a crash mid-write the file may end in a torn line;
+                # start on a fresh line so this record isn't glued onto it.
+                f.seek(0, os.SEEK_END)
+                if f.tell():
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        line = "\n" + line
+                f.write(line.encode("utf-8"))
+                f.flush()
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+# --------------------------------------------------
+# 🔍 Incremental regeneration
+# --------------------------------------------------
+def chapter_hash(chapter):
+    """Hash of an outline chapter's title and description."""
+    key = json.dumps([chapter.get("chapter_title", ""), chapter.get("description", "")], ensure_ascii=False)
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+
+def find_previous_ebook(topic, exclude=None):
+    """Most recent eBook (.json or .jsonl) written for `topic`, or None."""
+    ebook_dir = os.path.join("data", "ebooks")
+    if not os.path.isdir(ebook_dir):
+        return None
+    pattern = re.compile(rf"^{re.escape(topic.replace(' ', '_').lower())}_\d{{8}}_\d{{4}}\.jsonl?$")
+    candidates = [
+        os.path.join(ebook_dir, f) for f in os.listdir(ebook_dir)
+        if pattern.match(f) and os.path.join(ebook_dir, f) != exclude
+    ]
+    return max(candidates, key=os.path.getmtime) if candidates else None
+
+
+def load_ebook_chapters(ebook_path):
+    if is_stream_path(ebook_path):
+        return list(iter_stream_chapters(ebook_path))
+    with open(ebook_path, "r", encoding="utf-8") as f:
+        return json.load(f).get("chapters", [])
+
+
+def match_previous_chapters(chapters, previous_chapters):
+    """
+    Returns {index: previous chapter} for every outline chapter whose
+    title/description hash matches a chapter of the previous eBook.
+    Chapters written before hashes were recorded never match.
+    """
+    by_hash = {ch["source_hash"]: ch for ch in previous_chapters if ch.get("source_hash") and ch.get("content")}
+    return {
+        i: by_hash[chapter_hash(ch)]
+        for i, ch in enumerate(chapters)
+        if chapter_hash(ch) in by_hash
+    }
+
+
+# --------------------------------------------------
+# ✍️ Chapter Writer
+# --------------------------------------------------
+def write_chapter(title, idx, chapter, stream=False, use_cache=True):
+    """Generates the text of a single chapter. Returns the chapter dict."""
+    chapter_title = chapter.get("chapter_title", f"Chapter {idx}")
+    description = chapter.get("description", "")
+
+    prompt = f"""
+    You are a professional eBook writer. Write a detailed, engaging, 
+    reader-friendly chapter for the eBook titled "{title}".
+    Chapter title: "{chapter_title}"
+    Description: {description}
+    Write in natural, clear English with real insights and flow.
+    """
+
+    accepted = {}
+
+    def accept(text):
+        # Empty or truncated text raises here (and is not cached), so the
+        # chapter is retried.
+        accepted["chapter"] = validate_chapter({
+            "chapter_title": chapter_title,
+            "content": text.strip(),
+            "source_hash": chapter_hash(chapter)
+        })
+
+    print(f"📝 Writing chapter {idx}: {chapter_title}...")
+    if stream:
+        # Streamed responses avoid one long blocking request per chapter;
+        # only this chapter's text is ever held in memory.
+        for _ in get_gateway().stream(prompt, agent="chapter", use_cache=use_cache, validate=accept):
+            pass
+    else:
+        get_gateway().generate(prompt, agent="chapter", use_cache=use_cache, validate=accept)
+    return accepted["chapter"]
+
+
+_BATCH_CHAPTER_RE = re.compile(r"<<<CHAPTER (\d+)>>>(.*?)<<<END CHAPTER \1>>>", re.DOTALL)
+
+
+def write_chapter_batch(title, items, stream=False, use_cache=True):
+    """
+    Writes several chapters with one request. `items` is a list of
+    (idx, chapter) pairs. Returns {idx: chapter dict} for the chapters that
+    came back complete; missing or malformed ones are simply left out.
+    Only responses with every chapter complete are cached.
+    """
+    requested = "\n".join(
+        f'Chapter {idx}: "{ch.get("chapter_title", f"Chapter {idx}")}"\n'
+        f'Description: {ch.get("description", "")}\n'
+        for idx, ch in items
+    )
+    prompt = f"""
+    You are a professional eBook writer. Write detailed, engaging, 
+    reader-friendly chapters for the eBook titled "{title}".
+    Write in natural, clear English with real insights and flow.
+
+    Write every chapter listed below. Wrap each one exactly like this,
+    using the chapter number given:
+    <<<CHAPTER n>>>
+    (chapter text)
+    <<<END CHAPTER n>>>
+
+    {requested}
+    """
+
+    numbers = ", ".join(str(idx) for idx, _ in items)
+    print(f"📝 Writing chapters {numbers} in one request...")
+    wanted = {idx: ch for idx, ch in items}
+    written = {}
+
+    def accept(text):
+        written.clear()
+        for match in _BATCH_CHAPTER_RE.finditer(text):
+            idx = int(match.group(1))
+            if idx not in wanted or idx in written:
+                continue
+            try:
+                written[idx] = validate_chapter({
+                    "chapter_title": wanted[idx].get("chapter_title", f"Chapter {idx}"),
+                    "content": match.group(2).strip(),
+                    "source_hash": chapter_hash(wanted[idx])
+                })
+            except ValidationError:
+                pass
+        if len(written) < len(wanted):
+            raise ValidationError("incomplete batch response")
+
+    try:
+        if stream:
+            for _ in get_gateway().stream(prompt, agent="chapter", use_cache=use_cache, validate=accept):
+                pass
+        else:
+            get_gateway().generate(prompt, agent="chapter", use_cache=use_cache, validate=accept)
+    except ValidationError:
+        pass  # keep the complete chapters; the rest are re-requested
+
+    missing = [idx for idx in wanted if idx not in written]
+    if missing:
+        print(f"⚠️ Batch response missing or malformed for chapter(s): {', '.join(map(str, missing))}")
+    return written
+
+
+def _write_unit(title, chapters, indices, stream, use_cache=True):
+    """Writes the chapters at `indices` (0-based); returns {index: chapter}."""
+    if len(indices) == 1:
+        i = indices[0]
+        return {i: write_chapter(title, i + 1, chapters[i], stream, use_cache)}
+    written = write_chapter_batch(title, [(i + 1, chapters[i]) for i in indices], stream, use_cache)
+    return {idx - 1: chapter for idx, chapter in written.items()}
+
+
+def write_chapters_parallel(title, chapters, max_workers=None, max_retries=None, checkpoint=None,
+                            on_ready=None, stream=False, batch_size=None, reuse=None):
+    """
+    Writes all chapters concurrently (at most `max_workers` requests in flight)
+    and returns them in outline order. Only the chapters that failed are
+    retried, up to `max_retries` extra rounds. With a `checkpoint`, chapters
+    found in it are reused and every new chapter is saved as it arrives.
+
+    With `on_ready(index, chapter)`, chapters are handed over in outline
+    order as soon as they and all earlier ones are done, and are not kept
+    (the function then returns None).
+
+    With `batch_size` > 1 (BOOKFORGE_CHAPTER_BATCH_SIZE), consecutive
+    chapters are requested together; chapters missing from a batch
+    response are re-requested in the next round.
+
+    `reuse` ({index: chapter}) supplies chapters that are already written,
+    e.g. unchanged chapters of a previous eBook.
+    """
+    max_workers = max(1, max_workers or CHAPTER_CONCURRENCY)
+    max_retries = CHAPTER_RETRIES if max_retries is None else max_retries
+    batch_size = max(1, batch_size or CHAPTER_BATCH_SIZE)
+
+    results = {}
+    next_index = 0
+
+    def complete(i, chapter):
+        nonlocal next_index
+        results[i] = chapter
+        if on_ready:
+            while next_index in results:
+                on_ready(next_index, results.pop(next_index))
+                next_index += 1
+
+    saved = dict(reuse or {})
+    if checkpoint:
+        resumed = {i: ch for i, ch in checkpoint.load().items() if 0 <= i < len(chapters) and i not in saved}
+        if resumed:
+            print(f"♻️ Resuming from checkpoint: {len(resumed)}/{len(chapters)} chapters already written.")
+        saved.update(resumed)
+
+    done = set()
+    for i in sorted(saved):
+        done.add(i)
+        complete(i, saved[i])
+
+    pending = [i for i in range(len(chapters)) if i not in done]
+    errors = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="chapter") as pool:
+        for attempt in range(max_retries + 1):
+            if not pending:
+                break
+            if attempt:
+                print(f"🔁 Retrying {len(pending)} failed chapter(s) (round {attempt}/{max_retries})...")
+
+            units = [pending[start:start + batch_size] for start in range(0, len(pending), batch_size)]
+            futures = {
+                # copy_context keeps the caller's log prefix in worker threads;
+                # retries skip the response cache to get a fresh answer.
+                pool.submit(contextvars.copy_context().run, _write_unit, title, chapters, unit, stream,
+                            attempt == 0): unit
+                for unit in units
+            }
+            pending = []
+            for future in as_completed(futures):
+                unit = futures[future]
+                try:
+                    written = future.result()
+                except Exception as e:
+                    print(f"⚠️ Chapter(s) {', '.join(str(i + 1) for i in unit)} failed: {e}")
+                    for i in unit:
+                        errors[i] = e
+                    pending.extend(unit)
+                    continue
+                for i in unit:
+                    if i not in written:
+                        errors[i] = ValueError("missing from batch response")
+                        pending.append(i)
+                        continue
+                    if checkpoint:
+                        checkpoint.save(i, written[i])
+                    complete(i, written[i])
+
+    if pending:
+        pending.sort()
+        failed = ", ".join(str(i + 1) for i in pending)
+        raise RuntimeError(f"❌ {len(pending)} chapter(s) failed after retries: {failed} ({errors[pending[0]]})")
+
+    if on_ready:
+        return None
+    return [results[i] for i in range(len(chapters))]
 
 
 # --------------------------------------------------
 # 🧠 Generate eBook Content
 # --------------------------------------------------
-def generate_ebook_from_outline(outline_path):
+def generate_ebook_from_outline(outline_path, max_workers=None, max_retries=None, stream=None, batch_size=None,
+                                incremental=None, previous_ebook=None, on_stream_open=None):
     """
     Reads the SEO or trend JSON and uses Gemini to write full eBook chapters.
+    Chapters are written concurrently; see write_chapters_parallel().
+    Finished chapters are checkpointed, so re-running after a crash only
+    writes the missing ones.
+
+    With `stream` (or BOOKFORGE_STREAM_CHAPTERS=1) chapters use streamed
+    Gemini responses and are appended to a .jsonl eBook (see ebook_stream)
+    in outline order as they finish; the path of that file is returned.
+    `on_stream_open(path)` is called as soon as the file exists, so a reader
+    (e.g. the PDF stage) can follow it while chapters are still written.
+
+    With `incremental` (or BOOKFORGE_INCREMENTAL=1) chapters whose title and
+    description are unchanged since `previous_ebook` (default: the latest
+    eBook for the same topic) are copied over; only added or edited
+    chapters are sent to Gemini.
     """
+    if stream is None:
+        stream = STREAM_CHAPTERS
+    if incremental is None:
+        incremental = INCREMENTAL or previous_ebook is not None
+
     print(f"📖 Loading outline from: {outline_path}")
     if not os.path.exists(outline_path):
         raise FileNotFoundError(f"⚠️ Outline not found at {outline_path}")
@@ -56,23 +391,18 @@ def generate_ebook_from_outline(outline_path):
         }}
         """
 
-        outline_response = client.models.generate_content(
-            model="models/gemini-2.5-flash",
-            contents=prompt
+        outline_data = get_gateway().generate_structured(
+            prompt, agent="outline", schema=OUTLINE_SCHEMA,
+            validator=lambda data: validate_outline(data, topic)
         )
 
-        outline_text = outline_response.text.strip()
-        try:
-            # Try to parse Gemini JSON
-            outline_data = json.loads(outline_text.strip("`json\n "))
-        except Exception:
-            outline_data = {"topic": topic, "chapters": [{"chapter_title": topic, "description": outline_text}]}
-
     # --------------------------------------------------
     # Case 2: It's already a valid SEO outline
     # --------------------------------------------------
     elif isinstance(outline_data, dict):
-        topic = outline_data.get("topic", "Untitled")
+        # Fail before any chapter call if the saved outline is unusable.
+        outline_data = validate_outline(outline_data)
+        topic = outline_data["topic"]
     else:
         raise ValueError("❌ Unsupported JSON format for eBook generation.")
 
@@ -86,45 +416,67 @@ def generate_ebook_from_outline(outline_path):
         "subtitle": subtitle,
         "topic": topic,
         "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        # Recorded ahead of the chapters so readers get the count (for the
+        # PDF's table of contents) without a second pass; see ebook_stream.
+        "chapter_count": len(chapters),
         "chapters": []
     }
 
-    # --------------------------------------------------
-    # Generate each chapter
-    # --------------------------------------------------
-    for idx, ch in enumerate(chapters, start=1):
-        chapter_title = ch.get("chapter_title", f"Chapter {idx}")
-        description = ch.get("description", "")
+    os.makedirs("data/ebooks", exist_ok=True)
+    base_path = f"data/ebooks/{topic.replace(' ', '_').lower()}_{datetime.now().strftime('%Y%m%d_%H%M')}"
+    checkpoint = ChapterCheckpoint(topic, title, chapters)
 
-        prompt = f"""
-        You are a professional eBook writer. Write a detailed, engaging, 
-        reader-friendly chapter for the eBook titled "{title}".
-        Chapter title: "{chapter_title}"
-        Description: {description}
-        Write in natural, clear English with real insights and flow.
-        """
+    reuse = {}
+    if incremental:
+        previous_ebook = previous_ebook or find_previous_ebook(topic)
+        if previous_ebook:
+            reuse = match_previous_chapters(chapters, load_ebook_chapters(previous_ebook))
+            print(f"♻️ Incremental: reusing {len(reuse)}/{len(chapters)} chapters from {previous_ebook}, "
+                  f"regenerating {len(chapters) - len(reuse)}.")
+        else:
+            print("ℹ️ Incremental: no previous eBook for this topic, writing all chapters.")
 
-        print(f"📝 Writing chapter {idx}: {chapter_title}...")
-        response = client.models.generate_content(
-            model="models/gemini-2.5-flash",
-            contents=prompt
-        )
+    # --------------------------------------------------
+    # Streaming mode: append each chapter to JSONL as it is ready
+    # --------------------------------------------------
+    if stream:
+        output_path = f"{base_path}.jsonl"
+        meta = {k: v for k, v in ebook_content.items() if k != "chapters"}
+        writer = EbookStreamWriter(output_path, meta)
+        print(f"📡 Streaming chapters → {output_path}")
+        try:
+            if on_stream_open:
+                on_stream_open(output_path)
+            write_chapters_parallel(
+                title, chapters, max_workers=max_workers, max_retries=max_retries,
+                checkpoint=checkpoint, on_ready=writer.write_chapter, stream=True,
+                batch_size=batch_size, reuse=reuse
+            )
+        except Exception as e:
+            writer.abort(e)
+            raise
+        writer.close()
+        checkpoint.clear()
+        print(f"✅ eBook streamed successfully → {output_path}")
+        return output_path
 
-        text = response.text.strip() if hasattr(response, "text") else str(response)
-        ebook_content["chapters"].append({
-            "chapter_title": chapter_title,
-            "content": text
-        })
+    # --------------------------------------------------
+    # Generate chapters (in parallel, assembled in outline order)
+    # --------------------------------------------------
+    ebook_content["chapters"] = write_chapters_parallel(
+        title, chapters, max_workers=max_workers, max_retries=max_retries,
+        checkpoint=checkpoint, batch_size=batch_size, reuse=reuse
+    )
 
     # --------------------------------------------------
     # Save eBook JSON
     # --------------------------------------------------
-    os.makedirs("data/ebooks", exist_ok=True)
-    output_path = f"data/ebooks/{topic.replace(' ', '_').lower()}_{datetime.now().strftime('%Y%m%d_%H%M')}.json"
+    output_path = f"{base_path}.json"
 
     with open(output_path, "w", encoding="utf-8") as f:
         json.dump(ebook_content, f, indent=2, ensure_ascii=False)
 
+    checkpoint.clear()
     print(f"✅ eBook saved successfully → {output_path}")
     return output_path
 
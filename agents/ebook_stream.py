@@ -0,0 +1,279 @@
+import os
+import json
+import time
+import contextlib
+
+# --------------------------------------------------
+# 📜 Streamed eBook format (JSONL)
+# --------------------------------------------------
+# One JSON object per line:
+#   {"type": "meta", "title": ..., "subtitle": ..., "topic": ..., "created_at": ..., "chapter_count": N}
+#   {"type": "chapter", "index": 0, "chapter_title": ..., "content": ...}
+#   ...
+#   {"type": "end", "chapters": N}        (or {"type": "aborted", "error": ...})
+# Chapters are appended in outline order as soon as they are written, so a
+# reader can start on the first chapters while later ones are in progress.
+
+# A following reader gives up after this many seconds without a new record
+# (e.g. the writing process died before it could mark the file aborted).
+STREAM_IDLE_TIMEOUT = float(os.getenv("BOOKFORGE_STREAM_IDLE_TIMEOUT", "600"))
+
+
+class StreamAborted(RuntimeError):
+    """The writer gave up on the eBook; it will never be complete."""
+
+
+class EbookStreamWriter:
+    """Appends an eBook to a JSONL file one chapter at a time."""
+
+    def __init__(self, path, meta):
+        self.path = path
+        self.count = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._file = open(path, "w", encoding="utf-8")
+        self._write({"type": "meta", **meta})
+
+    def _write(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def write_chapter(self, index, chapter):
+        self._write({"type": "chapter", "index": index, **chapter})
+        self.count += 1
+
+    def close(self):
+        """Writes the end marker; readers following the file stop there."""
+        self._write({"type": "end", "chapters": self.count})
+        self._file.close()
+
+    def abort(self, error=None):
+        """Marks the book as incomplete, so readers following it stop with StreamAborted."""
+        self._write({"type": "aborted", "error": str(error or "writer aborted")})
+        self._file.close()
+
+
+def _iter_records(path, follow=False, poll_interval=0.5, timeout=None):
+    timeout = STREAM_IDLE_TIMEOUT if timeout is None else timeout
+    last_record = time.monotonic()
+    with open(path, "r", encoding="utf-8") as f:
+        partial = ""
+        while True:
+            line = f.readline()
+            if line:
+                partial += line
+                if not partial.endswith("\n"):
+                    continue  # writer is mid-line
+                record = json.loads(partial)
+                partial = ""
+                last_record = time.monotonic()
+                if record.get("type") == "aborted":
+                    raise StreamAborted(f"❌ eBook {path} was aborted: {record.get('error')}")
+                yield record
+                if record.get("type") == "end":
+                    return
+                continue
+            if not follow:
+                return
+            if time.monotonic() - last_record > timeout:
+                raise TimeoutError(f"⚠️ No new record in {path} for {timeout}s")
+            time.sleep(poll_interval)
+
+
+def read_stream_meta(path):
+    """Returns the meta record (title, subtitle, topic, created_at)."""
+    for record in _iter_records(path):
+        if record.get("type") == "meta":
+            record = dict(record)
+            record.pop("type")
+            return record
+    raise ValueError(f"❌ No meta record in {path}")
+
+
+def _stream_chapters(records):
+    for record in records:
+        if record.get("type") == "chapter":
+            chapter = dict(record)
+            chapter.pop("type")
+            chapter.pop("index", None)
+            yield chapter
+
+
+def iter_stream_chapters(path, follow=False, poll_interval=0.5, timeout=None):
+    """
+    Yields chapter dicts in order. With `follow`, keeps waiting for new
+    chapters until the writer's end marker (like `tail -f`); raises
+    StreamAborted if the writer gave up, and TimeoutError after `timeout`
+    seconds (default STREAM_IDLE_TIMEOUT) without a new record.
+    """
+    return _stream_chapters(_iter_records(path, follow=follow, poll_interval=poll_interval, timeout=timeout))
+
+
+def is_stream_path(path):
+    return str(path).endswith(".jsonl")
+
+
+# --------------------------------------------------
+# 🪶 Incremental reader for single-file JSON eBooks
+# --------------------------------------------------
+# A JSON eBook is one object with a "chapters" list. The reader below walks
+# it with json.JSONDecoder.raw_decode over a sliding buffer, so only one
+# chapter (plus one read chunk) is in memory at a time, however long the
+# book is. ebook_generator writes every other field, including
+# "chapter_count", before the list, so open_ebook() gets meta, count and
+# chapters in a single pass; other files are scanned once up front.
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\r\n"
+
+
+class _JsonScanner:
+    def __init__(self, f, chunk_size=64 * 1024):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self, size):
+        data = self.f.read(size)
+        if not data:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Next non-whitespace character ("" at end of file)."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf) or not self._fill(self.chunk_size):
+                return self.buf[self.pos:self.pos + 1]
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"❌ Malformed eBook JSON: expected '{char}' at offset {self.pos}")
+        self.pos += 1
+
+    def value(self):
+        size = self.chunk_size
+        while True:
+            self.peek()
+            try:
+                obj, end = _decoder.raw_decode(self.buf, self.pos)
+                # A number at the end of the buffer may continue in the next chunk.
+                if end < len(self.buf) or self.eof or self.buf[end - 1] in '"]}el':
+                    self.pos = end
+                    return obj
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            # Value longer than what is buffered: read more (growing reads
+            # keep huge chapters from being re-parsed too often).
+            if not self._fill(size):
+                continue
+            size *= 2
+
+
+def _iter_json_ebook(path):
+    """Yields ("meta", key, value) and ("chapter", chapter) in file order."""
+    with open(path, "r", encoding="utf-8") as f:
+        scanner = _JsonScanner(f)
+        scanner.expect("{")
+        if scanner.peek() == "}":
+            return
+        while True:
+            key = scanner.value()
+            scanner.expect(":")
+            if key == "chapters" and scanner.peek() == "[":
+                scanner.expect("[")
+                if scanner.peek() != "]":
+                    while True:
+                        yield ("chapter", scanner.value())
+                        if scanner.peek() != ",":
+                            break
+                        scanner.expect(",")
+                scanner.expect("]")
+            else:
+                yield ("meta", key, scanner.value())
+            if scanner.peek() != ",":
+                break
+            scanner.expect(",")
+        scanner.expect("}")
+
+
+def _scan_json_ebook(path):
+    meta, count = {}, 0
+    for event in _iter_json_ebook(path):
+        if event[0] == "meta":
+            meta[event[1]] = event[2]
+        else:
+            count += 1
+    return meta, count
+
+
+def read_json_meta(path):
+    """
+    Top-level fields of a JSON eBook except "chapters". Fields may follow
+    the chapter list, so the whole file is scanned, one chapter at a time.
+    """
+    return _scan_json_ebook(path)[0]
+
+
+def iter_json_chapters(path):
+    """Yields the chapters of a JSON eBook one at a time."""
+    for event in _iter_json_ebook(path):
+        if event[0] == "chapter":
+            yield event[1]
+
+
+def _open_stream_ebook(path, follow):
+    records = _iter_records(path, follow=follow)
+    first = next(records, None)
+    if first is None or first.get("type") != "meta":
+        raise ValueError(f"❌ No meta record in {path}")
+    meta = {k: v for k, v in first.items() if k != "type"}
+    count = meta.get("chapter_count")
+    if count is None and not follow:
+        # Streams written before the meta record carried the count.
+        count = sum(1 for record in _iter_records(path) if record.get("type") == "chapter")
+    return meta, _stream_chapters(records), count
+
+
+def _open_json_ebook(path):
+    events = _iter_json_ebook(path)
+    meta, first = {}, None
+    for event in events:
+        if event[0] == "chapter":
+            first = event
+            break
+        meta[event[1]] = event[2]
+    if "chapter_count" not in meta:
+        # Fields may follow the chapter list: scan the whole file first.
+        events.close()
+        meta, count = _scan_json_ebook(path)
+        return meta, iter_json_chapters(path), count
+
+    def chapters():
+        with contextlib.closing(events):
+            if first is not None:
+                yield first[1]
+            for event in events:
+                if event[0] == "chapter":
+                    yield event[1]
+
+    return meta, chapters(), meta["chapter_count"]
+
+
+def open_ebook(path, follow=False):
+    """
+    (meta, chapter iterator, chapter count) for a JSON or JSONL eBook;
+    chapters are read lazily in both cases, in the same pass as the meta
+    when the eBook records its "chapter_count" up front. `follow` applies
+    to JSONL (see iter_stream_chapters); the count is None if the eBook is
+    still being written and doesn't record it.
+    """
+    if is_stream_path(path):
+        return _open_stream_ebook(path, follow)
+    return _open_json_ebook(path)
@@ -0,0 +1,165 @@
+import os
+import re
+import json
+import hashlib
+import threading
+
+# --------------------------------------------------
+# 🧱 Layout IR
+# --------------------------------------------------
+# Chapter text from Gemini is Markdown. It is converted once into a small,
+# format-neutral list of blocks that renderers (PDF today) lay out directly:
+#
+#   {"type": "heading", "level": 2, "spans": [[text, style], ...]}
+#   {"type": "paragraph", "spans": [...]}
+#   {"type": "item", "marker": "•" | "1.", "depth": 0, "spans": [...]}
+#   {"type": "quote", "spans": [...]}
+#   {"type": "rule"}
+#
+# A span's style is "", "B", "I" or "BI". The IR of every chapter is cached
+# on disk next to the eBook, keyed by a hash of the chapter text, so
+# re-rendering (e.g. with another theme) never parses Markdown again.
+
+IR_VERSION = 1
+IR_DIR_NAME = ".layout"
+
+_HEADING_RE = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+_ITEM_RE = re.compile(r"^(\s*)([-*+•]|\d{1,3}[.)])\s+(.*)$")
+_RULE_RE = re.compile(r"^\s*([-*_])(\s*\1){2,}\s*$")
+# One alternation, scanned left to right: bold italic, bold, italic, code, link.
+_INLINE_RE = re.compile(
+    r"\*\*\*(?P<bi>.+?)\*\*\*|\*\*(?P<b1>.+?)\*\*|__(?P<b2>.+?)__"
+    r"|(?<![\w*])\*(?P<i1>[^*\s](?:.*?[^*\s])?)\*(?!\*)|(?<!\w)_(?P<i2>[^_\s](?:.*?[^_\s])?)_(?!\w)"
+    r"|`(?P<code>[^`]+)`|\[(?P<link>[^\]]+)\]\([^)\s]*\)"
+)
+
+
+def parse_inline(text, style=""):
+    """Splits inline Markdown into [[text, style], ...] spans."""
+    spans = []
+    pos = 0
+    for match in _INLINE_RE.finditer(text):
+        if match.start() > pos:
+            spans.append([text[pos:match.start()], style])
+        kind = match.lastgroup
+        inner = match.group(kind)
+        if kind == "bi":
+            spans.extend(parse_inline(inner, "BI"))
+        elif kind in ("b1", "b2"):
+            spans.extend(parse_inline(inner, "".join(sorted(set(style + "B")))))
+        elif kind in ("i1", "i2"):
+            spans.extend(parse_inline(inner, "".join(sorted(set(style + "I")))))
+        else:
+            spans.append([inner, style])
+        pos = match.end()
+    if pos < len(text):
+        spans.append([text[pos:], style])
+
+    # Merge neighbours with the same style.
+    merged = []
+    for span in spans:
+        if merged and merged[-1][1] == span[1]:
+            merged[-1][0] += span[0]
+        elif span[0]:
+            merged.append(span)
+    return merged
+
+
+def markdown_to_ir(text):
+    """Converts chapter Markdown to a list of IR blocks in one pass over its lines."""
+    blocks = []
+    paragraph = []
+
+    def flush():
+        if paragraph:
+            blocks.append({"type": "paragraph", "spans": parse_inline(" ".join(paragraph))})
+            paragraph.clear()
+
+    for raw in text.splitlines():
+        line = raw.strip()
+        if not line:
+            flush()
+            continue
+
+        heading = _HEADING_RE.match(line)
+        if heading:
+            flush()
+            blocks.append({"type": "heading", "level": len(heading.group(1)), "spans": parse_inline(heading.group(2))})
+            continue
+        if _RULE_RE.match(line):
+            flush()
+            blocks.append({"type": "rule"})
+            continue
+        item = _ITEM_RE.match(raw)
+        if item:
+            flush()
+            marker = item.group(2)
+            blocks.append({
+                "type": "item",
+                "marker": marker if marker[0].isdigit() else "•",
+                "depth": min(3, len(item.group(1).expandtabs(4)) // 2),
+                "spans": parse_inline(item.group(3)),
+            })
+            continue
+        if line.startswith(">"):
+            flush()
+            blocks.append({"type": "quote", "spans": parse_inline(line.lstrip("> ").strip())})
+            continue
+        if blocks and blocks[-1]["type"] == "item" and raw[:1].isspace() and not paragraph:
+            # Continuation line of a list item.
+            blocks[-1]["spans"] += parse_inline(" " + line)
+            continue
+        paragraph.append(line)
+    flush()
+    return blocks
+
+
+# --------------------------------------------------
+# 💾 On-disk IR cache
+# --------------------------------------------------
+def content_hash(text):
+    return hashlib.sha256(f"{IR_VERSION}\n{text}".encode("utf-8")).hexdigest()
+
+
+def ir_cache_dir(ebook_path):
+    return os.path.join(os.path.dirname(ebook_path) or ".", IR_DIR_NAME)
+
+
+class LayoutCache:
+    """
+    IR blocks per chapter text, one small JSON file per content hash in a
+    `.layout` directory next to the eBook. Chapters shared between eBooks
+    (e.g. reused by incremental generation) share one entry.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def for_ebook(cls, ebook_path):
+        return cls(ir_cache_dir(ebook_path))
+
+    def get_blocks(self, text):
+        key = content_hash(text)
+        path = os.path.join(self.directory, f"{key}.json")
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                blocks = json.load(f)
+            self.hits += 1
+            return blocks
+        except (OSError, ValueError):
+            pass
+
+        self.misses += 1
+        blocks = markdown_to_ir(text)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(blocks, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"⚠️ Could not cache layout IR: {e}")
+        return blocks
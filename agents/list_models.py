@@ -1,10 +1,5 @@
-from google import genai
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
-client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+from agents.llm_gateway import get_gateway
 
 print("🔍 Listing available Gemini models:")
-for model in client.models.list():
-    print(" -", model.name)
+for model_name in get_gateway().list_models():
+    print(" -", model_name)
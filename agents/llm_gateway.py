@@ -0,0 +1,456 @@
+import os
+import re
+import ast
+import json
+import time
+import random
+import hashlib
+import threading
+from concurrent.futures import Future
+from dotenv import load_dotenv
+from agents.response_cache import ResponseCache, make_key
+from agents.rate_limiter import RateLimiter, estimate_tokens
+from agents.structured_output import extract_json, request_structured
+
+# --------------------------------------------------
+# ⚙️ Setup
+# --------------------------------------------------
+load_dotenv()
+
+DEFAULT_MODEL = os.getenv("BOOKFORGE_LLM_MODEL", "models/gemini-2.5-flash")
+DEFAULT_TIMEOUT = float(os.getenv("BOOKFORGE_LLM_TIMEOUT", "120"))
+DEFAULT_RETRIES = int(os.getenv("BOOKFORGE_LLM_RETRIES", "4"))
+
+# Quota errors and transient server errors are worth retrying; anything else
+# (bad request, auth) will fail the same way again.
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    """Raised by backends for failed calls; `status` mirrors the HTTP code."""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+def error_status(error):
+    """Best-effort HTTP status of an exception raised by any backend."""
+    for attr in ("status", "code", "status_code"):
+        value = getattr(error, attr, None)
+        if isinstance(value, int):
+            return value
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None)
+
+
+def is_retryable(error):
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    return error_status(error) in RETRYABLE_STATUS
+
+
+# --------------------------------------------------
+# 🧹 Response helpers
+# --------------------------------------------------
+def strip_code_fences(text):
+    """Removes a ```json ... ``` wrapper around a model response."""
+    text = text.strip()
+    if text.startswith("```"):
+        text = re.sub(r"^```(?:json)?", "", text, flags=re.IGNORECASE).strip()
+        text = re.sub(r"```$", "", text).strip()
+    return text
+
+
+def parse_json_response(text):
+    """
+    Parses JSON out of a model response (fenced or surrounded by prose).
+    Raises ValueError if no JSON can be found.
+    """
+    return extract_json(text)
+
+
+# --------------------------------------------------
+# 🔌 Backends
+# --------------------------------------------------
+class GeminiBackend:
+    """Google Gemini via the google-genai SDK. The client is created on first use."""
+
+    name = "gemini"
+
+    def __init__(self, api_key=None):
+        self.api_key = api_key or os.getenv("GEMINI_API_KEY")
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                if not self.api_key:
+                    raise ValueError("❌ GEMINI_API_KEY not found in .env!")
+                from google import genai
+                self._client = genai.Client(api_key=self.api_key)
+            return self._client
+
+    def _config(self, timeout, config):
+        from google.genai import types
+        options = dict(config or {})
+        if timeout:
+            options["http_options"] = types.HttpOptions(timeout=int(timeout * 1000))
+        return types.GenerateContentConfig(**options) if options else None
+
+    def generate(self, model, prompt, timeout=None, config=None, agent="default"):
+        response = self.client.models.generate_content(
+            model=model,
+            contents=prompt,
+            config=self._config(timeout, config)
+        )
+        return response.text.strip() if getattr(response, "text", None) else str(response)
+
+    def stream(self, model, prompt, timeout=None, config=None, agent="default"):
+        for chunk in self.client.models.generate_content_stream(
+            model=model,
+            contents=prompt,
+            config=self._config(timeout, config)
+        ):
+            if getattr(chunk, "text", None):
+                yield chunk.text
+
+    def list_models(self):
+        return [model.name for model in self.client.models.list()]
+
+
+class FakeBackend:
+    """
+    Deterministic local stand-in for Gemini: the same prompt always gives
+    the same answer, shaped like what each agent expects. Lets the whole
+    pipeline run (and be load-tested) without network or API key.
+
+    - latency: seconds to sleep per call (simulates round trips).
+    - error_rate: fraction of calls that fail with a 429 (exercises retries).
+    - responders: {agent: fn(prompt) -> str} to override the defaults.
+    """
+
+    name = "fake"
+
+    def __init__(self, latency=0.0, error_rate=0.0, responders=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.responders = {
+            "trend": self._score_topics,
+            "outline": self._outline,
+            "chapter": self._chapter,
+        }
+        self.responders.update(responders or {})
+
+    @staticmethod
+    def _seed(prompt):
+        return int(hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8], 16)
+
+    def _score_topics(self, prompt):
+        match = re.search(r"Topics:\s*(\[.*\])", prompt, re.DOTALL)
+        try:
+            topics = ast.literal_eval(match.group(1)) if match else []
+        except (ValueError, SyntaxError):
+            topics = []
+        return json.dumps([
+            {"topic": t, "score": self._seed(f"{t}") % 101, "reason": "Fake backend score"}
+            for t in topics
+        ])
+
+    def _outline(self, prompt):
+        match = re.search(r'"topic":\s*"([^"]*)"', prompt) or re.search(r"topic:\s*(.+?)\.?\n", prompt)
+        topic = match.group(1).strip() if match else "Untitled"
+        chapters = [
+            {"chapter_title": f"{topic}: Part {i}", "description": f"Key ideas about {topic}, part {i}."}
+            for i in range(1, 4 + self._seed(topic) % 8)
+        ]
+        return json.dumps({
+            "topic": topic,
+            "title": f"{topic.title()}: The Complete Guide",
+            "subtitle": f"Everything you need to know about {topic}",
+            "keywords": [topic, f"{topic} guide"],
+            "chapters": chapters,
+        }, ensure_ascii=False)
+
+    def _chapter_text(self, chapter_title, seed_text):
+        rng = random.Random(self._seed(seed_text))
+        words = ["insight", "growth", "strategy", "history", "future", "people", "ideas", "change"]
+        paragraphs = [
+            " ".join(rng.choice(words) for _ in range(60)).capitalize() + "."
+            for _ in range(4)
+        ]
+        return f"## {chapter_title}\n\n" + "\n\n".join(paragraphs)
+
+    def _chapter(self, prompt):
+        batch = re.findall(r'^\s*Chapter (\d+):\s*"([^"]*)"', prompt, re.MULTILINE)
+        if "<<<CHAPTER" in prompt and batch:
+            return "\n\n".join(
+                f"<<<CHAPTER {n}>>>\n{self._chapter_text(t, prompt + n)}\n<<<END CHAPTER {n}>>>"
+                for n, t in batch
+            )
+        match = re.search(r'Chapter title:\s*"([^"]*)"', prompt)
+        chapter_title = match.group(1) if match else "Chapter"
+        return self._chapter_text(chapter_title, prompt)
+
+    def generate(self, model, prompt, timeout=None, config=None, agent="default"):
+        if self.latency:
+            if timeout and self.latency > timeout:
+                time.sleep(timeout)
+                raise TimeoutError(f"Fake backend timed out after {timeout}s")
+            time.sleep(self.latency)
+        if self.error_rate and random.random() < self.error_rate:
+            raise LLMError("Fake backend quota exceeded", status=429)
+        responder = self.responders.get(agent)
+        if responder:
+            return responder(prompt)
+        return f"Fake response {self._seed(prompt):08x}"
+
+    def stream(self, model, prompt, timeout=None, config=None, agent="default", chunk_size=256):
+        text = self.generate(model, prompt, timeout=timeout, config=config, agent=agent)
+        for start in range(0, len(text), chunk_size):
+            yield text[start:start + chunk_size]
+
+    def list_models(self):
+        return [DEFAULT_MODEL]
+
+
+# --------------------------------------------------
+# 🚪 Gateway
+# --------------------------------------------------
+class LLMGateway:
+    """
+    Single entry point for every LLM call made by the agents.
+
+    - Per-call timeouts.
+    - Retries with full-jitter exponential backoff on 429/5xx/timeouts.
+    - Identical prompts already in flight are sent once; the other
+      callers wait for and share that result.
+    - Optional persistent ResponseCache keyed by model, prompt and config.
+    - Optional RateLimiter enforcing RPM/TPM budgets and stage priorities.
+    """
+
+    def __init__(self, backend, model=DEFAULT_MODEL, timeout=DEFAULT_TIMEOUT,
+                 max_retries=DEFAULT_RETRIES, backoff_base=1.0, backoff_cap=30.0,
+                 cache=None, limiter=None):
+        self.backend = backend
+        self.cache = cache
+        self.limiter = limiter
+        self.model = model
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "retries": 0, "deduplicated": 0, "errors": 0}
+
+    def _count(self, key, n=1):
+        with self._lock:
+            self.stats[key] += n
+
+    def _backoff(self, attempt):
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+    def _send(self, prompt, agent, model, timeout, config):
+        if self.limiter is None:
+            return self.backend.generate(model, prompt, timeout=timeout, config=config, agent=agent)
+        with self.limiter.slot(prompt, agent) as call:
+            try:
+                call.response = self.backend.generate(model, prompt, timeout=timeout, config=config, agent=agent)
+            except Exception as e:
+                call.throttled = error_status(e) == 429
+                raise
+            return call.response
+
+    def _send_stream(self, prompt, agent, model, timeout, config):
+        chunks = self.backend.stream(model, prompt, timeout=timeout, config=config, agent=agent)
+        if self.limiter is None:
+            yield from chunks
+            return
+        with self.limiter.slot(prompt, agent) as call:
+            # Count tokens per chunk so the response text isn't kept around.
+            call.response_tokens = 0
+            try:
+                for chunk in chunks:
+                    call.response_tokens += estimate_tokens(chunk)
+                    yield chunk
+            except Exception as e:
+                call.throttled = error_status(e) == 429
+                raise
+
+    def _call(self, prompt, agent, model, timeout, config):
+        for attempt in range(self.max_retries + 1):
+            self._count("calls")
+            try:
+                return self._send(prompt, agent, model, timeout, config)
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    self._count("errors")
+                    raise
+                delay = self._backoff(attempt)
+                self._count("retries")
+                print(f"⏳ {agent} call failed ({error_status(e) or type(e).__name__}), retrying in {delay:.1f}s...")
+                time.sleep(delay)
+
+    def _cached_text(self, key, agent, validate):
+        text = self.cache.get(key, agent)
+        if text is not None and validate is not None:
+            try:
+                validate(text)
+            except Exception:
+                return None  # stale or bad entry: ask again and overwrite it
+        return text
+
+    def generate(self, prompt, agent="default", model=None, timeout=None, config=None, use_cache=True,
+                 validate=None):
+        """
+        Returns the model's text response for `prompt`. With `validate(text)`
+        the response is only cached (and returned) if validate doesn't raise;
+        its error is raised to the caller instead.
+        """
+        model = model or self.model
+        timeout = timeout or self.timeout
+        key = make_key(model, prompt, config)
+
+        cached = use_cache and self.cache is not None and self.cache.enabled_for(agent)
+        if cached:
+            text = self._cached_text(key, agent, validate)
+            if text is not None:
+                return text
+
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+            else:
+                self.stats["deduplicated"] += 1
+
+        if not leader:
+            text = future.result()
+            if validate is not None:
+                validate(text)
+            return text
+
+        try:
+            text = self._call(prompt, agent, model, timeout, config)
+            if validate is not None:
+                validate(text)
+            if cached:
+                self.cache.put(key, text, agent)
+            future.set_result(text)
+            return text
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def stream(self, prompt, agent="default", model=None, timeout=None, config=None, use_cache=True,
+               validate=None):
+        """
+        Yields the response text in chunks as the model produces it.
+        Failures before the first chunk are retried like generate(); once
+        text has been yielded, errors propagate to the caller. With
+        `validate(text)` the full text is checked after the last chunk and
+        only cached if it passes (otherwise its error is raised).
+        """
+        model = model or self.model
+        timeout = timeout or self.timeout
+        key = make_key(model, prompt, config)
+
+        cached = use_cache and self.cache is not None and self.cache.enabled_for(agent)
+        if cached:
+            text = self._cached_text(key, agent, validate)
+            if text is not None:
+                yield text
+                return
+
+        parts = []
+        for attempt in range(self.max_retries + 1):
+            self._count("calls")
+            started = False
+            try:
+                for chunk in self._send_stream(prompt, agent, model, timeout, config):
+                    started = True
+                    if cached or validate is not None:
+                        parts.append(chunk)
+                    yield chunk
+                break
+            except Exception as e:
+                if started or attempt >= self.max_retries or not is_retryable(e):
+                    self._count("errors")
+                    raise
+                delay = self._backoff(attempt)
+                self._count("retries")
+                print(f"⏳ {agent} stream failed ({error_status(e) or type(e).__name__}), retrying in {delay:.1f}s...")
+                time.sleep(delay)
+
+        if cached or validate is not None:
+            text = "".join(parts).strip()
+            if validate is not None:
+                validate(text)
+            if cached:
+                self.cache.put(key, text, agent)
+
+    def generate_json(self, prompt, agent="default", **kwargs):
+        """Like generate(), but parses the response. Raises ValueError on bad JSON."""
+        return parse_json_response(self.generate(prompt, agent=agent, **kwargs))
+
+    def generate_structured(self, prompt, agent, validator, schema=None, attempts=None, use_cache=True):
+        """
+        JSON call validated by `validator` (see structured_output); invalid
+        answers are re-requested uncached. Raises ValidationError.
+        """
+        return request_structured(self, prompt, agent, validator, schema=schema, attempts=attempts, use_cache=use_cache)
+
+    def list_models(self):
+        return self.backend.list_models()
+
+
+# --------------------------------------------------
+# 🌐 Shared instance
+# --------------------------------------------------
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def build_backend(name=None):
+    """Backend from BOOKFORGE_LLM_BACKEND: "gemini" (default) or "fake"."""
+    name = (name or os.getenv("BOOKFORGE_LLM_BACKEND", "gemini")).strip().lower()
+    if name == "fake":
+        return FakeBackend(
+            latency=float(os.getenv("BOOKFORGE_FAKE_LATENCY", "0")),
+            error_rate=float(os.getenv("BOOKFORGE_FAKE_ERROR_RATE", "0")),
+        )
+    if name == "gemini":
+        return GeminiBackend()
+    raise ValueError(f"❌ Unknown LLM backend: {name}")
+
+
+def get_gateway():
+    """
+    Returns the process-wide gateway, creating it on first use.
+    The response cache is on unless BOOKFORGE_CACHE=0; the rate limiter
+    uses BOOKFORGE_GEMINI_RPM / BOOKFORGE_GEMINI_TPM / BOOKFORGE_LLM_CONCURRENCY.
+    """
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            use_cache = os.getenv("BOOKFORGE_CACHE", "1").strip().lower() not in ("0", "false", "no", "off")
+            _gateway = LLMGateway(
+                build_backend(),
+                cache=ResponseCache() if use_cache else None,
+                limiter=RateLimiter(),
+            )
+        return _gateway
+
+
+def set_gateway(gateway):
+    """Replaces the process-wide gateway (e.g. with a FakeBackend for load tests)."""
+    global _gateway
+    with _gateway_lock:
+        _gateway = gateway
@@ -0,0 +1,116 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+from agents.topic_index import normalize_topic
+
+# --------------------------------------------------
+# ⚙️ Settings
+# --------------------------------------------------
+STORE_PATH = os.getenv("BOOKFORGE_OUTLINE_STORE_PATH", os.path.join("data", "cache", "outline_store.sqlite3"))
+
+# How long a stored outline is reused. News topics (a match, an election,
+# a product launch) change daily; evergreen topics ("weekly horoscope",
+# "home workouts") don't. Override with BOOKFORGE_OUTLINE_TTL_<KIND> (hours).
+OUTLINE_TTLS = {
+    "news": float(os.getenv("BOOKFORGE_OUTLINE_TTL_NEWS", "12")) * 60 * 60,
+    "evergreen": float(os.getenv("BOOKFORGE_OUTLINE_TTL_EVERGREEN", str(90 * 24))) * 60 * 60,
+}
+
+# Words that mark a topic as time-bound news.
+NEWS_WORDS = {
+    "vs", "v", "versus", "live", "today", "tonight", "yesterday", "tomorrow", "breaking", "news",
+    "score", "scores", "result", "results", "highlights", "match", "final", "election", "elections",
+    "launch", "release", "released", "announced", "death", "dies", "died", "arrested", "verdict",
+    "earthquake", "storm", "weather", "stock", "stocks", "price", "ipo", "box", "trailer", "update",
+}
+_YEAR_RE = re.compile(r"\b(19|20)\d{2}\b")
+
+
+def classify_topic(topic):
+    """ "news" for time-bound topics, "evergreen" otherwise. """
+    normalized = normalize_topic(topic)
+    if _YEAR_RE.search(normalized) or NEWS_WORDS & set(normalized.split()):
+        return "news"
+    return "evergreen"
+
+
+def outline_ttl_days(topic):
+    """
+    How long (in days) an outline for `topic` stays reusable. main.py caps
+    the topic index's dedupe window with it: a news topic is worth a new
+    book once its outline has gone stale, so it is not skipped as "covered
+    recently" for longer than that (evergreen topics keep the full window).
+    """
+    return OUTLINE_TTLS[classify_topic(topic)] / 86400
+
+
+# --------------------------------------------------
+# 🗂️ Outline Store
+# --------------------------------------------------
+class OutlineStore:
+    """
+    Outlines keyed by normalized topic, so the next cycle can reuse one
+    instead of asking Gemini again. Entries expire by topic kind (see
+    OUTLINE_TTLS); hit/miss counters are in stats().
+    """
+
+    def __init__(self, path=STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "expired": 0}
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS outlines (
+                key TEXT PRIMARY KEY,
+                topic TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                outline TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )"""
+        )
+        self._db.commit()
+
+    def get(self, topic):
+        """Returns the stored outline dict if still fresh, else None."""
+        key = normalize_topic(topic)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT kind, outline, created_at FROM outlines WHERE key = ?", (key,)
+            ).fetchone()
+            if row and time.time() - row[2] > OUTLINE_TTLS.get(row[0], OUTLINE_TTLS["news"]):
+                self._db.execute("DELETE FROM outlines WHERE key = ?", (key,))
+                self._db.commit()
+                self._counters["expired"] += 1
+                row = None
+            if row is None:
+                self._counters["misses"] += 1
+                return None
+            self._counters["hits"] += 1
+            return json.loads(row[1])
+
+    def put(self, topic, outline, kind=None):
+        kind = kind or classify_topic(topic)
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO outlines (key, topic, kind, outline, created_at) VALUES (?, ?, ?, ?, ?)",
+                (normalize_topic(topic), topic, kind, json.dumps(outline, ensure_ascii=False), time.time()),
+            )
+            self._db.commit()
+
+    def stats(self):
+        """{"hits", "misses", "expired", "hit_rate"} for this process."""
+        with self._lock:
+            c = dict(self._counters)
+        c["hit_rate"] = round(c["hits"] / max(1, c["hits"] + c["misses"]), 3)
+        return c
+
+    def close(self):
+        with self._lock:
+            self._db.close()
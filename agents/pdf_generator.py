@@ -1,107 +1,593 @@
 import os
+import io
+import sys
+import copy
+import glob
+import hashlib
+import pickle
 import json
+import time
+import argparse
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
 from datetime import datetime
 from fpdf import FPDF
+from fpdf.enums import XPos, YPos
+from fpdf.fonts import TTFFont, SubsetMap, TextEmphasis
+from fontTools import ttLib
+from agents.ebook_stream import open_ebook
+from agents.layout_ir import LayoutCache
+from agents.cover_processing import prepare_cover
 
 # Font file paths (make sure these exist)
 FONT_DIR = os.path.join("assets")
 FONT_REG = os.path.join(FONT_DIR, "DejaVuSans.ttf")
 FONT_BOLD = os.path.join(FONT_DIR, "DejaVuSans-Bold.ttf")
 FONT_ITALIC = os.path.join(FONT_DIR, "DejaVuSans-Oblique.ttf")
+FONT_VARIANTS = (("", FONT_REG), ("B", FONT_BOLD), ("I", FONT_ITALIC))
+
+# Batch mode: worker processes and where the PDFs go (one per eBook, named
+# after it, so re-runs can tell which PDFs are up to date).
+PDF_WORKERS = int(os.getenv("BOOKFORGE_PDF_WORKERS", str(os.cpu_count() or 2)))
+BATCH_OUTPUT_DIR = os.getenv("BOOKFORGE_PDF_BATCH_DIR", os.path.join("data", "pdfs", "batch"))
+
+# Sizes in pt, heights/indents in mm. Pass another dict to PDFRenderer to
+# re-theme; the cached layout IR (see layout_ir) is reused as is.
+DEFAULT_THEME = {
+    "body_size": 12,
+    "line_height": 8,
+    "heading_sizes": {1: 18, 2: 16, 3: 14},
+    "heading_min_size": 13,
+    "heading_line_height": 10,
+    "indent": 6,
+}
+
+
+# --------------------------------------------------
+# 🔤 Font Cache
+# --------------------------------------------------
+class _FontHost:
+    """Just enough of an FPDF for TTFFont.__init__ to parse a font file."""
+    fonts = {}
+    str_alias_nb_pages = None
+
+
+class CachedTTFFont(TTFFont):
+    """
+    TTFFont with an incremental width cache. fpdf's line breaking asks for
+    the width of a fragment after every added character, which re-sums the
+    whole prefix each time; here only the new characters are added.
+    """
+    __slots__ = ("_last_text", "_last_units")
+
+    def get_text_width(self, text, font_size_pt, text_shaping_parms):
+        if text_shaping_parms:
+            return super().get_text_width(text, font_size_pt, text_shaping_parms)
+        if not isinstance(text, str):
+            text = "".join(text)  # fragments pass lists of characters
+        last = self._last_text
+        if last and text.startswith(last):
+            units = self._last_units + sum(map(self.cw.__getitem__, map(ord, text[len(last):])))
+        else:
+            units = sum(map(self.cw.__getitem__, map(ord, text)))
+        self._last_text, self._last_units = text, units
+        return (len(text), units * font_size_pt * 0.001)
+
+
+# Every TTFFont slot FontCache.add_font() fills in ("hbfont" is created
+# lazily by fpdf itself). This mirrors TTFFont.__init__ of the fpdf2
+# version pinned in requirements.txt; if an upgrade changes the slots,
+# FontCache falls back to plain pdf.add_font().
+_CACHED_FONT_SLOTS = {
+    "i", "type", "name", "desc", "glyph_ids", "hbfont", "up", "ut", "cw", "ttffile",
+    "fontkey", "emphasis", "scale", "subset", "cmap", "ttfont", "missing_glyphs",
+}
+
+
+def _fpdf_internals_match():
+    return set(TTFFont.__slots__) == _CACHED_FONT_SLOTS
+
+
+# Tables fontTools' subsetter reads while fpdf writes a PDF. Template fonts
+# are pickled with these already decompiled, which is cheaper to undo per
+# document than parsing them again (a full decompile, GSUB/GPOS included,
+# would cost more than it saves).
+_SUBSET_TABLES = ("head", "hhea", "maxp", "post", "cmap", "hmtx", "loca", "glyf")
+
+
+class FontCache:
+    """
+    Parses each TTF once per process and hands every new document a
+    CachedTTFFont that shares the parsed metrics: character widths, cmap
+    and glyph ids. Only the pieces fpdf mutates while writing a PDF (the
+    subset map, the font descriptor and the fontTools object that gets
+    subsetted) are per document; the latter is unpickled from a copy whose
+    subsetting tables are already decompiled.
+
+    The gain is smaller than the parse time it skips: unpickling still
+    costs ~20 ms per font, and subsetting at output time is per document
+    either way. benchmarks/bench_pdf_render.py measures ~50 ms saved per
+    12-chapter book (~1.3 s, so ~4%) and ~120 ms per 3-chapter one (~23%).
+
+    This builds fonts from fpdf internals; when they don't look like the
+    pinned fpdf2 (or building one fails), fonts are added the plain way.
+    """
+
+    def __init__(self, enabled=None):
+        self._templates = {}
+        self._lock = threading.Lock()
+        self.enabled = _fpdf_internals_match() if enabled is None else enabled
+        if not self.enabled:
+            print("⚠️ fpdf2 internals differ from the pinned version; fonts are parsed per document.")
+
+    def _disable(self, error):
+        print(f"⚠️ Font cache disabled, parsing fonts per document: {error}")
+        self.enabled = False
+
+    def _template(self, path):
+        path = str(path)
+        with self._lock:
+            if path not in self._templates:
+                template = TTFFont(_FontHost(), Path(path), "template", "")
+                template.ttfont.close()
+                template.ttfont = None
+                with open(path, "rb") as f:
+                    ttfont = ttLib.TTFont(io.BytesIO(f.read()), recalcTimestamp=False, fontNumber=0, lazy=True)
+                ttfont.getGlyphOrder()
+                for tag in _SUBSET_TABLES:
+                    ttfont[tag]
+                self._templates[path] = (template, pickle.dumps(ttfont, pickle.HIGHEST_PROTOCOL))
+            return self._templates[path]
+
+    def warm_up(self, paths):
+        if not self.enabled:
+            return
+        for path in paths:
+            try:
+                self._template(path)
+            except Exception as e:
+                self._disable(e)
+                return
+
+    def add_font(self, pdf, family, style, path):
+        """Like pdf.add_font(family, style, path), without re-parsing the file."""
+        if self.enabled:
+            try:
+                self._add_cached_font(pdf, family, style, path)
+                return
+            except Exception as e:
+                self._disable(e)
+        pdf.add_font(family, style, path)
+
+    def _add_cached_font(self, pdf, family, style, path):
+        template, ttfont = self._template(path)
+        font = CachedTTFFont.__new__(CachedTTFFont)
+        font._last_text, font._last_units = "", 0
+        for slot in ("type", "name", "up", "ut", "scale", "cw", "cmap", "glyph_ids"):
+            setattr(font, slot, getattr(template, slot))
+        font.i = len(pdf.fonts) + 1
+        font.ttffile = Path(path)
+        font.fontkey = f"{family.lower()}{style}"
+        font.emphasis = TextEmphasis.coerce(style)
+        font.desc = copy.copy(template.desc)
+        font.missing_glyphs = []
+        font.ttfont = pickle.loads(ttfont)
+
+        reserved = "\x00 \r\n"
+        if pdf.str_alias_nb_pages:
+            reserved += "0123456789" + pdf.str_alias_nb_pages
+        font.subset = SubsetMap(font, [ord(char) for char in reserved])
+        pdf.fonts[font.fontkey] = font
+
+
+_font_cache = FontCache()
+
 
 class PDF(FPDF):
+    # Set when page 1 is a full-page cover image: no header or footer on it.
+    has_cover = False
+
     def header(self):
-        if self.page_no() != 1:
+        if self.page_no() > (2 if self.has_cover else 1):
             self.set_font("DejaVu", "B", 12)
-            self.cell(0, 10, self.title, align="C", ln=True)
+            self.cell(0, 10, self.title, align="C", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
             self.ln(5)
 
     def footer(self):
+        if self.has_cover and self.page_no() == 1:
+            return
         self.set_y(-15)
         self.set_font("DejaVu", "I", 10)
         self.cell(0, 10, f"Page {self.page_no()}", align="C")
 
-def generate_pdf_from_ebook(ebook_path):
-    print(f"📖 Loading eBook JSON from: {ebook_path}")
-    with open(ebook_path, "r", encoding="utf-8") as f:
-        ebook = json.load(f)
-
-    title = ebook.get("title", "Untitled eBook")
-    subtitle = ebook.get("subtitle", "")
-    toc = ebook.get("table_of_contents", [])
-    chapters = ebook.get("chapters", [])
-    summary = ebook.get("executive_summary", "")
-    created_at = ebook.get("created_at", datetime.now().strftime("%Y-%m-%d"))
-
-    os.makedirs("data/pdfs", exist_ok=True)
-    safe_title = title.replace(" ", "_").replace("'", "").lower()
-    output_path = f"data/pdfs/{safe_title}_{datetime.now().strftime('%Y%m%d_%H%M')}.pdf"
-
-    pdf = PDF()
-    pdf.set_auto_page_break(auto=True, margin=15)
-
-    # ✅ Add all font variants
-    pdf.add_font("DejaVu", "", FONT_REG, uni=True)
-    pdf.add_font("DejaVu", "B", FONT_BOLD, uni=True)
-    pdf.add_font("DejaVu", "I", FONT_ITALIC, uni=True)
-
-    pdf.title = title
-    pdf.add_page()
-
-    # 🧱 COVER PAGE
-    pdf.set_font("DejaVu", "B", 28)
-    pdf.cell(0, 20, title, ln=True, align="C")
-    pdf.set_font("DejaVu", "", 16)
-    pdf.cell(0, 12, subtitle, ln=True, align="C")
-    pdf.ln(20)
-    pdf.set_font("DejaVu", "", 12)
-    pdf.multi_cell(0, 8, summary)
-    pdf.add_page()
-
-    # 📑 TABLE OF CONTENTS
-    if toc:
-        pdf.set_font("DejaVu", "B", 20)
-        pdf.cell(0, 15, "Table of Contents", ln=True)
-        pdf.set_font("DejaVu", "", 12)
-        for item in toc:
-            pdf.cell(0, 8, item, ln=True)
+# --------------------------------------------------
+# 🖨️ Renderer
+# --------------------------------------------------
+class PDFRenderer:
+    """
+    Renders eBooks to PDF. Meant to be long-lived: fonts come from a
+    process-wide FontCache, so only the first book pays for parsing them.
+    """
+
+    def __init__(self, font_cache=None, theme=None):
+        self.font_cache = font_cache or _font_cache
+        self.theme = {**DEFAULT_THEME, **(theme or {})}
+
+    def warm_up(self):
+        """Parses the fonts now instead of during the first render."""
+        self.font_cache.warm_up(path for _, path in FONT_VARIANTS)
+
+    def new_document(self, title):
+        pdf = PDF()
+        pdf.set_auto_page_break(auto=True, margin=15)
+        for style, path in FONT_VARIANTS:
+            self.font_cache.add_font(pdf, "DejaVu", style, path)
+        pdf.title = title
+        return pdf
+
+    @staticmethod
+    def _font_style(style):
+        # Only regular, bold and italic DejaVu files ship in assets/.
+        return "B" if "B" in style else style
+
+    def _write_spans(self, pdf, spans, size, height, force_style=""):
+        for text, style in spans:
+            pdf.set_font("DejaVu", self._font_style(style + force_style), size)
+            pdf.write(height, text)
+        pdf.ln(height)
+
+    def render_blocks(self, pdf, blocks, chapter_title=""):
+        """Lays out layout IR blocks (see layout_ir) with the current theme."""
+        theme = self.theme
+        size, height = theme["body_size"], theme["line_height"]
+        left = pdf.l_margin
+        for n, block in enumerate(blocks):
+            kind = block["type"]
+            if kind == "heading":
+                text = "".join(span[0] for span in block["spans"])
+                if n == 0 and text.strip().lower() == chapter_title.strip().lower():
+                    continue  # the chapter title is already printed above
+                heading_size = theme["heading_sizes"].get(block["level"], theme["heading_min_size"])
+                pdf.ln(2)
+                self._write_spans(pdf, block["spans"], heading_size, theme["heading_line_height"], "B")
+            elif kind == "paragraph":
+                self._write_spans(pdf, block["spans"], size, height)
+                pdf.ln(2)
+            elif kind == "item":
+                indent = left + theme["indent"] * (block["depth"] + 1)
+                pdf.set_font("DejaVu", "", size)
+                marker = f"{block['marker']} "
+                pdf.set_left_margin(indent)
+                pdf.set_x(max(left, indent - pdf.get_string_width(marker)))
+                pdf.write(height, marker)
+                self._write_spans(pdf, block["spans"], size, height)
+                pdf.set_left_margin(left)
+            elif kind == "quote":
+                pdf.set_left_margin(left + theme["indent"])
+                pdf.set_x(left + theme["indent"])
+                self._write_spans(pdf, block["spans"], size, height, "I")
+                pdf.set_left_margin(left)
+                pdf.ln(2)
+            elif kind == "rule":
+                pdf.ln(2)
+                pdf.line(left, pdf.get_y(), pdf.w - pdf.r_margin, pdf.get_y())
+                pdf.ln(4)
+
+    def add_cover_page(self, pdf, cover_path, variant=None):
+        """Full-bleed first page from the downsampled `variant` of the cover image."""
+        image_path = prepare_cover(cover_path, variant)
+        pdf.has_cover = True
         pdf.add_page()
+        pdf.image(image_path, x=0, y=0, w=pdf.w, h=pdf.h)
+
+    def render(self, ebook_path, follow=False, output_path=None, cover_path=None, cover_variant=None):
+        """
+        Renders an eBook JSON (or streamed .jsonl eBook) to PDF. Chapters
+        are read one at a time (see ebook_stream.open_ebook), so the source
+        never has to fit in memory; with `follow` rendering of a .jsonl
+        eBook can start while it is still being written and waits for its
+        end marker. Without `output_path` the PDF goes to data/pdfs, named after
+        the title and the current time.
+
+        The table of contents (page numbers + links) is filled in by fpdf at
+        output time, so the book is laid out only once. Chapter pages are
+        written to a `<pdf name>.meta.json` sidecar.
+
+        With `cover_path` the first page is the cover image, in its
+        `cover_variant` size (see cover_processing; "screen" by default).
+        """
+        print(f"📖 Loading eBook JSON from: {ebook_path}")
+        # Chapters are read lazily, one at a time, for both formats; each
+        # chapter's text is dropped once it is laid out.
+        ebook, chapters, chapter_count = open_ebook(ebook_path, follow=follow)
 
-    # 🧩 CHAPTERS
-    for idx, ch in enumerate(chapters, start=1):
-        chapter_title = ch.get("chapter_title", f"Chapter {idx}")
-        content = ch.get("content", "")
-        takeaway = ch.get("takeaway")
+        title = ebook.get("title", "Untitled eBook")
+        subtitle = ebook.get("subtitle", "")
+        toc = ebook.get("table_of_contents", [])
+        summary = ebook.get("executive_summary", "")
+        created_at = ebook.get("created_at", datetime.now().strftime("%Y-%m-%d"))
 
-        pdf.set_font("DejaVu", "B", 16)
-        pdf.multi_cell(0, 10, chapter_title)
-        pdf.ln(3)
+        if output_path is None:
+            safe_title = title.replace(" ", "_").replace("'", "").lower()
+            output_path = f"data/pdfs/{safe_title}_{datetime.now().strftime('%Y%m%d_%H%M')}.pdf"
+        if os.path.dirname(output_path):
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
 
+        pdf = self.new_document(title)
+        layout = LayoutCache.for_ebook(ebook_path)
+        if cover_path:
+            try:
+                self.add_cover_page(pdf, cover_path, cover_variant)
+            except Exception as e:
+                print(f"⚠️ Cover image not embedded: {e}")
+        pdf.add_page()
+
+        # 🧱 COVER PAGE
+        pdf.set_font("DejaVu", "B", 28)
+        pdf.cell(0, 20, title, align="C", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+        pdf.set_font("DejaVu", "", 16)
+        pdf.cell(0, 12, subtitle, align="C", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+        pdf.ln(20)
         pdf.set_font("DejaVu", "", 12)
-        pdf.multi_cell(0, 8, content)
-        pdf.ln(4)
+        pdf.multi_cell(0, 8, summary)
+        pdf.add_page()
+
+        # 📑 TABLE OF CONTENTS
+        toc_pages = None
+        if chapter_count:
+            # Reserve the TOC pages now; fpdf calls _render_toc() with the
+            # recorded sections (and their pages) when the PDF is written.
+            toc_layout = self._toc_layout(pdf, chapter_count)
+            toc_pages = [pdf.page, pdf.page + toc_layout["pages"] - 1]
+            pdf.insert_toc_placeholder(
+                lambda doc, outline: self._render_toc(doc, outline, toc_layout), pages=toc_layout["pages"]
+            )
+        elif toc:
+            # Chapter count unknown (following a .jsonl eBook being written):
+            # fall back to the eBook's own list, without page numbers.
+            pdf.set_font("DejaVu", "B", 20)
+            pdf.cell(0, 15, "Table of Contents", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+            pdf.set_font("DejaVu", "", 12)
+            for item in toc:
+                pdf.cell(0, 8, item, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+            pdf.add_page()
+
+        # 🧩 CHAPTERS
+        chapter_pages = []
+        for idx, ch in enumerate(chapters, start=1):
+            chapter_title = ch.get("chapter_title", f"Chapter {idx}")
+            content = ch.get("content", "")
+            takeaway = ch.get("takeaway")
+
+            # Keep a chapter title off the bottom of a page, so the page
+            # recorded for it is the one it is printed on.
+            if pdf.get_y() > pdf.page_break_trigger - 30:
+                pdf.add_page()
+            pdf.start_section(chapter_title)
+            chapter_pages.append({"chapter_title": chapter_title, "page": pdf.page_no()})
+            pdf.set_font("DejaVu", "B", 16)
+            pdf.multi_cell(0, 10, chapter_title)
+            pdf.ln(3)
+
+            # Markdown is parsed once per chapter text and cached as layout IR.
+            self.render_blocks(pdf, layout.get_blocks(content), chapter_title)
+            pdf.ln(4)
+
+            if takeaway:
+                pdf.set_fill_color(240, 240, 240)
+                pdf.set_font("DejaVu", "I", 12)
+                pdf.multi_cell(0, 8, f"Takeaway: {takeaway}", fill=True)
+                pdf.ln(8)
+
+        # 🦶 FOOTER INFO
+        pdf.add_page()
+        pdf.set_font("DejaVu", "I", 10)
+        pdf.multi_cell(0, 6, f"Generated by BookForge AI • {created_at}")
+
+        pdf.output(output_path)
+        write_render_metadata(output_path, {
+            "title": title,
+            "ebook": ebook_path,
+            "pages": pdf.pages_count,
+            "toc_pages": toc_pages,
+            "chapters": chapter_pages,
+        })
+        print(f"✅ Professional PDF saved → {output_path}")
+        return output_path
+
+    # --------------------------------------------------
+    # 📑 Table of contents
+    # --------------------------------------------------
+    TOC_HEADING_HEIGHT = 15
+    TOC_LINE_HEIGHT = 8
+
+    def _toc_layout(self, pdf, count):
+        """How many TOC entries fit per page, and so how many pages to reserve."""
+        top = pdf.get_y()  # below the running header
+        bottom = pdf.h - pdf.b_margin
+        first = int((bottom - top - self.TOC_HEADING_HEIGHT) // self.TOC_LINE_HEIGHT)
+        rest = int((bottom - top) // self.TOC_LINE_HEIGHT)
+        pages = 1 if count <= first else 1 + -(-(count - first) // rest)
+        return {"top": top, "first": first, "rest": rest, "pages": pages, "start": pdf.page}
+
+    @staticmethod
+    def _fit(pdf, text, width):
+        """`text`, shortened with an ellipsis to fit on one line of `width`."""
+        if pdf.get_string_width(text) <= width:
+            return text
+        while text and pdf.get_string_width(text + "…") > width:
+            text = text[:-1]
+        return text.rstrip() + "…"
+
+    def _render_toc(self, pdf, outline, layout):
+        # Entries are one line each, so pagination is exactly as reserved
+        # in _toc_layout(); fpdf requires the TOC to fill those pages.
+        auto_page_break, margin = pdf.auto_page_break, pdf.b_margin
+        pdf.set_auto_page_break(False)
+        pdf.set_font("DejaVu", "B", 20)
+        pdf.cell(0, self.TOC_HEADING_HEIGHT, "Table of Contents", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+
+        number_width = 15
+        capacity, used = layout["first"], 0
+        for section in outline:
+            if used == capacity:
+                pdf.add_page()
+                pdf.set_y(layout["top"])
+                capacity, used = layout["rest"], 0
+            link = pdf.add_link(page=section.page_number)
+            pdf.set_font("DejaVu", "", 12)
+            pdf.cell(pdf.epw - number_width, self.TOC_LINE_HEIGHT,
+                     self._fit(pdf, section.name, pdf.epw - number_width - 2), link=link)
+            pdf.cell(number_width, self.TOC_LINE_HEIGHT, str(section.page_number), align="R", link=link,
+                     new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+            used += 1
+
+        while pdf.page < layout["start"] + layout["pages"] - 1:
+            pdf.add_page()
+        pdf.set_auto_page_break(auto_page_break, margin)
+
+
+def write_render_metadata(pdf_path, metadata):
+    """Writes `<pdf name>.meta.json` next to the PDF (chapter pages, TOC pages)."""
+    meta_path = f"{os.path.splitext(pdf_path)[0]}.meta.json"
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump(metadata, f, indent=2, ensure_ascii=False)
+    return meta_path
 
-        if takeaway:
-            pdf.set_fill_color(240, 240, 240)
-            pdf.set_font("DejaVu", "I", 12)
-            pdf.multi_cell(0, 8, f"Takeaway: {takeaway}", fill=True)
-            pdf.ln(8)
 
-    # 🦶 FOOTER INFO
-    pdf.add_page()
-    pdf.set_font("DejaVu", "I", 10)
-    pdf.multi_cell(0, 6, f"Generated by BookForge AI • {created_at}")
+_renderer = None
+_renderer_lock = threading.Lock()
 
-    pdf.output(output_path)
-    print(f"✅ Professional PDF saved → {output_path}")
-    return output_path
+
+def get_renderer():
+    """The process-wide PDFRenderer."""
+    global _renderer
+    with _renderer_lock:
+        if _renderer is None:
+            _renderer = PDFRenderer()
+        return _renderer
+
+
+def generate_pdf_from_ebook(ebook_path, follow=False, cover_path=None):
+    """
+    Renders an eBook JSON (or streamed .jsonl eBook) to PDF with the shared
+    renderer; see PDFRenderer.render().
+    """
+    return get_renderer().render(ebook_path, follow=follow, cover_path=cover_path)
+
+
+# --------------------------------------------------
+# 📚 Batch rendering
+# --------------------------------------------------
+def collect_ebooks(patterns):
+    """eBook files (.json/.jsonl) from directories, globs or plain paths, sorted and de-duplicated."""
+    paths = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            pattern = os.path.join(pattern, "*.json*")
+        for path in glob.glob(pattern):
+            if path.endswith((".json", ".jsonl")) and os.path.isfile(path):
+                paths.add(os.path.normpath(path))
+    return sorted(paths)
+
+
+def pdf_path_for(ebook_path, out_dir=BATCH_OUTPUT_DIR):
+    # The extension stays in the name: book.json and book.jsonl are different
+    # books. A short hash of the full path tells same-named books in different
+    # directories apart, and stays the same from one batch to the next.
+    digest = hashlib.sha1(os.path.abspath(ebook_path).encode("utf-8")).hexdigest()[:8]
+    return os.path.join(out_dir, f"{os.path.basename(ebook_path)}.{digest}.pdf")
+
+
+def is_up_to_date(ebook_path, pdf_path):
+    return os.path.exists(pdf_path) and os.path.getmtime(pdf_path) >= os.path.getmtime(ebook_path)
+
+
+def _warm_up_worker():
+    # Runs once per worker process, so every book it renders finds the fonts parsed.
+    get_renderer().warm_up()
+
+
+def _render_one(ebook_path, pdf_path):
+    started = time.perf_counter()
+    result = {"ebook": ebook_path, "pdf": pdf_path}
+    try:
+        get_renderer().render(ebook_path, output_path=pdf_path)
+        result["status"] = "done"
+    except Exception as e:
+        result.update(status="failed", error=f"{type(e).__name__}: {e}")
+    result["seconds"] = round(time.perf_counter() - started, 3)
+    return result
+
+
+def render_batch(ebook_paths, out_dir=BATCH_OUTPUT_DIR, workers=None, force=False):
+    """
+    Renders many eBooks in a process pool. Books whose PDF in `out_dir` is
+    newer than the eBook are skipped unless `force`. A failing book never
+    stops the batch. Returns one result dict per book, in input order (a
+    book listed twice is rendered once).
+    """
+    workers = max(1, workers or PDF_WORKERS)
+    results = {}
+    todo = []
+    for path in dict.fromkeys(ebook_paths):
+        pdf_path = pdf_path_for(path, out_dir)
+        if not force and is_up_to_date(path, pdf_path):
+            results[path] = {"ebook": path, "pdf": pdf_path, "status": "skipped", "seconds": 0.0}
+        else:
+            todo.append((path, pdf_path))
+
+    print(f"📚 Rendering {len(todo)} eBook(s) with {workers} worker(s), {len(results)} up to date.")
+    if todo:
+        with ProcessPoolExecutor(max_workers=min(workers, len(todo)), initializer=_warm_up_worker) as pool:
+            futures = {pool.submit(_render_one, path, pdf_path): (path, pdf_path) for path, pdf_path in todo}
+            for future in as_completed(futures):
+                path, pdf_path = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:  # worker process died
+                    result = {"ebook": path, "pdf": pdf_path, "status": "failed",
+                              "error": f"{type(e).__name__}: {e}", "seconds": 0.0}
+                results[path] = result
+                mark = "✅" if result["status"] == "done" else "❌"
+                print(f"{mark} {os.path.basename(path)} ({result['seconds']}s){' — ' + result['error'] if 'error' in result else ''}")
+    return [results[path] for path in ebook_paths]
+
+
+def print_batch_report(results):
+    counts = {status: sum(1 for r in results if r["status"] == status) for status in ("done", "skipped", "failed")}
+    print(f"\n📊 Batch report: {counts['done']} rendered, {counts['skipped']} skipped, {counts['failed']} failed")
+    print(f"{'seconds':>8}  {'status':<8} eBook")
+    for r in results:
+        print(f"{r['seconds']:>8.2f}  {r['status']:<8} {r['ebook']}")
+        if "error" in r:
+            print(f"{'':>8}  {'':<8} ↳ {r['error']}")
 
 
 if __name__ == "__main__":
-    data_dir = "data/ebooks"
-    latest = max(
-        [os.path.join(data_dir, f) for f in os.listdir(data_dir) if f.endswith(".json")],
-        key=os.path.getmtime
-    )
-    print(f"📘 Auto-detected eBook: {latest}")
-    generate_pdf_from_ebook(latest)
+    parser = argparse.ArgumentParser(description="Render eBooks to PDF.")
+    parser.add_argument("--batch", nargs="+", metavar="PATH",
+                        help="directories or globs of eBook JSON/JSONL files to render in a process pool")
+    parser.add_argument("--out-dir", default=BATCH_OUTPUT_DIR)
+    parser.add_argument("--workers", type=int, default=PDF_WORKERS)
+    parser.add_argument("--force", action="store_true", help="re-render PDFs that are up to date")
+    parser.add_argument("--report", help="also write the per-book results to this JSON file")
+    args = parser.parse_args()
+
+    if not args.batch:
+        data_dir = "data/ebooks"
+        latest = max(
+            [os.path.join(data_dir, f) for f in os.listdir(data_dir) if f.endswith(".json")],
+            key=os.path.getmtime
+        )
+        print(f"📘 Auto-detected eBook: {latest}")
+        generate_pdf_from_ebook(latest)
+        sys.exit(0)
+
+    results = render_batch(collect_ebooks(args.batch), out_dir=args.out_dir, workers=args.workers, force=args.force)
+    print_batch_report(results)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+    sys.exit(1 if any(r["status"] == "failed" for r in results) else 0)
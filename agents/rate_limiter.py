@@ -0,0 +1,170 @@
+import os
+import time
+import heapq
+import itertools
+import threading
+from contextlib import contextmanager
+
+# --------------------------------------------------
+# ⚙️ Settings
+# --------------------------------------------------
+# Client-side budgets for Gemini; 0 disables a limit.
+GEMINI_RPM = int(os.getenv("BOOKFORGE_GEMINI_RPM", "60"))
+GEMINI_TPM = int(os.getenv("BOOKFORGE_GEMINI_TPM", "1000000"))
+LLM_CONCURRENCY = int(os.getenv("BOOKFORGE_LLM_CONCURRENCY", "8"))
+
+# Lower value = served first when requests are queued. Trend scoring gates
+# the whole cycle, outlines gate a book, chapters are the bulk of the work.
+STAGE_PRIORITIES = {"trend": 0, "outline": 1, "chapter": 2}
+DEFAULT_PRIORITY = 3
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def estimate_tokens(text):
+    """Token count of `text` via tiktoken (cl100k_base); ~4 chars/token if unavailable."""
+    global _encoding
+    with _encoding_lock:
+        if _encoding is None:
+            try:
+                import tiktoken
+                _encoding = tiktoken.get_encoding("cl100k_base")
+            except Exception:
+                _encoding = False
+    if _encoding:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return max(1, len(text) // 4)
+
+
+# --------------------------------------------------
+# 🪣 Token Bucket
+# --------------------------------------------------
+class TokenBucket:
+    """Refills `capacity` units per minute, continuously. Not thread-safe on its own."""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        """Seconds until `amount` units are available (0 if they are now)."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount):
+        # May go negative: charging actual response tokens after the fact
+        # puts the bucket in debt, which delays the next requests.
+        self._refill()
+        self.tokens -= amount
+
+
+# --------------------------------------------------
+# 🚦 Rate Limiter
+# --------------------------------------------------
+class RateLimiter:
+    """
+    Schedules LLM requests within requests-per-minute and tokens-per-minute
+    budgets, serving queued requests by priority (then arrival order).
+
+    Concurrency adapts AIMD-style: a 429 halves the number of requests
+    allowed in flight, and every `limit` successes in a row add one back,
+    up to `max_concurrency`.
+    """
+
+    def __init__(self, rpm=GEMINI_RPM, tpm=GEMINI_TPM, max_concurrency=LLM_CONCURRENCY, min_concurrency=1):
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.limit = self.max_concurrency
+        self.active = 0
+        self._successes = 0
+        self._queue = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self.stats = {"throttled": 0, "waited_seconds": 0.0}
+
+    def _budget_wait(self, tokens):
+        waits = [0.0]
+        if self.requests:
+            waits.append(self.requests.wait_time(1))
+        if self.tokens:
+            waits.append(self.tokens.wait_time(tokens))
+        return max(waits)
+
+    def acquire(self, tokens=0, priority=DEFAULT_PRIORITY):
+        """Blocks until this request may be sent."""
+        started = time.monotonic()
+        with self._cond:
+            entry = (priority, next(self._seq))
+            heapq.heappush(self._queue, entry)
+            while True:
+                timeout = None
+                if self._queue[0] == entry and self.active < self.limit:
+                    timeout = self._budget_wait(tokens)
+                    if timeout == 0:
+                        break
+                self._cond.wait(timeout)
+
+            heapq.heappop(self._queue)
+            if self.requests:
+                self.requests.consume(1)
+            if self.tokens:
+                self.tokens.consume(tokens)
+            self.active += 1
+            self.stats["waited_seconds"] += time.monotonic() - started
+            self._cond.notify_all()
+
+    def release(self, extra_tokens=0, throttled=False):
+        """Frees the slot; `extra_tokens` charges the response size to the TPM budget."""
+        with self._cond:
+            self.active -= 1
+            if self.tokens and extra_tokens:
+                self.tokens.consume(extra_tokens)
+            if throttled:
+                self.stats["throttled"] += 1
+                self._successes = 0
+                self.limit = max(self.min_concurrency, self.limit // 2)
+                print(f"🚦 Rate limited — lowering LLM concurrency to {self.limit}.")
+            else:
+                self._successes += 1
+                if self._successes >= self.limit and self.limit < self.max_concurrency:
+                    self._successes = 0
+                    self.limit += 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, prompt, agent="default"):
+        """
+        Holds a request slot for one call. Set `.response` (or
+        `.response_tokens` for streamed output) on the yielded object to
+        charge the response to the TPM budget, `.throttled` after a 429.
+        """
+        call = _Call(estimate_tokens(prompt))
+        self.acquire(call.prompt_tokens, STAGE_PRIORITIES.get(agent, DEFAULT_PRIORITY))
+        try:
+            yield call
+        finally:
+            extra = call.response_tokens
+            if extra is None:
+                extra = estimate_tokens(call.response) if call.response else 0
+            self.release(extra_tokens=extra, throttled=call.throttled)
+
+
+class _Call:
+    def __init__(self, prompt_tokens):
+        self.prompt_tokens = prompt_tokens
+        self.response = None
+        self.response_tokens = None
+        self.throttled = False
@@ -0,0 +1,139 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+# --------------------------------------------------
+# ⚙️ Settings
+# --------------------------------------------------
+CACHE_PATH = os.getenv("BOOKFORGE_CACHE_PATH", os.path.join("data", "cache", "llm_cache.sqlite3"))
+CACHE_MAX_BYTES = int(float(os.getenv("BOOKFORGE_CACHE_MAX_MB", "256")) * 1024 * 1024)
+
+# Seconds each agent's responses stay valid (0 disables caching for it).
+# Trend scores go stale within a cycle or two; written chapters don't.
+# Override with BOOKFORGE_CACHE_TTL_<AGENT>, e.g. BOOKFORGE_CACHE_TTL_TREND=600.
+CACHE_POLICIES = {
+    "trend": 2 * 60 * 60,
+    "topic_score": 6 * 60 * 60,
+    "outline": 7 * 24 * 60 * 60,
+    "chapter": 30 * 24 * 60 * 60,
+    "default": 24 * 60 * 60,
+}
+
+
+def _policy_ttl(agent):
+    env_value = os.getenv(f"BOOKFORGE_CACHE_TTL_{agent.upper()}")
+    if env_value is not None:
+        return float(env_value)
+    return CACHE_POLICIES.get(agent, CACHE_POLICIES["default"])
+
+
+def make_key(*parts):
+    """Content address for a request: sha256 over its JSON-encoded parts."""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# --------------------------------------------------
+# 🗄️ Response Cache
+# --------------------------------------------------
+class ResponseCache:
+    """
+    Persistent cache of LLM responses in a single SQLite file.
+
+    - Entries expire after their agent's TTL (see CACHE_POLICIES).
+    - When the stored values exceed `max_bytes`, the least recently used
+      entries are evicted.
+    - Hit/miss counters are kept per agent, see stats().
+    """
+
+    def __init__(self, path=CACHE_PATH, max_bytes=CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._counters = {}
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                agent TEXT NOT NULL,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )"""
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_lru ON entries (last_access)")
+        self._db.commit()
+        self._total_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def _count(self, agent, field):
+        counters = self._counters.setdefault(agent, {"hits": 0, "misses": 0})
+        counters[field] += 1
+
+    def enabled_for(self, agent):
+        return _policy_ttl(agent) > 0
+
+    def get(self, key, agent="default"):
+        """Returns the cached value, or None on a miss or expired entry."""
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value, size, created_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row and now - row[2] > _policy_ttl(agent):
+                self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._db.commit()
+                self._total_bytes -= row[1]
+                row = None
+            if row is None:
+                self._count(agent, "misses")
+                return None
+            self._db.execute("UPDATE entries SET last_access = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            self._count(agent, "hits")
+            return row[0]
+
+    def put(self, key, value, agent="default"):
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            old = self._db.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (key, agent, value, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, agent, value, size, now, now),
+            )
+            self._total_bytes += size - (old[0] if old else 0)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        """Drops least recently used entries until the cache is at 90% of its budget."""
+        target = self.max_bytes * 0.9
+        rows = self._db.execute("SELECT key, size FROM entries ORDER BY last_access").fetchall()
+        for key, size in rows:
+            if self._total_bytes <= target:
+                break
+            self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._total_bytes -= size
+
+    def stats(self):
+        """{agent: {"hits", "misses", "hit_rate"}} plus the current size on disk."""
+        with self._lock:
+            per_agent = {
+                agent: {**c, "hit_rate": round(c["hits"] / max(1, c["hits"] + c["misses"]), 3)}
+                for agent, c in self._counters.items()
+            }
+            return {"agents": per_agent, "bytes": self._total_bytes}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -200,18 +200,13 @@ import os
 import json
 from datetime import datetime
 from dotenv import load_dotenv
-from google import genai
+from agents.llm_gateway import get_gateway
+from agents.structured_output import OUTLINE_SCHEMA, validate_outline
 
 # --------------------------------------------------
 # ⚙️ Setup
 # --------------------------------------------------
 load_dotenv()
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-
-if not GEMINI_API_KEY:
-    raise ValueError("❌ GEMINI_API_KEY not found in .env!")
-
-client = genai.Client(api_key=GEMINI_API_KEY)
 
 
 # --------------------------------------------------
@@ -220,7 +215,8 @@ client = genai.Client(api_key=GEMINI_API_KEY)
 def generate_outline_for_topic(topic: str):
     """
     Uses Gemini to generate a structured SEO outline
-    for the given topic. Returns a dict.
+    for the given topic. Returns a validated outline dict;
+    raises ValidationError if Gemini keeps answering malformed JSON.
     """
 
     print(f"🤖 Analyzing SEO and outline for topic: {topic}")
@@ -249,34 +245,13 @@ def generate_outline_for_topic(topic: str):
     }}
     """
 
-    response = client.models.generate_content(
-        model="models/gemini-2.5-flash",
-        contents=prompt
+    # Validated (and re-requested if malformed) before it is saved, so a
+    # broken outline never reaches the chapter stage.
+    return get_gateway().generate_structured(
+        prompt, agent="outline", schema=OUTLINE_SCHEMA,
+        validator=lambda data: validate_outline(data, topic)
     )
 
-    raw_text = response.text.strip() if hasattr(response, "text") else str(response)
-
-    # Clean markdown artifacts (```json ... ```)
-    import re
-    if raw_text.startswith("```"):
-        raw_text = re.sub(r"^```(?:json)?", "", raw_text).strip()
-        raw_text = re.sub(r"```$", "", raw_text).strip()
-
-    # Parse JSON safely
-    try:
-        parsed = json.loads(raw_text)
-    except Exception:
-        match = re.search(r"\{.*\}", raw_text, re.DOTALL)
-        if match:
-            try:
-                parsed = json.loads(match.group())
-            except:
-                parsed = {"topic": topic, "raw_response": raw_text}
-        else:
-            parsed = {"topic": topic, "raw_response": raw_text}
-
-    return parsed
-
 
 # --------------------------------------------------
 # 🧪 Test Run (for debugging)
@@ -0,0 +1,87 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+# --------------------------------------------------
+# 🕸️ Stage Graph
+# --------------------------------------------------
+class StageGraph:
+    """
+    A tiny dependency graph of pipeline stages.
+
+    Each stage is a function that receives a dict of its dependencies'
+    results (by stage name) and returns its own result. A stage starts as
+    soon as all of its dependencies have finished, so independent stages
+    (e.g. cover and chapters) run side by side.
+
+    - deps: stages that must succeed; if one fails the stage is skipped.
+    - optional: stages that must finish, but whose failure is tolerated
+      (their result is passed as None).
+    - limit: an optional semaphore held while the stage runs.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.results = {}
+        self.errors = {}
+        self.status = {}
+
+    def add(self, name, func, deps=(), optional=(), limit=None):
+        for dep in (*deps, *optional):
+            if dep not in self.stages:
+                raise ValueError(f"❌ Stage '{name}' depends on unknown stage '{dep}'")
+        self.stages[name] = {
+            "func": func,
+            "deps": tuple(deps),
+            "optional": tuple(optional),
+            "limit": limit,
+        }
+        return self
+
+    def _ready(self, name):
+        stage = self.stages[name]
+        return all(dep in self.status for dep in (*stage["deps"], *stage["optional"]))
+
+    def _blocked(self, name):
+        return any(self.status.get(dep) in ("failed", "skipped") for dep in self.stages[name]["deps"])
+
+    def _run_stage(self, name):
+        stage = self.stages[name]
+        inputs = {dep: self.results.get(dep) for dep in (*stage["deps"], *stage["optional"])}
+        if stage["limit"] is None:
+            return stage["func"](inputs)
+        with stage["limit"]:
+            return stage["func"](inputs)
+
+    def run(self, max_workers=None):
+        """Runs every stage, returns {stage: status}. Never raises for stage errors."""
+        waiting = list(self.stages)
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=max_workers or len(self.stages) or 1,
+                                thread_name_prefix="stage") as pool:
+            while waiting or running:
+                for name in list(waiting):
+                    if self._blocked(name):
+                        waiting.remove(name)
+                        self.status[name] = "skipped"
+                    elif self._ready(name):
+                        waiting.remove(name)
+                        # copy_context keeps the caller's log prefix in the stage thread
+                        future = pool.submit(contextvars.copy_context().run, self._run_stage, name)
+                        running[future] = name
+
+                if not running:
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        self.results[name] = future.result()
+                        self.status[name] = "done"
+                    except Exception as e:
+                        self.errors[name] = e
+                        self.status[name] = "failed"
+
+        return self.status
@@ -0,0 +1,272 @@
+import os
+import json
+
+# --------------------------------------------------
+# ⚙️ Settings
+# --------------------------------------------------
+# Ask Gemini for JSON with a response schema (structured output mode).
+STRUCTURED_OUTPUT = os.getenv("BOOKFORGE_STRUCTURED_OUTPUT", "1").strip().lower() not in ("0", "false", "no", "off")
+STRUCTURED_ATTEMPTS = int(os.getenv("BOOKFORGE_STRUCTURED_ATTEMPTS", "2"))
+MIN_CHAPTER_CHARS = 200
+
+
+class ValidationError(ValueError):
+    """The model's answer could not be turned into the expected shape."""
+
+
+# --------------------------------------------------
+# 📐 Response schemas (Gemini OpenAPI subset)
+# --------------------------------------------------
+OUTLINE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "topic": {"type": "STRING"},
+        "title": {"type": "STRING"},
+        "subtitle": {"type": "STRING"},
+        "keywords": {"type": "ARRAY", "items": {"type": "STRING"}},
+        "chapters": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {
+                    "chapter_title": {"type": "STRING"},
+                    "description": {"type": "STRING"},
+                },
+                "required": ["chapter_title", "description"],
+            },
+        },
+    },
+    "required": ["title", "chapters"],
+}
+
+SCORES_SCHEMA = {
+    "type": "ARRAY",
+    "items": {
+        "type": "OBJECT",
+        "properties": {
+            "topic": {"type": "STRING"},
+            "score": {"type": "NUMBER"},
+            "reason": {"type": "STRING"},
+        },
+        "required": ["topic", "score"],
+    },
+}
+
+
+# --------------------------------------------------
+# 🔎 Single-pass JSON extractor
+# --------------------------------------------------
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+def iter_json(text):
+    """
+    Yields every JSON object/array found in `text`, in order, in one linear
+    pass: prose and ``` fences around them are skipped, string contents are
+    respected, trailing commas are dropped, and an answer cut off at the
+    end (unclosed strings/brackets) is closed.
+    """
+    n = len(text)
+    i = 0
+    while i < n:
+        # Skip to the next candidate start.
+        while i < n and text[i] not in _CLOSERS:
+            i += 1
+        if i >= n:
+            break
+
+        out = []
+        stack = []
+        in_string = escaped = False
+        j = i
+        while j < n:
+            c = text[j]
+            if in_string:
+                out.append(c)
+                if escaped:
+                    escaped = False
+                elif c == "\\":
+                    escaped = True
+                elif c == '"':
+                    in_string = False
+            elif c == '"':
+                in_string = True
+                out.append(c)
+            elif c in _CLOSERS:
+                stack.append(_CLOSERS[c])
+                out.append(c)
+            elif c in "}]":
+                if not stack or stack[-1] != c:
+                    break  # mismatched bracket: not JSON, try the next candidate
+                stack.pop()
+                _drop_trailing_comma(out)
+                out.append(c)
+                if not stack:
+                    break
+            else:
+                out.append(c)
+            j += 1
+
+        if j >= n and stack:
+            # Truncated answer: close what is still open.
+            if in_string:
+                out.append('"')
+            while stack:
+                _drop_trailing_comma(out)
+                out.append(stack.pop())
+
+        if not stack:
+            try:
+                yield json.loads("".join(out))
+            except json.JSONDecodeError:
+                pass
+        # Candidates never overlap, so the whole scan stays linear.
+        i = j + 1
+
+
+def extract_json(text):
+    """First JSON object/array in `text` (see iter_json). Raises ValidationError."""
+    for data in iter_json(text):
+        return data
+    raise ValidationError("❌ No valid JSON found in model response.")
+
+
+def validate_response(text, validator):
+    """
+    Runs `validator` over the JSON values in `text` and returns the first
+    that passes, so a stray "[1]" in leading prose doesn't hide the answer.
+    """
+    error = ValidationError("❌ No valid JSON found in model response.")
+    for data in iter_json(text):
+        try:
+            return validator(data)
+        except ValidationError as e:
+            error = e
+    raise error
+
+
+def _drop_trailing_comma(out):
+    k = len(out) - 1
+    while k >= 0 and out[k].isspace():
+        k -= 1
+    if k >= 0 and out[k] == ",":
+        del out[k]
+
+
+# --------------------------------------------------
+# ✅ Validators (repair what is safe, reject the rest)
+# --------------------------------------------------
+def _text(value):
+    return value.strip() if isinstance(value, str) else ""
+
+
+def validate_outline(data, topic=None):
+    """Returns a clean outline dict or raises ValidationError."""
+    if isinstance(data, list) and len(data) == 1:
+        data = data[0]
+    if isinstance(data, dict) and isinstance(data.get("outline"), dict):
+        data = data["outline"]
+    if not isinstance(data, dict):
+        raise ValidationError("❌ Outline is not a JSON object.")
+    if "raw_response" in data:
+        raise ValidationError("❌ Outline holds an unparsed raw_response.")
+
+    chapters = []
+    for ch in data.get("chapters") or []:
+        if isinstance(ch, str):
+            ch = {"chapter_title": ch}
+        if not isinstance(ch, dict):
+            continue
+        title = _text(ch.get("chapter_title") or ch.get("title") or ch.get("name"))
+        if title:
+            chapters.append({
+                "chapter_title": title,
+                "description": _text(ch.get("description") or ch.get("summary")),
+            })
+    if not chapters:
+        raise ValidationError("❌ Outline has no usable chapters.")
+
+    keywords = data.get("keywords") or []
+    if isinstance(keywords, str):
+        keywords = keywords.split(",")
+    keywords = [k.strip() for k in keywords if isinstance(k, str) and k.strip()]
+
+    topic = topic or _text(data.get("topic")) or "Untitled"
+    return {
+        "topic": topic,
+        "title": _text(data.get("title")) or topic,
+        "subtitle": _text(data.get("subtitle")),
+        "keywords": keywords,
+        "chapters": chapters,
+    }
+
+
+def validate_scores(data):
+    """Returns a list of {"topic", "score", "reason"} or raises ValidationError."""
+    if isinstance(data, dict):
+        data = data.get("topics") or data.get("results") or [data]
+    if not isinstance(data, list):
+        raise ValidationError("❌ Scores are not a JSON list.")
+
+    scores = []
+    for item in data:
+        if not isinstance(item, dict) or not _text(item.get("topic")):
+            continue
+        try:
+            score = float(item.get("score"))
+        except (TypeError, ValueError):
+            continue
+        score = min(100, max(0, score))
+        scores.append({
+            "topic": _text(item["topic"]),
+            "score": int(score) if score.is_integer() else score,
+            "reason": _text(item.get("reason")),
+        })
+    if not scores:
+        raise ValidationError("❌ No usable topic scores in response.")
+    return scores
+
+
+def validate_chapter(chapter, min_chars=MIN_CHAPTER_CHARS):
+    """Checks a written chapter dict; raises ValidationError if it is unusable."""
+    if not _text(chapter.get("chapter_title")):
+        raise ValidationError("❌ Chapter has no title.")
+    if len(_text(chapter.get("content"))) < min_chars:
+        raise ValidationError(f"❌ Chapter '{chapter['chapter_title']}' is empty or truncated.")
+    return chapter
+
+
+# --------------------------------------------------
+# 🤝 Request + validate
+# --------------------------------------------------
+def request_structured(gateway, prompt, agent, validator, schema=None, attempts=None, use_cache=True):
+    """
+    Asks for JSON (with `schema` as response schema in structured output
+    mode), extracts and validates it. An invalid answer is re-requested
+    right away, bypassing the response cache. Raises ValidationError.
+    """
+    attempts = max(1, attempts or STRUCTURED_ATTEMPTS)
+    config = None
+    if STRUCTURED_OUTPUT and schema is not None:
+        config = {"response_mime_type": "application/json", "response_schema": schema}
+
+    error = None
+    for attempt in range(attempts):
+        request = prompt if attempt == 0 else (
+            f"{prompt}\n\nYour previous answer was rejected ({error}). "
+            "Return ONLY the JSON in the requested format."
+        )
+        accepted = {}
+
+        def accept(text):
+            accepted["value"] = validate_response(text, validator)
+
+        try:
+            # Only answers that validate are cached.
+            gateway.generate(request, agent=agent, config=config, use_cache=use_cache and attempt == 0,
+                             validate=accept)
+            return accepted["value"]
+        except ValidationError as e:
+            error = e
+            print(f"⚠️ Invalid {agent} response (attempt {attempt + 1}/{attempts}): {e}")
+    raise ValidationError(f"❌ No valid {agent} response after {attempts} attempt(s): {error}")
@@ -0,0 +1,235 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+
+# --------------------------------------------------
+# ⚙️ Settings
+# --------------------------------------------------
+INDEX_PATH = os.getenv("BOOKFORGE_TOPIC_INDEX_PATH", os.path.join("data", "cache", "topic_index.sqlite3"))
+# Similarity over content words (see topic_similarity). Filler words are
+# already dropped (see STOPWORDS), so rewordings of one event score ~1.0,
+# while titles that differ in one real word ("Bigg Boss Tamil 8" / "Bigg
+# Boss Telugu 8", Jaccard 0.67) are different books and must stay below
+# the threshold.
+SIMILARITY_THRESHOLD = float(os.getenv("BOOKFORGE_TOPIC_SIMILARITY", "0.8"))
+# A topic whose content words (at least MIN_CONTAINED_WORDS of them) all
+# appear in the other one is the same subject, however much longer the
+# other title is: "Real Madrid games" / "Rayo Vallecano vs Real Madrid"
+# has Jaccard 0.5 but containment 1.0.
+CONTAINMENT_THRESHOLD = float(os.getenv("BOOKFORGE_TOPIC_CONTAINMENT", "1.0"))
+MIN_CONTAINED_WORDS = 2
+WINDOW_DAYS = float(os.getenv("BOOKFORGE_TOPIC_WINDOW_DAYS", "7"))
+
+# 32 bands x 2 rows: pairs at Jaccard 0.5 or more share a bucket with
+# ~99.99% probability (a 2-word topic inside a 6-word one, Jaccard 0.33,
+# with ~97%); candidates are then checked against the exact shingle sets
+# and the threshold.
+NUM_PERM = 64
+BANDS = 32
+ROWS = NUM_PERM // BANDS
+_PRIME = (1 << 61) - 1
+
+# Words that say nothing about *what* the topic is. Trend titles for the
+# same event vary mostly in these ("where to watch X vs Y", "X games").
+STOPWORDS = {
+    "a", "an", "the", "of", "and", "or", "in", "on", "at", "for", "to", "with", "by",
+    "vs", "v", "versus", "where", "watch", "how", "what", "when", "who", "today",
+    "live", "news", "latest", "update", "updates", "game", "games", "match", "matches",
+    "score", "scores", "result", "results", "date", "time", "stream", "highlights",
+}
+
+
+def normalize_topic(topic):
+    """Lowercase, accent-free, punctuation-free topic with collapsed spaces."""
+    text = unicodedata.normalize("NFKD", topic)
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    text = re.sub(r"[^\w\s]", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def shingles(topic):
+    """Content words of the topic (stopwords dropped, simple plural folding)."""
+    words = set()
+    for word in normalize_topic(topic).split():
+        if word in STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        words.add(word)
+    return words or set(normalize_topic(topic).split())
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def containment(a, b):
+    """Share of the smaller set that is also in the larger one."""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / min(len(a), len(b))
+
+
+def topic_similarity(a, b):
+    """
+    Jaccard of two shingle sets, raised to their containment when the
+    smaller set (of at least MIN_CONTAINED_WORDS words) is contained in the
+    other one (see CONTAINMENT_THRESHOLD).
+    """
+    score = jaccard(a, b)
+    if min(len(a), len(b)) >= MIN_CONTAINED_WORDS:
+        contained = containment(a, b)
+        if contained >= CONTAINMENT_THRESHOLD:
+            score = max(score, contained)
+    return score
+
+
+def _permutations():
+    # Fixed seeds: signatures stored on disk must stay comparable across runs.
+    perms = []
+    for i in range(NUM_PERM):
+        chunk = hashlib.sha256(f"bookforge-topic-index-{i}".encode()).digest()
+        a = int.from_bytes(chunk[:8], "big") % (_PRIME - 1) + 1
+        b = int.from_bytes(chunk[8:], "big") % _PRIME
+        perms.append((a, b))
+    return perms
+
+
+_PERMS = _permutations()
+
+
+def minhash(words):
+    """MinHash signature (NUM_PERM ints) of a set of shingles."""
+    hashes = [int.from_bytes(hashlib.blake2b(w.encode("utf-8"), digest_size=8).digest(), "big") for w in words]
+    return [min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMS]
+
+
+def lsh_keys(signature):
+    """One bucket key per band; similar topics share at least one key."""
+    return [
+        f"{band}:" + hashlib.blake2b(
+            ",".join(map(str, signature[band * ROWS:(band + 1) * ROWS])).encode(), digest_size=8
+        ).hexdigest()
+        for band in range(BANDS)
+    ]
+
+
+# --------------------------------------------------
+# 🗂️ Topic Index
+# --------------------------------------------------
+class TopicIndex:
+    """
+    Persistent index of topics already turned into books, with MinHash/LSH
+    buckets in SQLite so near-duplicate lookups stay fast for tens of
+    thousands of past topics (one indexed query per lookup).
+    """
+
+    def __init__(self, path=INDEX_PATH, threshold=SIMILARITY_THRESHOLD, window_days=WINDOW_DAYS):
+        self.path = path
+        self.threshold = threshold
+        self.window_days = window_days
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS topics (
+                id INTEGER PRIMARY KEY,
+                topic TEXT NOT NULL,
+                words TEXT NOT NULL,
+                seen_at REAL NOT NULL,
+                ebook_path TEXT
+            )"""
+        )
+        self._db.execute("CREATE TABLE IF NOT EXISTS buckets (key TEXT NOT NULL, topic_id INTEGER NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS buckets_key ON buckets (key)")
+        self._db.commit()
+
+    def find_similar(self, topic, within_days=None):
+        """
+        Past topics within the window whose similarity to `topic` (see
+        topic_similarity) is at least the threshold, best first: [(score, {topic, seen_at, ebook_path})].
+        """
+        within_days = self.window_days if within_days is None else within_days
+        words = shingles(topic)
+        keys = lsh_keys(minhash(words))
+        since = time.time() - within_days * 86400
+
+        with self._lock:
+            rows = self._db.execute(
+                f"""SELECT DISTINCT t.topic, t.words, t.seen_at, t.ebook_path
+                    FROM buckets b JOIN topics t ON t.id = b.topic_id
+                    WHERE b.key IN ({",".join("?" * len(keys))}) AND t.seen_at >= ?""",
+                (*keys, since),
+            ).fetchall()
+
+        matches = []
+        for past_topic, past_words, seen_at, ebook_path in rows:
+            score = topic_similarity(words, set(json.loads(past_words)))
+            if score >= self.threshold:
+                matches.append((round(score, 3), {"topic": past_topic, "seen_at": seen_at, "ebook_path": ebook_path}))
+        return sorted(matches, key=lambda m: m[0], reverse=True)
+
+    def add(self, topic, ebook_path=None, seen_at=None):
+        words = shingles(topic)
+        keys = lsh_keys(minhash(words))
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT INTO topics (topic, words, seen_at, ebook_path) VALUES (?, ?, ?, ?)",
+                (topic, json.dumps(sorted(words), ensure_ascii=False), seen_at or time.time(), ebook_path),
+            )
+            self._db.executemany(
+                "INSERT INTO buckets (key, topic_id) VALUES (?, ?)",
+                [(key, cursor.lastrowid) for key in keys],
+            )
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def dedupe_topics(ranked_topics, index=None, limit=5, threshold=SIMILARITY_THRESHOLD, max_window_days=None):
+    """
+    Walks `ranked_topics` (dicts with "topic", best first) and keeps up to
+    `limit` of them, skipping topics covered in the index's window and
+    merging near-duplicates within the list into the higher-ranked one
+    (listed under "merged"). Returns (selected, skipped).
+
+    `max_window_days(topic)` can shorten the window per topic (e.g. to the
+    outline store's TTL, so news topics come back once their outline is stale).
+    """
+    selected, skipped = [], []
+    for topic_data in ranked_topics:
+        if len(selected) >= limit:
+            break
+        topic = topic_data.get("topic", "")
+        words = shingles(topic)
+
+        twin = next((s for s in selected if topic_similarity(words, shingles(s["topic"])) >= threshold), None)
+        if twin is not None:
+            twin.setdefault("merged", []).append(topic)
+            skipped.append({"topic": topic, "reason": f"merged into '{twin['topic']}'"})
+            continue
+
+        if index is not None:
+            within_days = index.window_days
+            if max_window_days is not None:
+                within_days = min(within_days, max_window_days(topic))
+            matches = index.find_similar(topic, within_days=within_days)
+            if matches:
+                score, past = matches[0]
+                skipped.append({"topic": topic, "reason": f"covered recently as '{past['topic']}' ({score})"})
+                continue
+
+        selected.append(dict(topic_data))
+    return selected, skipped
@@ -1,60 +1,190 @@
 import os
 import json
+import threading
+import contextvars
 import requests
-from bs4 import BeautifulSoup
+import requests.adapters
+from defusedxml.ElementTree import iterparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlencode
 from datetime import datetime
 from dotenv import load_dotenv
-from google import genai
-import re
+from agents.llm_gateway import get_gateway
+from agents.response_cache import make_key
+from agents.topic_index import normalize_topic
+from agents.structured_output import SCORES_SCHEMA, validate_scores
 
 # -------------------------------------------------
 # STEP 1: Load Environment Variables
 # -------------------------------------------------
 load_dotenv()
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
-    raise ValueError("❌ GEMINI_API_KEY not found in .env file!")
 
 # -------------------------------------------------
-# STEP 2: Initialize Gemini Client
+# STEP 2: Fetch Trending Topics
 # -------------------------------------------------
-client = genai.Client(api_key=GEMINI_API_KEY)
+TRENDS_RSS_URL = os.getenv("BOOKFORGE_TRENDS_URL", "https://trends.google.com/trending/rss")
+# Comma-separated feeds: "" is the global feed, otherwise a geo code,
+# optionally with a category, e.g. "global,US,IN,GB:17".
+TREND_FEEDS = os.getenv("BOOKFORGE_TREND_FEEDS", "global")
+TOPICS_PER_FEED = int(os.getenv("BOOKFORGE_TOPICS_PER_FEED", "10"))
+FEED_STATE_PATH = os.path.join("data", "cache", "trend_feeds.json")
 
+_session = None
+_session_lock = threading.Lock()
 
-# -------------------------------------------------
-# STEP 3: Fetch Trending Topics
-# -------------------------------------------------
-def fetch_trending_topics():
+
+def get_http_session():
+    """Shared pooled session so feed requests reuse TLS connections."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=8, pool_maxsize=16)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+
+def feed_url(feed, base_url=TRENDS_RSS_URL):
+    """"US:17" → base_url?geo=US&category=17; "global" / "" → base_url."""
+    feed = feed.strip()
+    if feed.lower() in ("", "global"):
+        return base_url
+    geo, _, category = feed.partition(":")
+    params = {"geo": geo.upper()}
+    if category:
+        params["category"] = category
+    return f"{base_url}?{urlencode(params)}"
+
+
+def parse_feed_titles(stream, limit=TOPICS_PER_FEED):
     """
-    Fetch trending topics from Google's Global RSS feed.
-    Returns a list of strings.
+    Item titles from an RSS byte stream, parsed incrementally. The feed
+    comes from the network, so DTDs and entity declarations are refused
+    (defusedxml raises on them) instead of being expanded.
     """
-    url = "https://trends.google.com/trending/rss"
-    response = requests.get(url)
+    titles = []
+    for _, elem in iterparse(stream, events=("end",), forbid_dtd=True):
+        if elem.tag == "item":
+            title = elem.findtext("title")
+            if title and title.strip():
+                titles.append(title.strip())
+            elem.clear()
+            if len(titles) >= limit:
+                break
+    return titles
+
+
+def _load_feed_state():
+    try:
+        with open(FEED_STATE_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _save_feed_state(state):
+    os.makedirs(os.path.dirname(FEED_STATE_PATH), exist_ok=True)
+    with open(FEED_STATE_PATH, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2, ensure_ascii=False)
 
-    if response.status_code != 200:
-        raise Exception(f"Failed to fetch RSS feed: {response.status_code}")
 
-    soup = BeautifulSoup(response.text, "xml")
-    items = soup.find_all("item")
-    topics = [item.title.text for item in items[:10]]
+def fetch_feed(url, cached=None, session=None, timeout=(5, 15)):
+    """
+    Conditional GET of one feed. Returns (topics, new_state). When the
+    server answers 304 Not Modified, the cached topics are reused.
+    """
+    session = session or get_http_session()
+    cached = cached or {}
+    headers = {}
+    if cached.get("etag"):
+        headers["If-None-Match"] = cached["etag"]
+    if cached.get("last_modified"):
+        headers["If-Modified-Since"] = cached["last_modified"]
+
+    with session.get(url, headers=headers, timeout=timeout, stream=True) as response:
+        if response.status_code == 304 and "topics" in cached:
+            return cached["topics"], cached
+        if response.status_code != 200:
+            raise Exception(f"Failed to fetch RSS feed: {response.status_code}")
+        response.raw.decode_content = True
+        topics = parse_feed_titles(response.raw)
+        state = {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "topics": topics,
+        }
+    return topics, state
+
+
+def merge_feed_topics(feed_topics):
+    """
+    Interleaves the feeds' lists (each feed's #1, then each #2, ...) and
+    drops topics that normalize to one already taken.
+    """
+    merged, seen = [], set()
+    for rank in range(max((len(t) for t in feed_topics), default=0)):
+        for topics in feed_topics:
+            if rank < len(topics):
+                key = normalize_topic(topics[rank])
+                if key not in seen:
+                    seen.add(key)
+                    merged.append(topics[rank])
+    return merged
+
+
+def fetch_trending_topics(feeds=None, base_url=None, session=None):
+    """
+    Fetch trending topics from Google's RSS feeds (BOOKFORGE_TREND_FEEDS,
+    global by default) concurrently over a pooled session, using
+    ETag/If-Modified-Since so unchanged feeds cost a 304.
+    Returns a merged, de-duplicated list of strings.
+    """
+    feeds = feeds if feeds is not None else TREND_FEEDS.split(",")
+    urls = [feed_url(feed, base_url or TRENDS_RSS_URL) for feed in feeds]
+    if not urls:
+        print("⚠️ No trend feeds configured (BOOKFORGE_TREND_FEEDS).")
+        return []
+    state = _load_feed_state()
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=min(8, len(urls)), thread_name_prefix="feed") as pool:
+        futures = {pool.submit(fetch_feed, url, state.get(url), session): url for url in urls}
+        for future in as_completed(futures):
+            url = futures[future]
+            try:
+                topics, state[url] = future.result()
+                results[url] = topics
+            except Exception as e:
+                print(f"⚠️ Feed failed ({url}): {e}")
+
+    _save_feed_state(state)
+    topics = merge_feed_topics([results[url] for url in urls if url in results])
 
     if not topics:
         raise Exception("No topics found in the feed.")
 
-    print(f"✅ Successfully fetched {len(topics)} trending topics (global).")
+    print(f"✅ Successfully fetched {len(topics)} trending topics ({len(results)}/{len(urls)} feeds).")
     return topics
 
 
 # -------------------------------------------------
-# STEP 4: Analyze Topics with Gemini
+# STEP 3: Analyze Topics with Gemini
 # -------------------------------------------------
-def analyze_topics_with_gemini(topics):
+SCORE_CHUNK_SIZE = int(os.getenv("BOOKFORGE_SCORE_CHUNK_SIZE", "15"))
+SCORE_CONCURRENCY = int(os.getenv("BOOKFORGE_SCORE_CONCURRENCY", "4"))
+SCORE_RETRIES = int(os.getenv("BOOKFORGE_SCORE_RETRIES", "2"))
+
+
+def _fallback_score(topic):
+    return {"topic": topic, "score": 50, "reason": "Default fallback"}
+
+
+def score_topic_chunk(topics, use_cache=True):
     """
-    Use Gemini to analyze trending topics and return structured JSON data.
+    Scores one chunk of topics with a single Gemini call.
+    Returns {normalized topic: result} for the topics the model answered.
     """
-    print("🤖 Analyzing topics with Gemini...")
-
     prompt = f"""
     You are an expert SEO strategist and content marketer.
     Analyze these trending topics and rate each (0–100)
@@ -69,41 +199,103 @@ def analyze_topics_with_gemini(topics):
       }}
     ]
 
-    Topics: {topics}
+    Topics: {json.dumps(topics, ensure_ascii=False)}
     """
 
-    try:
-        response = client.models.generate_content(
-            model="models/gemini-2.5-flash",
-            contents=prompt
-        )
-
-        raw_text = response.text.strip()
-        if raw_text.startswith("```"):
-            raw_text = re.sub(r"^```(?:json)?", "", raw_text, flags=re.IGNORECASE).strip()
-            raw_text = re.sub(r"```$", "", raw_text).strip()
-
-        try:
-            parsed = json.loads(raw_text)
-        except json.JSONDecodeError:
-            match = re.search(r"\[.*\]", raw_text, re.DOTALL)
-            if match:
-                parsed = json.loads(match.group())
-            else:
-                print("⚠️ Gemini returned malformed JSON, saving raw text.")
-                parsed = [{"topic": t, "score": 50, "reason": "Default fallback"} for t in topics]
-
-        print(f"✅ Gemini returned {len(parsed)} topics with scores.")
-        return parsed
-
-    except Exception as e:
-        print(f"❌ Gemini analysis failed: {e}")
-        # fallback structure
-        return [{"topic": t, "score": 50, "reason": "Default fallback"} for t in topics]
+    parsed = get_gateway().generate_structured(
+        prompt, agent="trend", schema=SCORES_SCHEMA, validator=validate_scores,
+        use_cache=use_cache
+    )
+
+    # Match answers back to the requested topics by normalized name; the
+    # model sometimes changes case or punctuation.
+    wanted = {normalize_topic(t): t for t in topics}
+    scored = {}
+    for item in parsed:
+        key = normalize_topic(item["topic"])
+        if key in wanted and key not in scored:
+            scored[key] = {"topic": wanted[key], "score": item["score"], "reason": item["reason"]}
+    return scored
+
+
+def analyze_topics_with_gemini(topics, chunk_size=None, max_workers=None):
+    """
+    Use Gemini to analyze trending topics and return structured JSON data.
+
+    Topics are scored in chunks of `chunk_size` sent concurrently. Topics a
+    chunk failed to score (error, malformed JSON, missing from the answer)
+    are re-sent on their own; only those still missing after
+    BOOKFORGE_SCORE_RETRIES rounds get the default score. Scores are cached
+    per topic (cache policy "topic_score"), so topics seen in the last
+    cycle are not scored again.
+    """
+    print("🤖 Analyzing topics with Gemini...")
+    chunk_size = max(1, chunk_size or SCORE_CHUNK_SIZE)
+    max_workers = max(1, max_workers or SCORE_CONCURRENCY)
+    cache = get_gateway().cache
+
+    results = {}
+    pending = []
+    for topic in topics:
+        key = normalize_topic(topic)
+        if key in results or key in pending:
+            continue
+        cached = cache.get(make_key("topic_score", key), "topic_score") if cache else None
+        if cached is not None:
+            results[key] = {**json.loads(cached), "topic": topic}
+        else:
+            pending.append(key)
+    if results:
+        print(f"♻️ Reusing cached scores for {len(results)} topic(s).")
+
+    originals = {normalize_topic(t): t for t in reversed(topics)}
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="score") as pool:
+        for attempt in range(SCORE_RETRIES + 1):
+            if not pending:
+                break
+            if attempt:
+                print(f"🔁 Re-scoring {len(pending)} topic(s) one by one (round {attempt}/{SCORE_RETRIES})...")
+            # Retries send each topic alone, so one topic the model chokes on
+            # can't fail its neighbours again.
+            size = chunk_size if attempt == 0 else 1
+            chunks = [
+                [originals[key] for key in pending[i:i + size]]
+                for i in range(0, len(pending), size)
+            ]
+            futures = {
+                # Retries skip the response cache so a bad answer isn't replayed.
+                pool.submit(contextvars.copy_context().run, score_topic_chunk, chunk, attempt == 0): chunk
+                for chunk in chunks
+            }
+            pending = []
+            for future in as_completed(futures):
+                chunk = futures[future]
+                try:
+                    scored = future.result()
+                except Exception as e:
+                    print(f"⚠️ Scoring chunk of {len(chunk)} failed: {e}")
+                    scored = {}
+                for topic in chunk:
+                    key = normalize_topic(topic)
+                    if key in scored:
+                        results[key] = scored[key]
+                        if cache:
+                            cache.put(make_key("topic_score", key), json.dumps(scored[key], ensure_ascii=False), "topic_score")
+                    else:
+                        pending.append(key)
+
+    if pending:
+        print(f"⚠️ Falling back to a default score of 50 for {len(pending)} topic(s).")
+        for key in pending:
+            results[key] = _fallback_score(originals[key])
+
+    parsed = [results[key] for key in dict.fromkeys(normalize_topic(t) for t in topics)]
+    print(f"✅ Gemini returned {len(parsed)} topics with scores.")
+    return parsed
 
 
 # -------------------------------------------------
-# STEP 5: Save Results
+# STEP 4: Save Results
 # -------------------------------------------------
 def save_results(results):
     os.makedirs("data", exist_ok=True)
@@ -115,7 +307,7 @@ def save_results(results):
 
 
 # -------------------------------------------------
-# STEP 6: MAIN EXECUTION
+# STEP 5: MAIN EXECUTION
 # -------------------------------------------------
 if __name__ == "__main__":
     print("🚀 Fetching trending topics...")
@@ -0,0 +1,93 @@
+"""
+Compares per-chapter and batched chapter generation: requests sent,
+prompt/response tokens and wall-clock time.
+
+    python -m benchmarks.bench_chapter_modes [--outline PATH] [--batch-sizes 1,3,5]
+                                             [--backend fake|gemini]
+
+The fake backend models latency as a fixed per-request overhead plus a
+per-output-token cost, so the numbers show the request overhead saved by
+batching without spending quota.
+"""
+import time
+import json
+import argparse
+import threading
+
+from agents.llm_gateway import LLMGateway, FakeBackend, build_backend, set_gateway
+from agents.rate_limiter import estimate_tokens
+from agents.ebook_generator import write_chapters_parallel
+
+
+class MeteredBackend:
+    """Wraps a backend and counts requests and tokens in both directions."""
+
+    def __init__(self, backend, request_latency=0.0, token_latency=0.0):
+        self.backend = backend
+        self.request_latency = request_latency
+        self.token_latency = token_latency
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.response_tokens = 0
+
+    def generate(self, model, prompt, timeout=None, config=None, agent="default"):
+        text = self.backend.generate(model, prompt, timeout=timeout, config=config, agent=agent)
+        out_tokens = estimate_tokens(text)
+        time.sleep(self.request_latency + self.token_latency * out_tokens)
+        with self.lock:
+            self.requests += 1
+            self.prompt_tokens += estimate_tokens(prompt)
+            self.response_tokens += out_tokens
+        return text
+
+    def stream(self, model, prompt, timeout=None, config=None, agent="default"):
+        yield self.generate(model, prompt, timeout=timeout, config=config, agent=agent)
+
+
+def run_mode(outline, batch_size, backend_name, workers, request_latency, token_latency):
+    inner = FakeBackend() if backend_name == "fake" else build_backend(backend_name)
+    if backend_name != "fake":
+        request_latency = token_latency = 0.0
+    backend = MeteredBackend(inner, request_latency, token_latency)
+    set_gateway(LLMGateway(backend, max_retries=2))
+
+    started = time.perf_counter()
+    chapters = write_chapters_parallel(
+        outline.get("title", ""), outline["chapters"],
+        max_workers=workers, batch_size=batch_size
+    )
+    elapsed = time.perf_counter() - started
+    return {
+        "mode": "per-chapter" if batch_size == 1 else f"batch={batch_size}",
+        "chapters": len(chapters),
+        "requests": backend.requests,
+        "prompt_tokens": backend.prompt_tokens,
+        "response_tokens": backend.response_tokens,
+        "seconds": round(elapsed, 2),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--outline", default="data/outlines/faridabad_outline.json")
+    parser.add_argument("--batch-sizes", default="1,3,5")
+    parser.add_argument("--backend", default="fake", choices=["fake", "gemini"])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--request-latency", type=float, default=0.8, help="fake: seconds per request")
+    parser.add_argument("--token-latency", type=float, default=0.002, help="fake: seconds per output token")
+    args = parser.parse_args()
+
+    with open(args.outline, "r", encoding="utf-8") as f:
+        outline = json.load(f)
+
+    rows = [
+        run_mode(outline, int(size), args.backend, args.workers, args.request_latency, args.token_latency)
+        for size in args.batch_sizes.split(",")
+    ]
+
+    print(f"\n📊 Chapter generation modes ({len(outline['chapters'])} chapters, {args.backend} backend)")
+    print(f"{'mode':<12} {'requests':>9} {'prompt tok':>11} {'resp tok':>9} {'seconds':>8}")
+    for row in rows:
+        print(f"{row['mode']:<12} {row['requests']:>9} {row['prompt_tokens']:>11} "
+              f"{row['response_tokens']:>9} {row['seconds']:>8}")
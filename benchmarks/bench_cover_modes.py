@@ -0,0 +1,104 @@
+"""
+Time per cover: the network providers (sequential and race) vs. the
+procedural renderer.
+
+    python -m benchmarks.bench_cover_modes [--topics 10] [--latency 0.25] [--live]
+
+By default Pixabay and Unsplash are replaced by a local stand-in server
+that waits --latency seconds per request and serves assets/default_cover.jpg,
+so the numbers show the request overhead without spending API quota.
+--live uses the real providers (PIXABAY_API_KEY from .env). Covers go to a
+temporary directory.
+"""
+import os
+import time
+import argparse
+import tempfile
+import threading
+import statistics
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from agents import cover_generator
+from agents.cover_renderer import render_cover
+
+TOPICS = [
+    "Saptahik Rashifal: Your Weekly Horoscope Guide", "Home Workouts Without Equipment",
+    "Budget Travel in Europe", "Personal Finance for Freelancers", "Beginner Gardening",
+    "Mindful Parenting", "Electric Cars Explained", "Healthy Meal Prep", "Learning Python Fast",
+    "Photography Basics", "Remote Work Productivity", "Ancient Indian History",
+]
+
+
+def start_stand_in(latency, image_path):
+    with open(image_path, "rb") as f:
+        image = f.read()
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            time.sleep(latency)
+            if self.path.startswith("/api"):
+                port = self.server.server_address[1]
+                body = f'{{"hits": [{{"largeImageURL": "http://127.0.0.1:{port}/image.jpg"}}]}}'.encode()
+                content_type = "application/json"
+            else:
+                body, content_type = image, "image/jpeg"
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run(name, make_cover, topics):
+    timings = []
+    for topic in topics:
+        started = time.perf_counter()
+        make_cover(topic)
+        timings.append(time.perf_counter() - started)
+    ms = [t * 1000 for t in timings]
+    return (f"{name:<12} median {statistics.median(ms):>8.1f} ms   max {max(ms):>8.1f} ms   "
+            f"total {sum(ms) / 1000:>6.2f} s")
+
+
+def network_cover(pick, directory):
+    def make_cover(topic):
+        _, path = pick(topic, directory)
+        if path:
+            os.remove(path)
+    return make_cover
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--topics", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.25, help="stand-in seconds per request")
+    parser.add_argument("--live", action="store_true", help="use the real Pixabay/Unsplash APIs")
+    args = parser.parse_args()
+
+    topics = (TOPICS * (args.topics // len(TOPICS) + 1))[:args.topics]
+    if not args.live:
+        server = start_stand_in(args.latency, cover_generator.DEFAULT_COVER)
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+        cover_generator.PIXABAY_API_URL = f"{base}/api"
+        cover_generator.UNSPLASH_URL = f"{base}/unsplash"
+        os.environ.setdefault("PIXABAY_API_KEY", "stand-in")
+
+    render_cover("Warm up", "Fonts load once per process")  # exclude font loading, like a long run
+    with tempfile.TemporaryDirectory() as workdir:
+        results = [
+            run("sequential", network_cover(cover_generator.sequential_providers, workdir), topics),
+            run("race", network_cover(cover_generator.race_providers, workdir), topics),
+            run("procedural", lambda t: render_cover(t, "", os.path.join(workdir, "cover.jpg")), topics),
+        ]
+
+    print(f"\n📊 Cover time per topic ({len(topics)} topics, "
+          f"{'live providers' if args.live else f'stand-in latency {args.latency}s'})")
+    for line in results:
+        print(line)
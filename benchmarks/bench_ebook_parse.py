@@ -0,0 +1,101 @@
+"""
+Time (and peak memory) to read an eBook's meta, chapter count and all
+chapters, as the PDF renderer does:
+
+  json.load      the whole file at once (the renderer before lazy reading)
+  two-pass       pre-scan for meta/count, then a second pass for chapters
+                 (eBooks without "chapter_count", and what open_ebook did
+                 for every book before)
+  single-pass    open_ebook() on an eBook that records "chapter_count"
+
+    python -m benchmarks.bench_ebook_parse [--chapters 200] [--chapter-kb 20] [--runs 5]
+
+Synthetic eBooks go to a temporary directory, in both JSON and JSONL.
+"""
+import os
+import json
+import time
+import random
+import argparse
+import tempfile
+import statistics
+import tracemalloc
+
+from agents.ebook_stream import EbookStreamWriter, open_ebook
+
+
+def synthetic_chapters(count, chapter_kb):
+    rng = random.Random(42)
+    words = ["insight", "growth", "strategy", "history", "future", "people", "ideas", "change", "ünïcödé"]
+    for i in range(count):
+        text, size = [], 0
+        while size < chapter_kb * 1024:
+            text.append(rng.choice(words))
+            size += len(text[-1]) + 1
+        yield {"chapter_title": f"Chapter {i + 1}", "content": " ".join(text), "source_hash": f"{i:016x}"}
+
+
+def write_books(directory, chapters, chapter_kb):
+    meta = {"title": "Benchmark Book", "subtitle": "Parse time", "topic": "benchmark", "created_at": "2026-01-01"}
+    chapter_list = list(synthetic_chapters(chapters, chapter_kb))
+    paths = {}
+    for name, extra in (("counted", {"chapter_count": chapters}), ("legacy", {})):
+        paths[f"{name}.json"] = os.path.join(directory, f"{name}.json")
+        with open(paths[f"{name}.json"], "w", encoding="utf-8") as f:
+            json.dump({**meta, **extra, "chapters": chapter_list}, f, indent=2, ensure_ascii=False)
+        paths[f"{name}.jsonl"] = os.path.join(directory, f"{name}.jsonl")
+        writer = EbookStreamWriter(paths[f"{name}.jsonl"], {**meta, **extra})
+        for i, ch in enumerate(chapter_list):
+            writer.write_chapter(i, ch)
+        writer.close()
+    return paths
+
+
+def read_json_load(path):
+    with open(path, "r", encoding="utf-8") as f:
+        ebook = json.load(f)
+    return sum(len(ch["content"]) for ch in ebook["chapters"])
+
+
+def read_open_ebook(path):
+    meta, chapters, count = open_ebook(path)
+    assert count is not None and meta.get("title")
+    return sum(len(ch["content"]) for ch in chapters)
+
+
+def measure(read, path, runs):
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        read(path)
+        timings.append(time.perf_counter() - started)
+    tracemalloc.start()
+    read(path)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return statistics.median(timings) * 1000, peak / 1024 / 1024
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chapters", type=int, default=200)
+    parser.add_argument("--chapter-kb", type=int, default=20)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        paths = write_books(workdir, args.chapters, args.chapter_kb)
+        size_mb = os.path.getsize(paths["counted.json"]) / 1024 / 1024
+        cases = [
+            ("JSON", "json.load", read_json_load, paths["counted.json"]),
+            ("JSON", "two-pass", read_open_ebook, paths["legacy.json"]),
+            ("JSON", "single-pass", read_open_ebook, paths["counted.json"]),
+            ("JSONL", "two-pass", read_open_ebook, paths["legacy.jsonl"]),
+            ("JSONL", "single-pass", read_open_ebook, paths["counted.jsonl"]),
+        ]
+        results = [(fmt, name, *measure(read, path, args.runs)) for fmt, name, read, path in cases]
+
+    print(f"\n📊 Reading a {args.chapters}-chapter eBook ({size_mb:.1f} MB), median of {args.runs} runs")
+    print(f"{'format':<6} {'reader':<12} {'ms':>9} {'peak MB':>9}")
+    for fmt, name, ms, peak in results:
+        print(f"{fmt:<6} {name:<12} {ms:>9.1f} {peak:>9.2f}")
@@ -0,0 +1,140 @@
+"""
+Per-PDF render time with fonts parsed for every book (what
+generate_pdf_from_ebook used to do) vs. the shared FontCache.
+
+    python -m benchmarks.bench_pdf_render [--ebooks "data/ebooks/*.json"] [--limit 20]
+                                          [--synthetic 10] [--chapters 12]
+
+Without eBooks on disk (or with --synthetic N) it renders N generated
+books of --chapters chapters each. PDFs go to a temporary directory.
+
+Each variant renders its own copy of the eBooks, so both start with an
+empty layout IR cache (see layout_ir) instead of the second one reading
+what the first wrote. "fonts" is the time to set up a document's fonts,
+"output" the time fpdf spends writing the PDF (including font subsetting,
+which needs a fresh copy of the font tables for every document in both
+variants).
+"""
+import os
+import glob
+import shutil
+import json
+import time
+import random
+import argparse
+import tempfile
+import statistics
+
+from agents.pdf_generator import PDF, PDFRenderer, FontCache, FONT_VARIANTS
+
+
+class UncachedRenderer(PDFRenderer):
+    """Parses the TTFs again for every document, like the old code path."""
+
+    def new_document(self, title):
+        pdf = PDF()
+        pdf.set_auto_page_break(auto=True, margin=15)
+        for style, path in FONT_VARIANTS:
+            pdf.add_font("DejaVu", style, path)
+        pdf.title = title
+        return pdf
+
+
+def synthetic_ebooks(directory, count, chapters):
+    rng = random.Random(42)
+    words = ["insight", "growth", "strategy", "history", "future", "people", "ideas", "change"]
+    paths = []
+    for n in range(count):
+        ebook = {
+            "title": f"Synthetic Book {n}",
+            "subtitle": "Benchmark input",
+            "chapters": [
+                {
+                    "chapter_title": f"Chapter {i}",
+                    "content": "\n\n".join(
+                        " ".join(rng.choice(words) for _ in range(120)).capitalize() + "."
+                        for _ in range(6)
+                    ),
+                }
+                for i in range(1, chapters + 1)
+            ],
+        }
+        path = os.path.join(directory, f"synthetic_{n}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(ebook, f)
+        paths.append(path)
+    return paths
+
+
+class Timed:
+    """Adds up the time spent in `owner.name` (a method, or a class's method) per render."""
+
+    def __init__(self, owner, name):
+        self.owner, self.name, self.original, self.seconds = owner, name, getattr(owner, name), 0.0
+
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return self.original(*args, **kwargs)
+            finally:
+                self.seconds += time.perf_counter() - started
+
+        setattr(owner, name, timed)
+
+    def take(self):
+        seconds, self.seconds = self.seconds, 0.0
+        return seconds
+
+    def restore(self):
+        setattr(self.owner, self.name, self.original)
+
+
+def run(renderer, ebooks, workdir):
+    # Fresh copies: this variant builds its own layout IR cache.
+    os.makedirs(workdir)
+    os.symlink(os.path.abspath("assets"), os.path.join(workdir, "assets"))
+    copies = [shutil.copy(path, workdir) for path in ebooks]
+    fonts = Timed(renderer, "new_document")
+    output = Timed(PDF, "output")
+    timings = {"total": [], "fonts": [], "output": []}
+    cwd = os.getcwd()
+    os.chdir(workdir)  # render() writes to data/pdfs relative to the cwd
+    try:
+        for path in copies:
+            started = time.perf_counter()
+            renderer.render(path)
+            timings["total"].append(time.perf_counter() - started)
+            timings["fonts"].append(fonts.take())
+            timings["output"].append(output.take())
+    finally:
+        os.chdir(cwd)
+        output.restore()
+    return timings
+
+
+def summarize(name, timings):
+    ms = {key: [t * 1000 for t in values] for key, values in timings.items()}
+    return (f"{name:<10} first {ms['total'][0]:>8.1f} ms   median {statistics.median(ms['total']):>8.1f} ms   "
+            f"(fonts {statistics.median(ms['fonts']):>6.1f} ms, output {statistics.median(ms['output']):>6.1f} ms)   "
+            f"total {sum(ms['total']) / 1000:>7.2f} s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ebooks", default="data/ebooks/*.json")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--synthetic", type=int, default=0, help="render N generated books instead")
+    parser.add_argument("--chapters", type=int, default=12)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        ebooks = [os.path.abspath(p) for p in sorted(glob.glob(args.ebooks))[:args.limit]]
+        if args.synthetic or not ebooks:
+            ebooks = synthetic_ebooks(workdir, args.synthetic or args.limit, args.chapters)
+
+        uncached = run(UncachedRenderer(), ebooks, os.path.join(workdir, "uncached"))
+        cached = run(PDFRenderer(FontCache()), ebooks, os.path.join(workdir, "cached"))
+
+    print(f"\n📊 PDF render time per book ({len(ebooks)} eBooks)")
+    print(summarize("uncached", uncached))
+    print(summarize("cached", cached))
@@ -2,47 +2,285 @@ import os
 import time
 import json
 import sys
+import threading
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 from datetime import datetime
 
 # Logging setup
 os.makedirs("logs", exist_ok=True)
 log_file_path = os.path.join("logs", "bookforge.log")
 
+# Line prefix for the current topic. A context variable (not a thread-local)
+# so worker pools that submit through contextvars.copy_context() keep it.
+log_prefix = contextvars.ContextVar("log_prefix", default="")
+
+
 class Logger:
     def __init__(self, filename):
         self.terminal = sys.stdout
         self.log = open(filename, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def get_prefix(self):
+        return log_prefix.get()
+
+    def _line(self, line):
+        prefix = self.get_prefix()
+        return f"{prefix} {line}\n" if prefix else f"{line}\n"
 
     def write(self, message):
-        self.terminal.write(message)
-        self.log.write(message)
-        self.log.flush()
+        # Buffer per thread until a full line is available (print() writes the
+        # text and its newline separately), so that lines from concurrent
+        # threads never get spliced together, prefixed or not.
+        buffer = getattr(self._local, "buffer", "") + message
+        *lines, rest = buffer.split("\n")
+        self._local.buffer = rest
+        if lines:
+            self._emit("".join(self._line(line) for line in lines))
+
+    def _flush_buffer(self):
+        rest = getattr(self._local, "buffer", "")
+        if rest:
+            self._local.buffer = ""
+            self._emit(self._line(rest))
+
+    def _emit(self, text):
+        with self._lock:
+            self.terminal.write(text)
+            self.log.write(text)
+            self.log.flush()
 
     def flush(self):
         pass
 
 sys.stdout = Logger(log_file_path)
 
+
+@contextmanager
+def log_context(prefix):
+    """Prefix every log line written inside the block with `prefix`."""
+    token = log_prefix.set(prefix)
+    try:
+        yield
+    finally:
+        if isinstance(sys.stdout, Logger):
+            sys.stdout._flush_buffer()
+        log_prefix.reset(token)
+
+
 # --------------------------------------------------
 # 🚀 Import Agents
 # --------------------------------------------------
 from agents.trend_detector import fetch_trending_topics, analyze_topics_with_gemini
 from agents.seo_analyzer import generate_outline_for_topic
-from agents.ebook_generator import generate_ebook_from_outline
+from agents.ebook_generator import generate_ebook_from_outline, STREAM_CHAPTERS
 from agents.pdf_generator import generate_pdf_from_ebook
-from agents.cover_generator import generate_cover
+from agents.cover_generator import generate_cover, COVER_CACHE, COVER_MODE
+from agents.cover_cache import get_cover_cache
+from agents.cover_processing import prepare_cover
+from agents.stage_graph import StageGraph
+from agents.topic_index import TopicIndex, dedupe_topics
+from agents.outline_store import OutlineStore, classify_topic, outline_ttl_days
+from agents.llm_gateway import get_gateway
 
 # Optional Google Drive uploader
 try:
-    from agents.drive_uploader import upload_to_drive
+    from agents.drive_uploader import upload_batch_to_drive, get_uploader
 except ImportError:
-    upload_to_drive = None
+    upload_batch_to_drive = None
+
+
+# --------------------------------------------------
+# ⚙️ Concurrency settings
+# --------------------------------------------------
+def _env_int(name, default):
+    try:
+        return max(1, int(os.getenv(name, default)))
+    except ValueError:
+        return default
+
+
+def _env_flag(name, default=False):
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+PIPELINE_STAGES = ("outline", "chapters", "cover", "pdf", "upload")
+
+
+def build_stage_limits():
+    """
+    One semaphore per stage so e.g. only N topics hit Gemini for chapters
+    at the same time, regardless of how many topic workers are running.
+    Configure with BOOKFORGE_MAX_<STAGE> (e.g. BOOKFORGE_MAX_CHAPTERS=2).
+    """
+    defaults = {"outline": 3, "chapters": 2, "cover": 3, "pdf": 2, "upload": 2}
+    return {
+        stage: threading.BoundedSemaphore(_env_int(f"BOOKFORGE_MAX_{stage.upper()}", defaults[stage]))
+        for stage in PIPELINE_STAGES
+    }
+
+
+# --------------------------------------------------
+# 📘 Per-topic pipeline
+# --------------------------------------------------
+def process_topic(idx, total, topic_data, stage_limits, outline_store=None):
+    """
+    Runs the per-topic stages as a dependency graph:
+
+        (trend) → outline → chapters → PDF → upload
+                  cover ──────────────┘ (runs alongside; the PDF embeds it if it succeeded)
+
+    A procedural cover (BOOKFORGE_COVER_MODE=procedural) is drawn after the
+    outline instead, so it shows the book's title and subtitle; it takes
+    tens of milliseconds, while image searches only need the topic.
+
+    With BOOKFORGE_STREAM_CHAPTERS=1 the PDF stage starts right after the
+    outline and renders chapters from the .jsonl eBook as they are written.
+
+    The trend stage runs once per cycle in run_full_pipeline(). A fresh
+    outline in `outline_store` is reused without a Gemini call. Returns a
+    small status dict; never raises.
+    """
+    topic = topic_data.get("topic", "Untitled")
+    safe_name = topic.replace(" ", "_").replace("&", "and").replace("/", "_").lower()
+    print(f"\n📘 [{idx}/{total}] Working on topic: {topic}")
+
+    def outline_stage(_):
+        outline_data = outline_store.get(topic) if outline_store is not None else None
+        if outline_data is not None:
+            print(f"♻️ Reusing stored outline ({classify_topic(topic)}) for '{topic}'.")
+        else:
+            outline_data = generate_outline_for_topic(topic)
+            if outline_store is not None:
+                outline_store.put(topic, outline_data)
+        os.makedirs("data/outlines", exist_ok=True)
+        outline_path = f"data/outlines/{safe_name}_outline.json"
+        with open(outline_path, "w", encoding="utf-8") as f:
+            json.dump(outline_data, f, ensure_ascii=False, indent=2)
+        print(f"✅ Outline JSON saved → {outline_path}")
+        return outline_path
+
+    # Streaming: the chapters stage publishes the .jsonl path here as soon as
+    # the file is open (or its error, if it fails first).
+    stream_path = Future()
+
+    def chapters_stage(inputs):
+        try:
+            ebook_path = generate_ebook_from_outline(inputs["outline"], on_stream_open=stream_path.set_result)
+        except Exception as e:
+            if not stream_path.done():
+                stream_path.set_exception(e)
+            raise
+        if not stream_path.done():
+            stream_path.set_result(ebook_path)
+        print(f"✅ eBook JSON saved → {ebook_path}")
+        return ebook_path
+
+    def cover_stage(inputs):
+        title = subtitle = ""
+        if inputs.get("outline"):
+            with open(inputs["outline"], "r", encoding="utf-8") as f:
+                outline_data = json.load(f)
+            title, subtitle = outline_data.get("title", ""), outline_data.get("subtitle", "")
+        cover_path = generate_cover(topic, title=title, subtitle=subtitle)
+        print(f"🎨 Cover image ready → {cover_path}")
+        return cover_path
+
+    def pdf_stage(inputs):
+        if STREAM_CHAPTERS:
+            # Follows the file until the writer's end marker; a failed
+            # chapters stage marks it aborted, which fails this stage too.
+            pdf_path = generate_pdf_from_ebook(stream_path.result(), follow=True, cover_path=inputs.get("cover"))
+        else:
+            pdf_path = generate_pdf_from_ebook(inputs["chapters"], cover_path=inputs.get("cover"))
+        print(f"📕 PDF generated → {pdf_path}")
+        return pdf_path
+
+    def upload_stage(inputs):
+        folder_id = os.getenv("GOOGLE_DRIVE_FOLDER_ID")
+        if not (upload_batch_to_drive and folder_id):
+            print("⚠️ Skipping Drive upload (missing credentials or folder ID).")
+            return None
+        # PDF, eBook JSON and the compact cover go up together, concurrently.
+        files, names = [inputs["pdf"], inputs["chapters"]], {}
+        if inputs.get("cover"):
+            try:
+                cover = prepare_cover(inputs["cover"], "screen")
+                files.append(cover)
+                names[cover] = f"{safe_name}_cover.jpg"  # derived covers are named by hash
+            except Exception as e:
+                print(f"⚠️ Cover not uploaded: {e}")
+        print(f"☁️ Uploading {len(files)} files to Google Drive...")
+        uploaded = upload_batch_to_drive(files, folder_id, names=names)
+        if uploaded.get(inputs["pdf"]) is None:
+            raise RuntimeError("PDF upload failed")
+        return uploaded
+
+    graph = StageGraph()
+    graph.add("outline", outline_stage, limit=stage_limits["outline"])
+    # A failed outline still gets a (topic-titled) procedural cover.
+    outline_dep = ["outline"] if COVER_MODE == "procedural" else []
+    graph.add("cover", cover_stage, optional=outline_dep, limit=stage_limits["cover"])
+    graph.add("chapters", chapters_stage, deps=["outline"], limit=stage_limits["chapters"])
+    # With BOOKFORGE_EMBED_COVER (default on) the PDF waits for the cover and
+    # uses it as its first page, and the upload includes it; a failed cover
+    # just means no cover page (or file).
+    cover_dep = ["cover"] if _env_flag("BOOKFORGE_EMBED_COVER", True) else []
+    pdf_deps = ["outline"] if STREAM_CHAPTERS else ["chapters"]
+    graph.add("pdf", pdf_stage, deps=pdf_deps, optional=cover_dep, limit=stage_limits["pdf"])
+    graph.add("upload", upload_stage, deps=["pdf", "chapters"], optional=cover_dep, limit=stage_limits["upload"])
+    status = graph.run()
+
+    failure_messages = {
+        "outline": "⚠️ Outline generation failed",
+        "chapters": "⚠️ eBook generation failed",
+        "cover": "⚠️ Cover generation failed",
+        "pdf": "⚠️ PDF generation failed",
+    }
+    for stage, error in graph.errors.items():
+        if stage == "upload":
+            print(f"⚠️ Upload failed: {error}")
+        else:
+            print(f"{failure_messages[stage]} for '{topic}': {error}")
+
+    result = {"topic": topic, "status": "done" if status["pdf"] == "done" else "failed", "stages": status}
+    if status["chapters"] == "done":
+        result["ebook_path"] = graph.results["chapters"]
+    if status["pdf"] == "done":
+        result["pdf_path"] = graph.results["pdf"]
+    return result
+
+
+def _process_topic_logged(idx, total, topic_data, stage_limits, outline_store=None):
+    topic = topic_data.get("topic", "Untitled")
+    with log_context(f"[{idx}/{total} {topic[:30]}]"):
+        try:
+            return process_topic(idx, total, topic_data, stage_limits, outline_store)
+        except Exception as e:
+            print(f"❌ Unexpected failure: {e}")
+            return {"topic": topic, "status": "failed"}
 
 
 # --------------------------------------------------
 # 🧠 MAIN AUTOMATION FUNCTION
 # --------------------------------------------------
-def run_full_pipeline():
+def run_full_pipeline(concurrent=None, max_workers=None):
+    """
+    Runs one full cycle. With `concurrent` (or BOOKFORGE_CONCURRENT=1) the
+    selected topics are processed in parallel by up to `max_workers`
+    (BOOKFORGE_TOPIC_WORKERS) threads, each stage capped by build_stage_limits().
+    """
+    if concurrent is None:
+        concurrent = _env_flag("BOOKFORGE_CONCURRENT")
+    if max_workers is None:
+        max_workers = _env_int("BOOKFORGE_TOPIC_WORKERS", 3)
+
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     print(f"\n📚 Starting BookForge AI full automation pipeline at {timestamp}")
     os.makedirs("data", exist_ok=True)
@@ -58,72 +296,84 @@ def run_full_pipeline():
     # Step 2️⃣ Analyze topics with Gemini
     try:
         analysis = analyze_topics_with_gemini(topics)
-        top_topics = sorted(
+        ranked = sorted(
             [t for t in analysis if isinstance(t, dict) and "score" in t],
             key=lambda x: x["score"],
             reverse=True
-        )[:5]
-        print(f"🧠 Selected Top 5 Topics: {[t['topic'] for t in top_topics]}")
+        )
     except Exception as e:
         print(f"❌ Topic analysis failed: {e}")
         return
 
+    # Skip topics already covered recently and merge near-duplicates
+    # (BOOKFORGE_TOPIC_DEDUP=0 disables, see agents/topic_index.py). The
+    # window never outlasts the topic's outline TTL, so news topics come
+    # back after BOOKFORGE_OUTLINE_TTL_NEWS hours instead of a week.
+    topic_index = TopicIndex() if _env_flag("BOOKFORGE_TOPIC_DEDUP", True) else None
+    top_topics, skipped = dedupe_topics(ranked, index=topic_index, limit=5, max_window_days=outline_ttl_days)
+    for item in skipped:
+        print(f"⏭️ Skipping '{item['topic']}': {item['reason']}")
+    print(f"🧠 Selected Top {len(top_topics)} Topics: {[t['topic'] for t in top_topics]}")
+
     # Step 3️⃣ Process each topic
-    for idx, topic_data in enumerate(top_topics, start=1):
-        topic = topic_data.get("topic", "Untitled")
-        print(f"\n📘 [{idx}/5] Working on topic: {topic}")
+    # Outlines are reused across cycles (BOOKFORGE_OUTLINE_STORE=0 disables,
+    # see agents/outline_store.py).
+    outline_store = OutlineStore() if _env_flag("BOOKFORGE_OUTLINE_STORE", True) else None
+    stage_limits = build_stage_limits()
+    total = len(top_topics)
+    results = []
 
-        # SEO Outline
-        try:
-            outline_data = generate_outline_for_topic(topic)
-            if isinstance(outline_data, dict):
-                os.makedirs("data/outlines", exist_ok=True)
-                safe_name = topic.replace(" ", "_").replace("&", "and").replace("/", "_").lower()
-                outline_path = f"data/outlines/{safe_name}_outline.json"
-                with open(outline_path, "w", encoding="utf-8") as f:
-                    json.dump(outline_data, f, ensure_ascii=False, indent=2)
-                print(f"✅ Outline JSON saved → {outline_path}")
-            else:
-                outline_path = outline_data
-        except Exception as e:
-            print(f"⚠️ Outline generation failed for '{topic}': {e}")
-            continue
+    if concurrent and total > 1:
+        print(f"⚡ Processing {total} topics concurrently ({max_workers} workers)...")
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="topic") as pool:
+            futures = [
+                pool.submit(contextvars.copy_context().run, _process_topic_logged,
+                            idx, total, topic_data, stage_limits, outline_store)
+                for idx, topic_data in enumerate(top_topics, start=1)
+            ]
+            for future in as_completed(futures):
+                results.append(future.result())
+    else:
+        for idx, topic_data in enumerate(top_topics, start=1):
+            results.append(process_topic(idx, total, topic_data, stage_limits, outline_store))
 
-        # eBook generation
-        try:
-            ebook_path = generate_ebook_from_outline(outline_path)
-            print(f"✅ eBook JSON saved → {ebook_path}")
-        except Exception as e:
-            print(f"⚠️ eBook generation failed for '{topic}': {e}")
-            continue
+    if topic_index is not None:
+        for r in results:
+            if r["status"] == "done":
+                topic_index.add(r["topic"], ebook_path=r.get("ebook_path"))
+        topic_index.close()
 
-        # Cover
-        try:
-            cover_path = generate_cover(topic)
-            print(f"🎨 Cover image ready → {cover_path}")
-        except Exception as e:
-            print(f"⚠️ Cover generation failed for '{topic}': {e}")
+    done = sum(1 for r in results if r["status"] == "done")
+    metrics = {
+        "started_at": timestamp,
+        "topics": total,
+        "done": done,
+        "skipped": len(skipped),
+        "llm": dict(get_gateway().stats),
+    }
+    if get_gateway().cache is not None:
+        metrics["llm_cache"] = get_gateway().cache.stats()
+    if outline_store is not None:
+        metrics["outline_store"] = outline_store.stats()
+        outline_store.close()
+        print(f"📊 Outline store: {metrics['outline_store']['hits']} reused, "
+              f"{metrics['outline_store']['misses']} generated.")
+    if COVER_CACHE:
+        metrics["cover_cache"] = get_cover_cache().stats()
+        print(f"📊 Cover cache: {metrics['cover_cache']['hits']} reused, "
+              f"{metrics['cover_cache']['misses']} downloaded.")
+    if upload_batch_to_drive and os.getenv("GOOGLE_DRIVE_FOLDER_ID"):
+        metrics["drive"] = get_uploader().stats()
+    save_run_metrics(metrics)
 
-        # PDF
-        try:
-            pdf_path = generate_pdf_from_ebook(ebook_path)
-            print(f"📕 PDF generated → {pdf_path}")
-        except Exception as e:
-            print(f"⚠️ PDF generation failed for '{topic}': {e}")
-            continue
+    print(f"\n🎉 BookForge AI pipeline complete! {done}/{total} topics processed.\n")
+    return results
 
-        # Drive Upload
-        try:
-            folder_id = os.getenv("GOOGLE_DRIVE_FOLDER_ID")
-            if upload_to_drive and folder_id:
-                print("☁️ Uploading to Google Drive...")
-                upload_to_drive(pdf_path, folder_id)
-            else:
-                print("⚠️ Skipping Drive upload (missing credentials or folder ID).")
-        except Exception as e:
-            print(f"⚠️ Upload failed: {e}")
 
-    print("\n🎉 BookForge AI pipeline complete! All top 5 topics processed.\n")
+def save_run_metrics(metrics, path=os.path.join("logs", "run_metrics.jsonl")):
+    """Appends one JSON line per cycle."""
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(metrics, ensure_ascii=False) + "\n")
 
 
 # --------------------------------------------------
@@ -0,0 +1,15 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Runs the test in an empty directory (with assets/ linked in), so nothing lands in the repo's data/."""
+    os.symlink(os.path.join(ROOT, "assets"), tmp_path / "assets")
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
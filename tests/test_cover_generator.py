@@ -0,0 +1,203 @@
+import io
+import os
+import json
+import time
+import threading
+import contextvars
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+import requests
+from PIL import Image
+
+from agents import cover_generator
+from agents.cover_cache import CoverCache
+from agents.cover_generator import CoverDownloadError, download_image, generate_cover, race_providers
+
+
+def jpeg_bytes(size=(64, 64)):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, (200, 40, 40)).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+IMAGE = jpeg_bytes()
+
+
+@pytest.fixture
+def image_server():
+    """
+    Local stand-in for the image providers:
+      /image     a JPEG right away          /slow   a JPEG trickled out over ~2s
+      /html      a non-image response       /big    2 MB without Content-Length
+      /flaky     503 twice, then a JPEG     /api    Pixabay search answering /image
+    """
+    hits = {}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            path = self.path.split("?")[0]
+            with lock:
+                hits[path] = hits.get(path, 0) + 1
+                count = hits[path]
+            if path == "/api":
+                body = json.dumps({"hits": [{"largeImageURL": f"http://{self.headers['Host']}/image"}]}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                return
+            if self.path == "/flaky" and count <= 2:
+                self.send_response(503)
+                self.end_headers()
+                return
+            if self.path == "/html":
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html")
+                self.end_headers()
+                self.wfile.write(b"<html>rate limited</html>")
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "image/jpeg")
+            if self.path in ("/image", "/flaky"):
+                self.send_header("Content-Length", str(len(IMAGE)))
+                self.end_headers()
+                self.wfile.write(IMAGE)
+                return
+            self.end_headers()
+            try:
+                if self.path == "/big":
+                    for _ in range(64):
+                        self.wfile.write(b"\0" * 32 * 1024)
+                elif self.path == "/slow":
+                    for start in range(0, len(IMAGE), 64):
+                        self.wfile.write(IMAGE[start:start + 64])
+                        self.wfile.flush()
+                        time.sleep(2 / (len(IMAGE) / 64))
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # the client gave up
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}", hits
+    server.shutdown()
+
+
+def provider(url, outcomes, name):
+    def run(topic, directory, session, cancel=None):
+        try:
+            path = download_image(url, directory, session, cancel=cancel, label=name)
+        except Exception as e:
+            outcomes[name] = str(e)
+            raise
+        outcomes[name] = "ok"
+        return path
+    return run
+
+
+def test_first_valid_image_wins_and_losers_are_cancelled(image_server, tmp_path):
+    base, _ = image_server
+    outcomes = {}
+    providers = [
+        ("Slow", provider(f"{base}/slow", outcomes, "Slow"), False),
+        ("Html", provider(f"{base}/html", outcomes, "Html"), False),
+        ("Fast", provider(f"{base}/image", outcomes, "Fast"), False),
+    ]
+
+    started = time.perf_counter()
+    name, path = race_providers("topic", str(tmp_path), requests.Session(), providers)
+
+    assert name == "Fast" and time.perf_counter() - started < 1.5
+    assert open(path, "rb").read() == IMAGE
+    assert "not an image" in outcomes["Html"]
+    deadline = time.time() + 5
+    while "Slow" not in outcomes and time.time() < deadline:
+        time.sleep(0.05)
+    assert "cancelled" in outcomes["Slow"]
+    assert os.listdir(tmp_path) == [os.path.basename(path)]  # only the winner's temp file is left
+
+
+def test_race_providers_run_in_the_callers_context(image_server, tmp_path):
+    base, _ = image_server
+    prefix = contextvars.ContextVar("prefix", default="")
+    seen = []
+
+    def recording(topic, directory, session, cancel=None):
+        seen.append(prefix.get())
+        return download_image(f"{base}/image", directory, session, cancel=cancel)
+
+    prefix.set("[topic]")
+    race_providers("topic", str(tmp_path), requests.Session(), [("Recording", recording, False)])
+    assert seen == ["[topic]"]
+
+
+def test_oversized_download_is_rejected(image_server, tmp_path):
+    base, _ = image_server
+    with pytest.raises(CoverDownloadError, match="larger than"):
+        download_image(f"{base}/big", str(tmp_path), requests.Session(), max_bytes=256 * 1024)
+    assert os.listdir(tmp_path) == []
+
+
+def test_server_errors_are_retried(image_server, tmp_path, monkeypatch):
+    base, hits = image_server
+    monkeypatch.setattr(cover_generator, "BACKOFF_BASE", 0.01)
+
+    path = download_image(f"{base}/flaky", str(tmp_path), requests.Session())
+
+    assert hits["/flaky"] == 3
+    assert open(path, "rb").read() == IMAGE
+
+
+def failing(topic, directory, session, cancel=None):
+    raise CoverDownloadError("Primary: no matching results")
+
+
+@pytest.fixture
+def cover_cache(workdir):
+    cache = CoverCache(path=str(workdir / "covers.sqlite3"), blob_dir=str(workdir / "blobs"))
+    yield cache
+    cache.close()
+
+
+def test_topic_covers_are_cached(image_server, cover_cache, monkeypatch):
+    base, hits = image_server
+    monkeypatch.setattr(cover_generator, "PROVIDERS", [("Fast", provider(f"{base}/image", {}, "Fast"), False)])
+
+    first = generate_cover("Home Workouts", mode="sequential", session=requests.Session(), cache=cover_cache)
+    second = generate_cover("home  workouts", mode="sequential", session=requests.Session(), cache=cover_cache)
+
+    assert open(first, "rb").read() == open(second, "rb").read() == IMAGE
+    assert hits["/image"] == 1 and cover_cache.stats()["hits"] == 1
+
+
+def test_backup_covers_are_not_cached_under_the_topic(image_server, cover_cache, monkeypatch):
+    base, hits = image_server
+    monkeypatch.setattr(cover_generator, "PIXABAY_API_URL", f"{base}/api")
+    monkeypatch.setenv("PIXABAY_API_KEY", "test")
+    monkeypatch.setattr(cover_generator, "PROVIDERS", [
+        ("Primary", failing, False),
+        ("Pixabay (broad)", cover_generator.pixabay_broad_provider, True),
+    ])
+
+    for topic in ("Home Workouts", "Budget Travel", "Home Workouts"):
+        path = generate_cover(topic, mode="sequential", session=requests.Session(), cache=cover_cache)
+        assert open(path, "rb").read() == IMAGE
+
+    assert cover_cache.get("Home Workouts") is None and cover_cache.stats()["stored"] == 0
+    assert hits["/image"] == 3  # the topic-specific providers get another chance every time...
+    assert hits["/api"] == 1  # ...but the broad search response is reused
+
+
+def test_procedural_cover_shows_the_book_title(workdir, monkeypatch):
+    drawn = []
+    monkeypatch.setattr(cover_generator, "render_cover", lambda *args: drawn.append(args))
+
+    generate_cover("budget travel", mode="procedural", title="Budget Travel 101", subtitle="See more, spend less")
+    generate_cover("budget travel", mode="procedural")
+
+    assert [args[:2] for args in drawn] == [("Budget Travel 101", "See more, spend less"), ("budget travel", "")]
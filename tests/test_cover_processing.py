@@ -0,0 +1,46 @@
+from PIL import Image
+
+from agents.cover_processing import PAGE_RATIO, make_variant
+
+RED = (255, 0, 0)
+
+
+def variant(tmp_path, image, fit=None, width=200):
+    source = tmp_path / "source.png"
+    image.save(source)
+    output = make_variant(str(source), str(tmp_path / "cover.jpg"), width, 90, fit=fit)
+    return Image.open(output).convert("RGB")
+
+
+def near(pixel, colour, tolerance=40):
+    return all(abs(a - b) <= tolerance for a, b in zip(pixel, colour))
+
+
+def test_transparent_areas_become_white_not_black(tmp_path):
+    image = Image.new("RGBA", (400, 566), (0, 0, 0, 0))
+    image.paste((255, 0, 0, 255), (100, 100, 300, 466))
+
+    cover = variant(tmp_path, image)
+
+    assert near(cover.getpixel((5, 5)), (255, 255, 255))
+    assert near(cover.getpixel((cover.width // 2, cover.height // 2)), RED)
+
+
+def test_square_cover_is_letterboxed_not_cropped(tmp_path):
+    image = Image.new("RGB", (600, 600), RED)
+    image.paste((0, 0, 255), (0, 0, 600, 30))  # a band the crop would cut off
+
+    cover = variant(tmp_path, image)
+
+    assert (cover.width, cover.height) == (200, round(200 * PAGE_RATIO))
+    assert near(cover.getpixel((100, 5)), (255, 255, 255))  # padding above the image
+    top = (cover.height - 200) // 2
+    assert near(cover.getpixel((100, top + 4)), (0, 0, 255))  # the band survived
+
+
+def test_cropping_is_opt_in_and_used_for_near_page_shaped_sources(tmp_path):
+    square = Image.new("RGB", (600, 600), RED)
+    assert near(variant(tmp_path, square, fit="crop").getpixel((100, 5)), RED)
+
+    portrait = Image.new("RGB", (400, 600), RED)  # 2:3, crops ~6%
+    assert near(variant(tmp_path, portrait).getpixel((100, 5)), RED)
@@ -0,0 +1,33 @@
+from PIL import Image
+
+from agents.cover_processing import PAGE_RATIO
+from agents.cover_renderer import COVER_WIDTH, render_cover
+
+
+def test_same_title_draws_the_same_cover(workdir):
+    first = render_cover("Budget Travel", "See the world for less", width=300)
+    second = render_cover("budget  travel", "See the world for less", width=300)
+    other = render_cover("Home Workouts", "See the world for less", width=300)
+
+    assert first.tobytes() != other.tobytes()
+    # Same palette and pattern for the normalized topic...
+    assert first.getpixel((2, 2)) == second.getpixel((2, 2))
+    # ...and identical pixels for identical input, also after a JPEG round trip.
+    assert first.tobytes() == render_cover("Budget Travel", "See the world for less", width=300).tobytes()
+    a = render_cover("Budget Travel", "Sub", str(workdir / "a.jpg"), width=300)
+    b = render_cover("Budget Travel", "Sub", str(workdir / "b.jpg"), width=300)
+    assert open(a, "rb").read() == open(b, "rb").read()
+
+
+def test_cover_has_the_page_ratio(workdir):
+    assert render_cover("Budget Travel").size == (COVER_WIDTH, round(COVER_WIDTH * PAGE_RATIO))
+    path = render_cover("Budget Travel", "Sub", str(workdir / "covers" / "cover.jpg"), width=333)
+    with Image.open(path) as image:
+        assert image.format == "JPEG"
+        assert image.size == (333, round(333 * PAGE_RATIO))
+
+
+def test_long_titles_and_subtitles_still_render(workdir):
+    title = "A Very Long Title " * 12
+    image = render_cover(title, "And an equally long subtitle " * 8, width=200)
+    assert image.size == (200, round(200 * PAGE_RATIO))
@@ -0,0 +1,60 @@
+import contextvars
+import time
+
+from agents.drive_uploader import DriveUploader, FakeDriveService
+
+
+class FlakyDriveService(FakeDriveService):
+    """Fails every upload named `fail_name`, like a Drive API error for that one file."""
+
+    def __init__(self, directory, latency, fail_name):
+        super().__init__(directory, latency)
+        self.fail_name = fail_name
+
+    def _store(self, body, media_body):
+        if body["name"] == self.fail_name:
+            time.sleep(self.latency)
+            raise RuntimeError("quota exceeded")
+        return super()._store(body, media_body)
+
+
+def test_batch_uploads_concurrently_and_isolates_a_failure(tmp_path):
+    latency = 0.3
+    drive = FlakyDriveService(str(tmp_path / "drive"), latency, fail_name="bad.json")
+    uploader = DriveUploader(service_factory=lambda creds: drive, credentials=False, workers=4)
+    files = []
+    for name in ("book.pdf", "book.json", "cover.jpg", "bad.json"):
+        (tmp_path / name).write_bytes(b"x" * 1000)
+        files.append(str(tmp_path / name))
+
+    started = time.perf_counter()
+    results = uploader.upload_batch(files, folder_id="folder", names={files[2]: "topic_cover.jpg"})
+    elapsed = time.perf_counter() - started
+    uploader.close()
+
+    assert elapsed < 2 * latency  # all four in flight at once, not 4 x latency
+    assert results[files[3]] is None
+    assert all(results[path] for path in files[:3])
+    assert sorted(u["name"] for u in drive.uploads) == ["book.json", "book.pdf", "topic_cover.jpg"]
+    stats = uploader.stats()
+    assert (stats["uploads"], stats["bytes"], stats["failures"]) == (3, 3000, 1)
+    assert 1 <= stats["clients"] <= 4
+
+
+def test_uploads_run_in_the_callers_context(tmp_path):
+    prefix = contextvars.ContextVar("prefix", default="")
+    seen = []
+
+    class RecordingDriveService(FakeDriveService):
+        def _store(self, body, media_body):
+            seen.append(prefix.get())
+            return super()._store(body, media_body)
+
+    drive = RecordingDriveService(str(tmp_path / "drive"))
+    uploader = DriveUploader(service_factory=lambda creds: drive, credentials=False, workers=2)
+    (tmp_path / "book.pdf").write_bytes(b"x")
+    prefix.set("[topic]")
+    uploader.upload_batch([str(tmp_path / "book.pdf")])
+    uploader.close()
+
+    assert seen == ["[topic]"]
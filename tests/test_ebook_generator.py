@@ -0,0 +1,105 @@
+import threading
+import time
+
+import pytest
+
+from agents import ebook_generator
+from agents.ebook_generator import ChapterCheckpoint, write_chapter, write_chapters_parallel
+from agents.llm_gateway import FakeBackend, LLMGateway, get_gateway, set_gateway
+from agents.response_cache import ResponseCache, make_key
+from agents.structured_output import ValidationError
+
+
+def chapter(n):
+    return {"chapter_title": f"Chapter {n}", "content": "text " * 100}
+
+
+def test_checkpoint_survives_torn_last_line(workdir):
+    checkpoint = ChapterCheckpoint("topic", "Title", [{"chapter_title": "a"}, {"chapter_title": "b"}])
+    checkpoint.save(0, chapter(1))
+    with open(checkpoint.path, "a", encoding="utf-8") as f:
+        f.write('{"index": 1, "chapter": {"chapter_ti')  # crash mid-write
+    checkpoint.save(1, chapter(2))
+
+    assert ChapterCheckpoint("topic", "Title", [{"chapter_title": "a"}, {"chapter_title": "b"}]).load() == {
+        0: chapter(1),
+        1: chapter(2),
+    }
+
+
+def test_chapters_are_checkpointed_as_they_finish(workdir, monkeypatch):
+    """A slow first chapter must not hold back the checkpoints of the others."""
+    release = threading.Event()
+    outline = [{"chapter_title": f"Chapter {n}"} for n in range(1, 4)]
+    checkpoint = ChapterCheckpoint("topic", "Title", outline)
+
+    def fake_unit(title, chapters, indices, stream, use_cache=True):
+        if indices == [0]:
+            release.wait(5)
+        return {i: chapter(i + 1) for i in indices}
+
+    monkeypatch.setattr(ebook_generator, "_write_unit", fake_unit)
+    worker = threading.Thread(target=write_chapters_parallel, args=("Title", outline),
+                              kwargs={"max_workers": 3, "checkpoint": checkpoint})
+    worker.start()
+    deadline = time.time() + 5
+    while time.time() < deadline and set(checkpoint.load()) != {1, 2}:
+        time.sleep(0.01)
+    saved_while_blocked = set(checkpoint.load())
+    release.set()
+    worker.join(5)
+
+    assert saved_while_blocked == {1, 2}
+    assert set(checkpoint.load()) == {0, 1, 2}
+
+
+@pytest.fixture
+def chapter_gateway(workdir):
+    """Installs a gateway with a real cache whose chapter answers come from `replies`, in order."""
+    replies, prompts = [], []
+
+    def respond(prompt):
+        prompts.append(prompt)
+        return replies.pop(0)
+
+    gateway = LLMGateway(FakeBackend(responders={"chapter": respond}), max_retries=0,
+                         cache=ResponseCache(str(workdir / "cache.sqlite3")))
+    set_gateway(gateway)
+    yield replies, prompts
+    set_gateway(None)
+    gateway.cache.close()
+
+
+def test_bad_chapter_response_is_retried_fresh_and_never_cached(chapter_gateway):
+    replies, prompts = chapter_gateway
+    good = "A proper chapter. " * 30
+    replies += ["Sorry, I can't.", good]
+    outline = [{"chapter_title": "Intro", "description": "d"}]
+
+    assert write_chapters_parallel("Title", outline, max_retries=1)[0]["content"] == good.strip()
+    assert len(prompts) == 2
+
+    # The bad answer was not cached, so a new run asks the model again.
+    replies.append(good)
+    assert write_chapter("Title", 1, outline[0])["content"] == good.strip()
+    assert len(prompts) == 3
+    # ...and that accepted answer is served from the cache from now on.
+    assert write_chapter("Title", 1, outline[0])["content"] == good.strip()
+    assert len(prompts) == 3
+
+
+def test_bad_chapter_already_in_cache_is_replaced(chapter_gateway):
+    replies, prompts = chapter_gateway
+    good = "A proper chapter. " * 30
+    outline = [{"chapter_title": "Intro", "description": "d"}]
+    replies += ["Sorry, I can't."]
+    with pytest.raises(ValidationError):
+        write_chapter("Title", 1, outline[0])
+    # An entry cached before responses were validated.
+    gateway = get_gateway()
+    gateway.cache.put(make_key(gateway.model, prompts[0], None), "Sorry, I can't.", "chapter")
+
+    replies.append(good)
+    assert write_chapter("Title", 1, outline[0])["content"] == good.strip()
+    assert write_chapter("Title", 1, outline[0])["content"] == good.strip()
+    assert len(prompts) == 2
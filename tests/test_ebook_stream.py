@@ -0,0 +1,95 @@
+import json
+import threading
+import time
+
+import pytest
+
+from agents import ebook_stream
+from agents.ebook_stream import EbookStreamWriter, StreamAborted, iter_stream_chapters, open_ebook
+
+
+def chapter(n):
+    return {"chapter_title": f"Chapter {n}", "content": f"text {n}"}
+
+
+def test_follow_reads_chapters_while_they_are_written(tmp_path):
+    path = str(tmp_path / "book.jsonl")
+    writer = EbookStreamWriter(path, {"title": "Book"})
+    seen = []
+
+    def read():
+        for ch in iter_stream_chapters(path, follow=True, poll_interval=0.01, timeout=5):
+            seen.append(ch["chapter_title"])
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    writer.write_chapter(0, chapter(1))
+    deadline = time.time() + 5
+    while not seen and time.time() < deadline:
+        time.sleep(0.01)
+    seen_before_end = list(seen)
+    writer.write_chapter(1, chapter(2))
+    writer.close()
+    reader.join(5)
+
+    assert seen_before_end == ["Chapter 1"]
+    assert seen == ["Chapter 1", "Chapter 2"]
+
+
+def test_follow_stops_when_writer_aborts(tmp_path):
+    path = str(tmp_path / "book.jsonl")
+    writer = EbookStreamWriter(path, {"title": "Book"})
+    writer.write_chapter(0, chapter(1))
+    writer.abort(RuntimeError("chapter 2 failed"))
+
+    with pytest.raises(StreamAborted, match="chapter 2 failed"):
+        list(iter_stream_chapters(path, follow=True, poll_interval=0.01, timeout=5))
+
+
+def test_follow_times_out_when_writer_dies_silently(tmp_path):
+    path = str(tmp_path / "book.jsonl")
+    EbookStreamWriter(path, {"title": "Book"}).write_chapter(0, chapter(1))  # never closed
+
+    with pytest.raises(TimeoutError):
+        list(iter_stream_chapters(path, follow=True, poll_interval=0.01, timeout=0.2))
+
+
+def test_open_json_ebook_reads_meta_count_and_chapters_in_one_pass(tmp_path, monkeypatch):
+    path = tmp_path / "book.json"
+    chapters = [chapter(n) for n in range(3)]
+    path.write_text(json.dumps({"title": "Book", "chapter_count": 3, "chapters": chapters}), encoding="utf-8")
+    monkeypatch.setattr(ebook_stream, "_scan_json_ebook", None)  # no pre-scan allowed
+
+    meta, chapter_iter, count = open_ebook(str(path))
+
+    assert (meta["title"], count) == ("Book", 3)
+    assert list(chapter_iter) == chapters
+
+
+def test_open_json_ebook_without_count_still_finds_trailing_fields(tmp_path):
+    path = tmp_path / "book.json"
+    chapters = [chapter(n) for n in range(2)]
+    path.write_text(json.dumps({"chapters": chapters, "title": "Book"}), encoding="utf-8")
+
+    meta, chapter_iter, count = open_ebook(str(path))
+
+    assert (meta, count) == ({"title": "Book"}, 2)
+    assert list(chapter_iter) == chapters
+
+
+def test_open_stream_ebook_takes_the_count_from_meta(tmp_path):
+    path = str(tmp_path / "book.jsonl")
+    writer = EbookStreamWriter(path, {"title": "Book", "chapter_count": 2})
+    writer.write_chapter(0, chapter(1))
+
+    meta, chapter_iter, count = open_ebook(path, follow=True)  # still being written
+    assert (meta["title"], count) == ("Book", 2)
+    writer.write_chapter(1, chapter(2))
+    writer.close()
+    assert list(chapter_iter) == [chapter(1), chapter(2)]
+
+    legacy = str(tmp_path / "legacy.jsonl")
+    writer = EbookStreamWriter(legacy, {"title": "Old"})
+    writer.write_chapter(0, chapter(1))
+    writer.close()
+    assert open_ebook(legacy)[2] == 1
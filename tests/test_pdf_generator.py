@@ -0,0 +1,76 @@
+import os
+import json
+
+import pytest
+
+from agents import pdf_generator
+from agents.pdf_generator import FontCache, PDFRenderer
+
+
+@pytest.fixture
+def ebook(workdir):
+    path = workdir / "book.json"
+    chapters = [
+        {"chapter_title": f"Chapter {n}", "content": f"## Part {n}\n\n" + "Some **bold** and *italic* text. " * 80}
+        for n in range(1, 4)
+    ]
+    path.write_text(json.dumps({"title": "Test Book", "subtitle": "Sub", "chapters": chapters}), encoding="utf-8")
+    return str(path)
+
+
+def render(ebook, font_cache, name):
+    output = PDFRenderer(font_cache=font_cache).render(ebook, output_path=name)
+    with open(output.replace(".pdf", ".meta.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_cached_and_plain_fonts_lay_out_the_same(ebook):
+    cached, plain = FontCache(enabled=True), FontCache(enabled=False)
+    assert cached.enabled, "fpdf2 internals no longer match the pinned version"
+
+    cached_meta = render(ebook, cached, "cached.pdf")
+    again_meta = render(ebook, cached, "again.pdf")  # subsetting the first copy left the template intact
+    plain_meta = render(ebook, plain, "plain.pdf")
+
+    assert cached.enabled  # no fallback happened along the way
+    assert cached_meta["pages"] == again_meta["pages"] == plain_meta["pages"] > 3
+    assert cached_meta["chapters"] == again_meta["chapters"] == plain_meta["chapters"]
+
+
+def test_font_cache_falls_back_when_fpdf_internals_change(ebook, monkeypatch):
+    monkeypatch.setattr(pdf_generator, "_CACHED_FONT_SLOTS", {"i", "name"})
+    cache = FontCache()
+    assert not cache.enabled
+    assert render(ebook, cache, "fallback.pdf")["pages"] > 3
+
+
+def test_font_cache_falls_back_when_building_a_font_fails(ebook, monkeypatch):
+    cache = FontCache(enabled=True)
+    monkeypatch.setattr(pdf_generator, "SubsetMap", None)  # e.g. a renamed helper
+    assert render(ebook, cache, "fallback.pdf")["pages"] > 3
+    assert not cache.enabled
+
+
+def test_batch_gives_json_and_jsonl_books_their_own_pdfs(ebook, workdir):
+    stream = workdir / "book.jsonl"
+    stream.write_text(
+        json.dumps({"type": "meta", "title": "Streamed"}) + "\n"
+        + json.dumps({"type": "chapter", "index": 0, "chapter_title": "One", "content": "Text. " * 50}) + "\n"
+        + json.dumps({"type": "end", "chapters": 1}) + "\n",
+        encoding="utf-8",
+    )
+    other_dir = workdir / "other"
+    other_dir.mkdir()
+    (other_dir / "book.json").write_text((workdir / "book.json").read_text(encoding="utf-8"), encoding="utf-8")
+
+    books = [ebook, str(stream), str(other_dir / "book.json")]
+
+    results = pdf_generator.render_batch(books, out_dir=str(workdir / "pdfs"), workers=1)
+
+    assert [r["status"] for r in results] == ["done", "done", "done"]
+    assert len({r["pdf"] for r in results}) == 3
+    assert all(os.path.exists(r["pdf"]) for r in results)
+    # Same names next time, so the second run finds every PDF up to date.
+    again = pdf_generator.render_batch(books, out_dir=str(workdir / "pdfs"), workers=1)
+    assert [r["status"] for r in again] == ["skipped"] * 3
+    assert [r["pdf"] for r in again] == [r["pdf"] for r in results]
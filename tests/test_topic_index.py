@@ -0,0 +1,81 @@
+import time
+
+import pytest
+
+from agents.topic_index import SIMILARITY_THRESHOLD, TopicIndex, dedupe_topics, shingles, topic_similarity
+
+
+def similarity(a, b):
+    return topic_similarity(shingles(a), shingles(b))
+
+
+@pytest.mark.parametrize("a, b", [
+    ("India vs Australia", "Where to watch India vs Australia live"),
+    ("Home Workouts", "home workout"),
+    ("Champions League Final Highlights", "champions league final"),
+    ("Real Madrid games", "Rayo Vallecano vs Real Madrid"),
+    ("Real Madrid games", "Where to watch Rayo Vallecano vs Real Madrid"),
+])
+def test_near_duplicates_merge(a, b):
+    assert similarity(a, b) >= SIMILARITY_THRESHOLD
+
+
+@pytest.mark.parametrize("a, b", [
+    ("Bigg Boss Tamil Season 8", "Bigg Boss Telugu Season 8"),
+    ("iPhone 16 Pro review", "iPhone 15 Pro review"),
+    ("India vs Australia", "India vs England"),
+])
+def test_distinct_but_similar_topics_stay_apart(a, b):
+    assert similarity(a, b) < SIMILARITY_THRESHOLD
+
+
+def test_dedupe_keeps_distinct_and_merges_duplicates(tmp_path):
+    index = TopicIndex(path=str(tmp_path / "index.sqlite3"))
+    index.add("Bigg Boss Tamil Season 8")
+    ranked = [
+        {"topic": "Bigg Boss Telugu Season 8"},
+        {"topic": "Where to watch Bigg Boss Telugu Season 8"},
+        {"topic": "Bigg Boss Tamil Season 8 live updates"},
+    ]
+    selected, skipped = dedupe_topics(ranked, index=index)
+    index.close()
+
+    assert [t["topic"] for t in selected] == ["Bigg Boss Telugu Season 8"]
+    assert selected[0]["merged"] == ["Where to watch Bigg Boss Telugu Season 8"]
+    assert "covered recently" in skipped[1]["reason"]
+
+
+def test_news_topics_return_once_their_outline_expires(tmp_path):
+    """A day-old news topic is written again (its outline is stale); an evergreen one is still skipped."""
+    from agents.outline_store import OutlineStore, outline_ttl_days
+
+    index = TopicIndex(path=str(tmp_path / "index.sqlite3"))
+    store = OutlineStore(path=str(tmp_path / "outlines.sqlite3"))
+    day_ago = time.time() - 86400
+    for topic in ("India vs Australia final", "Home Workouts"):
+        index.add(topic, seen_at=day_ago)
+        store.put(topic, {"title": topic})
+    store._db.execute("UPDATE outlines SET created_at = ?", (day_ago,))
+
+    selected, skipped = dedupe_topics(
+        [{"topic": "India vs Australia final"}, {"topic": "Home Workouts"}],
+        index=index, max_window_days=outline_ttl_days,
+    )
+
+    assert [t["topic"] for t in selected] == ["India vs Australia final"]
+    assert store.get("India vs Australia final") is None  # regenerated, not reused
+    assert [s["topic"] for s in skipped] == ["Home Workouts"]
+    assert store.get("Home Workouts") == {"title": "Home Workouts"}
+
+
+def test_index_finds_a_topic_that_contains_an_indexed_one(tmp_path):
+    index = TopicIndex(path=str(tmp_path / "index.sqlite3"))
+    index.add("Real Madrid games")
+    selected, skipped = dedupe_topics(
+        [{"topic": "Where to watch Rayo Vallecano vs Real Madrid"}, {"topic": "Bigg Boss Telugu Season 8"}],
+        index=index,
+    )
+    index.close()
+
+    assert [t["topic"] for t in selected] == ["Bigg Boss Telugu Season 8"]
+    assert "Real Madrid games" in skipped[0]["reason"]
@@ -0,0 +1,97 @@
+import io
+import json
+import re
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+from agents.llm_gateway import FakeBackend, LLMGateway, set_gateway
+from agents.trend_detector import analyze_topics_with_gemini, fetch_trending_topics, parse_feed_titles
+
+RSS = b"""<?xml version="1.0" encoding="UTF-8"?>
+<rss version="2.0"><channel><title>Daily Search Trends</title>
+<item><title>Home Workouts</title></item>
+<item><title> Budget Travel </title></item>
+<item><title></title></item>
+<item><title>Learning Python</title></item>
+</channel></rss>"""
+
+BOMB = b"""<?xml version="1.0"?>
+<!DOCTYPE rss [<!ENTITY a "aaaaaaaaaa"><!ENTITY b "&a;&a;&a;&a;&a;&a;&a;&a;">]>
+<rss><channel><item><title>&b;</title></item></channel></rss>"""
+
+
+@pytest.fixture
+def feed_server():
+    """Local stand-in for the Google Trends RSS endpoint, with ETag support."""
+    requests_seen = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            requests_seen.append(self.headers.get("If-None-Match"))
+            if self.headers.get("If-None-Match") == '"v1"':
+                self.send_response(304)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/rss+xml")
+            self.send_header("ETag", '"v1"')
+            self.send_header("Content-Length", str(len(RSS)))
+            self.end_headers()
+            self.wfile.write(RSS)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/rss", requests_seen
+    server.shutdown()
+
+
+def test_parse_feed_titles_skips_empty_and_respects_limit():
+    assert parse_feed_titles(io.BytesIO(RSS)) == ["Home Workouts", "Budget Travel", "Learning Python"]
+    assert parse_feed_titles(io.BytesIO(RSS), limit=1) == ["Home Workouts"]
+
+
+def test_parse_feed_titles_rejects_entity_declarations():
+    with pytest.raises(Exception, match="(?i)dtd|entit"):
+        parse_feed_titles(io.BytesIO(BOMB))
+
+
+def test_unchanged_feed_is_served_from_etag_cache(workdir, feed_server):
+    url, requests_seen = feed_server
+    first = fetch_trending_topics(feeds=["global"], base_url=url)
+    second = fetch_trending_topics(feeds=["global"], base_url=url)
+
+    assert first == second == ["Home Workouts", "Budget Travel", "Learning Python"]
+    assert requests_seen == [None, '"v1"']  # second request was conditional and got a 304
+
+
+def test_no_feeds_returns_empty_list(workdir):
+    assert fetch_trending_topics(feeds=[]) == []
+
+
+def test_failed_chunk_topics_are_retried_one_by_one():
+    prompts = []
+
+    def score(prompt):
+        topics = json.loads(re.search(r"Topics:\s*(\[.*\])", prompt, re.DOTALL).group(1))
+        prompts.append(topics)
+        if "Poisoned Topic" in topics:
+            return "I can't help with that."
+        return json.dumps([{"topic": t, "score": 70, "reason": "ok"} for t in topics])
+
+    set_gateway(LLMGateway(FakeBackend(responders={"trend": score}), max_retries=0))
+    try:
+        results = analyze_topics_with_gemini(["Alpha", "Poisoned Topic", "Beta"], chunk_size=3, max_workers=1)
+    finally:
+        set_gateway(None)
+
+    by_topic = {r["topic"]: r for r in results}
+    assert by_topic["Alpha"]["score"] == 70 and by_topic["Beta"]["score"] == 70
+    assert by_topic["Poisoned Topic"]["reason"] == "Default fallback"
+    first_round = [topics for topics in prompts if len(topics) == 3]
+    assert len(first_round) == 2  # the chunk and its structured-output re-request
+    assert all(len(topics) == 1 for topics in prompts[len(first_round):])